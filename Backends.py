@@ -0,0 +1,71 @@
+import logging
+from contextlib import contextmanager
+from typing import Iterator, Protocol
+
+logger = logging.getLogger(__name__)
+
+OCR_BACKENDS = ["documentai", "fake"]
+TRANSLATION_BACKENDS = ["google", "fake"]
+LLM_BACKENDS = ["anthropic", "fake"]
+
+class OcrBackend(Protocol):
+    """What the OCR stage needs from a client: documentai.DocumentProcessorServiceClient.process_document.
+
+    The response has a .document holding a documentai.Document.
+    """
+
+    def process_document(self, request=None, **kwargs): ...
+
+class TranslationBackend(Protocol):
+    """What the translation stage needs from a client: translate_v2.Client.translate, for a string or a list."""
+
+    def translate(self, values, target_language=None, format_=None, **kwargs): ...
+
+def make_ocr_backend(name: str = "documentai", latency: float = 0.0, error_rate: float = 0.0) -> OcrBackend:
+    """A Document AI client, or a fake one replaying the recorded OCR text of every page image in the repository."""
+    if name == "documentai":
+        # The Google client libraries are only loaded when a real request is going to be made
+        from google.cloud import documentai_v1 as documentai
+        return documentai.DocumentProcessorServiceClient()
+    if name == "fake":
+        from FakeBackends import FakeDocumentAIClient, all_recorded_page_texts
+        return FakeDocumentAIClient(all_recorded_page_texts(), latency=latency, error_rate=error_rate)
+    raise ValueError(f"Unknown OCR backend {name!r}; expected one of {OCR_BACKENDS}")
+
+def make_translation_backend(name: str = "google", credentials_path: str = None, latency: float = 0.0,
+                             error_rate: float = 0.0) -> TranslationBackend:
+    """A Cloud Translation client, or a fake one replaying the recorded translations of every chapter."""
+    if name == "google":
+        from google.cloud import translate_v2 as translate
+        from google.oauth2 import service_account
+        credentials = service_account.Credentials.from_service_account_file(credentials_path)
+        return translate.Client(credentials=credentials)
+    if name == "fake":
+        from FakeBackends import FakeTranslateClient, all_recorded_translations
+        return FakeTranslateClient(all_recorded_translations(), latency=latency, error_rate=error_rate)
+    raise ValueError(f"Unknown translation backend {name!r}; expected one of {TRANSLATION_BACKENDS}")
+
+@contextmanager
+def llm_backend(name: str = "anthropic", latency: float = 0.0) -> Iterator[str]:
+    """Point the interpretation script at the Anthropic API or at a local mock of it; yields the API base URL.
+
+    The fake is a MockBatchServer replaying the recorded interpretations, so both the
+    "messages" and "batch" modes of the interpretation script run unchanged against it.
+    """
+    import generateInterpretationWithClaudeSonnet as interpretation
+
+    if name == "anthropic":
+        yield interpretation.API_BASE
+        return
+    if name != "fake":
+        raise ValueError(f"Unknown LLM backend {name!r}; expected one of {LLM_BACKENDS}")
+
+    from FakeBackends import MockBatchServer, recorded_interpretation_responder
+    api_base = interpretation.API_BASE
+    with MockBatchServer(recorded_interpretation_responder(), latency=latency) as server:
+        interpretation.API_BASE = server.url
+        logger.info(f"Interpretation requests go to the mock API at {server.url}")
+        try:
+            yield server.url
+        finally:
+            interpretation.API_BASE = api_base
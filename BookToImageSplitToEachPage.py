@@ -1,11 +1,13 @@
 import os
+import time
 import logging
 import argparse
-from google.cloud import documentai_v1 as documentai
-from google.api_core.client_options import ClientOptions
-from PIL import Image
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional, Tuple
 import io
 
+from PipelineMetrics import metrics
+
 # Configure logging
 log_dir = 'logs'
 os.makedirs(log_dir, exist_ok=True)
@@ -15,11 +17,88 @@ logging.basicConfig(
     format='%(asctime)s %(levelname)s:%(message)s'
 )
 
-# Set Google Cloud credentials
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "csprocessor-service-account.json"
+IMAGE_EXTENSIONS = {"png": "png", "jpeg": "jpg", "tiff": "tif"}
+
+def page_image_path(output_folder: str, page_number: int, image_format: str = "png") -> str:
+    return os.path.join(output_folder, f"page_{page_number:04d}.{IMAGE_EXTENSIONS[image_format]}")
+
+def rasterize_page(pdf_path: str, page_number: int, output_folder: str, dpi: int, image_format: str) -> Tuple[str, float]:
+    """Render a single 1-based page straight to disk, so only one page is ever held in memory.
+
+    The image is written to a temporary file and moved into place, so a page interrupted mid-save
+    leaves no truncated image for later runs to skip. Returns the image path and the seconds spent,
+    since metrics recorded in a worker process are not shared.
+    """
+    import pypdfium2 as pdfium
+
+    start = time.perf_counter()
+    image_path = page_image_path(output_folder, page_number, image_format)
+    temp_path = f"{image_path}.{os.getpid()}.tmp"
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        page = pdf[page_number - 1]
+        bitmap = page.render(scale=dpi / 72)
+        bitmap.to_pil().save(temp_path, format=image_format.upper())
+        page.close()
+        os.replace(temp_path, image_path)
+        return image_path, time.perf_counter() - start
+    finally:
+        pdf.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def rasterize_document(pdf_path: str, output_folder: str, start_page: int = 1, end_page: Optional[int] = None,
+                       dpi: int = 300, image_format: str = "png", workers: int = None,
+                       overwrite: bool = False) -> Tuple[List[str], List[int]]:
+    """Render pages start_page..end_page (default: to the last page) into output_folder.
+
+    Existing images are skipped, or rendered again with `overwrite`, e.g. at a new resolution.
+    Returns the paths of the images saved and the numbers of the pages that failed.
+    """
+    import pypdfium2 as pdfium
+
+    os.makedirs(output_folder, exist_ok=True)
+
+    pdf = pdfium.PdfDocument(pdf_path)
+    page_count = len(pdf)
+    pdf.close()
+    if end_page is None:
+        end_page = page_count
+    elif end_page > page_count:
+        logging.warning(f"{pdf_path} has only {page_count} pages, stopping at page {page_count}")
+        end_page = page_count
+
+    pending = []
+    for page_number in range(start_page, end_page + 1):
+        if not overwrite and os.path.exists(page_image_path(output_folder, page_number, image_format)):
+            logging.info(f"Skipping page {page_number}, image already exists")
+            metrics.increment("rasterize_pages_skipped")
+        else:
+            pending.append(page_number)
+
+    saved, failed = [], []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(rasterize_page, pdf_path, page_number, output_folder, dpi, image_format): page_number
+                   for page_number in pending}
+        for future in as_completed(futures):
+            try:
+                image_path, seconds = future.result()
+                metrics.observe("rasterize_page", seconds)
+                saved.append(image_path)
+                logging.info(f"Saved {image_path}")
+            except Exception as e:
+                logging.error(f"Error rasterizing page {futures[future]} of {pdf_path}: {e}")
+                metrics.increment("rasterize_errors")
+                failed.append(futures[future])
+    return sorted(saved), sorted(failed)
+
+def init_documentai_client():
+    from google.cloud import documentai_v1 as documentai
+    from google.api_core.client_options import ClientOptions
+
+    # Set Google Cloud credentials
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "csprocessor-service-account.json"
 
-# Initialize the Document AI client
-try:
     project_id = "1039812532642"
     location = "us"
     processor_id = "1fb139ed60959696"
@@ -31,13 +110,14 @@ try:
     name = f"projects/{project_id}/locations/{location}/processors/{processor_id}"
 
     logging.info("Initialized Document AI client")
-except Exception as e:
-    logging.error(f"Error initializing Document AI client: {e}")
-    print(f"Error initializing Document AI client: {e}")
-    exit(1)
+    return documentai_client, name
+
+def process_document(file_path: str, start_page: int, end_page: int):
+    from google.cloud import documentai_v1 as documentai
 
-def process_document(file_path: str, start_page: int, end_page: int) -> documentai.Document:
     try:
+        documentai_client, name = init_documentai_client()
+
         with open(file_path, "rb") as pdf_file:
             pdf_content = pdf_file.read()
 
@@ -51,7 +131,8 @@ def process_document(file_path: str, start_page: int, end_page: int) -> document
                 )
             )
         )
-        result = documentai_client.process_document(request=request)
+        with metrics.timer("documentai_pdf"):
+            result = documentai_client.process_document(request=request)
 
         logging.info(f"Document processing complete. Pages processed: {len(result.document.pages)}")
         return result.document
@@ -59,7 +140,9 @@ def process_document(file_path: str, start_page: int, end_page: int) -> document
         logging.error(f"Error processing document {file_path}: {str(e)}")
         return None
 
-def save_pages_as_images(document: documentai.Document, output_folder: str, start_page: int) -> None:
+def save_pages_as_images(document, output_folder: str, start_page: int) -> None:
+    from PIL import Image
+
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
@@ -69,26 +152,45 @@ def save_pages_as_images(document: documentai.Document, output_folder: str, star
         image.save(image_path)
         logging.info(f"Saved {image_path}")
 
-def main(start_page: int, end_page: int):
+def main(start_page: int, end_page: int, backend: str = "local", dpi: int = 300, image_format: str = "png", workers: int = None,
+         archive: bool = False):
     pdf_path = "Book/S1-Chapter5.pdf"
     image_output_folder = "ExtractedImage/S1-Chapter5"
 
-    logging.info(f"Starting PDF to image extraction for pages {start_page} to {end_page}")
+    logging.info(f"Starting PDF to image extraction for pages {start_page} to {end_page} using the {backend} backend")
+
+    if backend == "local":
+        saved, failed = rasterize_document(pdf_path, image_output_folder, start_page, end_page, dpi, image_format, workers)
+        logging.info(f"Rasterized {len(saved)} pages")
+        if failed:
+            logging.error(f"Pages {failed} could not be rasterized; run again to retry them")
+    else:
+        document = process_document(pdf_path, start_page, end_page)
+        if document is None:
+            logging.error("Failed to process PDF document")
+            return
 
-    document = process_document(pdf_path, start_page, end_page)
-    if document is None:
-        logging.error("Failed to process PDF document")
-        return
+        save_pages_as_images(document, image_output_folder, start_page)
 
-    save_pages_as_images(document, image_output_folder, start_page)
+    if archive:
+        from PageArchive import build_archive
+        logging.info(f"Packed the page images into {build_archive(image_output_folder)}")
 
     logging.info("PDF to image extraction completed")
+    metrics.write_summary(f"rasterize_{os.path.basename(image_output_folder)}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extract images from Charaka Samhita PDF")
     parser.add_argument("--start_page", type=int, default=1, help="Starting page number (default: 1)")
     parser.add_argument("--end_page", type=int, default=10, help="Ending page number (default: 2)")
+    parser.add_argument("--backend", choices=["local", "documentai"], default="local",
+                        help="Render pages locally with pdfium, or round-trip the PDF through Document AI (default: local)")
+    parser.add_argument("--dpi", type=int, default=300, help="Rendering resolution for the local backend (default: 300)")
+    parser.add_argument("--format", dest="image_format", choices=sorted(IMAGE_EXTENSIONS), default="png",
+                        help="Image format for the local backend; the OCR stage reads PNG (default: png)")
+    parser.add_argument("--workers", type=int, default=None, help="Rendering processes (default: CPU count)")
+    parser.add_argument("--archive", action="store_true", help="Also pack the page PNGs into a memory-mapped page archive")
 
     args = parser.parse_args()
 
-    main(args.start_page, args.end_page)
+    main(args.start_page, args.end_page, args.backend, args.dpi, args.image_format, args.workers, args.archive)
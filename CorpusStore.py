@@ -0,0 +1,360 @@
+import os
+import re
+import json
+import sqlite3
+import zipfile
+import logging
+import argparse
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+logger = logging.getLogger(__name__)
+
+CORPUS_FILE = os.path.join("corpus", "charaka_samhita.sqlite")
+
+INTERPRETATION_FIELDS = ["verses", "sanskrit", "translation", "vocabulary", "context", "interpretation",
+                         "ayurvedic_principles", "conclusion"]
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+def chapter_code(section: int, chapter: int) -> str:
+    return f"S{section}C{chapter}"
+
+def parse_chapter_code(code: str) -> Tuple[int, int]:
+    section, chapter = re.fullmatch(r'S(\d+)C(\d+)', code).groups()
+    return int(section), int(chapter)
+
+def dump_json(data: Any, path: str) -> None:
+    """Write JSON in the layout every stage has always used (UTF-8, indent=2, no trailing newline)."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def read_docx_ocr_text(docx_path: str) -> str:
+    """Recover the OCR text from the 'OCR Content' section of a chapter's Word output."""
+    with zipfile.ZipFile(docx_path) as docx:
+        root = ElementTree.fromstring(docx.read('word/document.xml'))
+
+    paragraphs = []
+    for paragraph in root.iter(WORD_NAMESPACE + 'p'):
+        parts = []
+        for element in paragraph.iter():
+            if element.tag == WORD_NAMESPACE + 't':
+                parts.append(element.text or '')
+            elif element.tag in (WORD_NAMESPACE + 'br', WORD_NAMESPACE + 'cr'):
+                parts.append('\n')
+        paragraphs.append(''.join(parts))
+
+    start = paragraphs.index('OCR Content') + 1
+    end = paragraphs.index('Sanskrit Verses')
+    return '\n'.join(paragraphs[start:end])
+
+class CorpusStore:
+    """The whole book in one SQLite database (WAL), keyed by (section, chapter, position).
+
+    Stages upsert chapters, verses and interpretations as they complete them, so an update
+    touches only its own rows instead of rewriting a chapter's JSON file. Verses are keyed by
+    their position in the chapter because OCR can repeat verse numbers; verse_number is an
+    indexed column. The exporters regenerate the JSON, DOCX and TXT files the stages write.
+    """
+
+    def __init__(self, path: str = CORPUS_FILE):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chapters (
+                section INTEGER NOT NULL,
+                chapter INTEGER NOT NULL,
+                title TEXT,
+                volume INTEGER,
+                chapter_name TEXT,
+                timestamp TEXT,
+                verse_groups TEXT NOT NULL,
+                ocr_text TEXT,
+                updated TEXT NOT NULL,
+                PRIMARY KEY (section, chapter)
+            );
+            CREATE TABLE IF NOT EXISTS verses (
+                section INTEGER NOT NULL,
+                chapter INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                verse_number INTEGER NOT NULL,
+                sanskrit TEXT NOT NULL,
+                transliteration TEXT,
+                translation TEXT,
+                transliterations TEXT,
+                translation_source TEXT,
+                updated TEXT NOT NULL,
+                PRIMARY KEY (section, chapter, position)
+            );
+            CREATE INDEX IF NOT EXISTS verses_by_number ON verses (section, chapter, verse_number);
+            CREATE TABLE IF NOT EXISTS interpretations (
+                section INTEGER NOT NULL,
+                chapter INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                verses TEXT NOT NULL,
+                sanskrit TEXT,
+                translation TEXT,
+                vocabulary TEXT,
+                context TEXT,
+                interpretation TEXT,
+                ayurvedic_principles TEXT,
+                conclusion TEXT,
+                generation TEXT,
+                updated TEXT NOT NULL,
+                PRIMARY KEY (section, chapter, position)
+            );
+        """)
+        # Stores created before interpretations recorded what produced them
+        if "generation" not in {row['name'] for row in self.conn.execute("PRAGMA table_info(interpretations)")}:
+            self.conn.execute("ALTER TABLE interpretations ADD COLUMN generation TEXT")
+        # ... and before verses recorded where a reused translation came from
+        if "translation_source" not in {row['name'] for row in self.conn.execute("PRAGMA table_info(verses)")}:
+            self.conn.execute("ALTER TABLE verses ADD COLUMN translation_source TEXT")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def upsert_chapter(self, book: Dict[str, Any], timestamp: str, ocr_text: Optional[str] = None) -> None:
+        """Store a chapter's base JSON ('book' part): its metadata, verse groups and verses.
+
+        Verses whose Sanskrit is unchanged keep their transliteration and translation; rows
+        beyond the new verse and group counts are dropped.
+        """
+        section, chapter = book['section'], book['chapter']
+        now = datetime.now().isoformat()
+        with self.lock, self.conn:
+            self.conn.execute("""
+                INSERT INTO chapters (section, chapter, title, volume, chapter_name, timestamp, verse_groups, ocr_text, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (section, chapter) DO UPDATE SET
+                    title = excluded.title, volume = excluded.volume, chapter_name = excluded.chapter_name,
+                    timestamp = excluded.timestamp, verse_groups = excluded.verse_groups,
+                    ocr_text = COALESCE(excluded.ocr_text, chapters.ocr_text), updated = excluded.updated
+            """, (section, chapter, book.get('title'), book.get('volume'), book.get('chapter_name'), timestamp,
+                  json.dumps(book['verse_groups'], ensure_ascii=False), ocr_text, now))
+            self.conn.executemany("""
+                INSERT INTO verses (section, chapter, position, verse_number, sanskrit, updated)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (section, chapter, position) DO UPDATE SET
+                    verse_number = excluded.verse_number,
+                    transliteration = CASE WHEN verses.sanskrit = excluded.sanskrit THEN verses.transliteration END,
+                    translation = CASE WHEN verses.sanskrit = excluded.sanskrit THEN verses.translation END,
+                    transliterations = CASE WHEN verses.sanskrit = excluded.sanskrit THEN verses.transliterations END,
+                    sanskrit = excluded.sanskrit, updated = excluded.updated
+            """, [(section, chapter, i, verse['verse_number'], verse['sanskrit'], now)
+                  for i, verse in enumerate(book['sanskrit_verses'])])
+            self.conn.execute("DELETE FROM verses WHERE section = ? AND chapter = ? AND position >= ?",
+                              (section, chapter, len(book['sanskrit_verses'])))
+            self.conn.execute("DELETE FROM interpretations WHERE section = ? AND chapter = ? AND position >= ?",
+                              (section, chapter, len(book['verse_groups'])))
+        logger.info(f"Stored {chapter_code(section, chapter)}: {len(book['sanskrit_verses'])} verses, {len(book['verse_groups'])} groups")
+
+    def upsert_verses(self, section: int, chapter: int, verses: Iterable[Tuple[int, Dict[str, Any]]]) -> None:
+        """Store (position, verse) pairs, where verse has verse_number, sanskrit, and optionally transliteration,
+        translation, translation_source and transliteration_<scheme> fields, in one transaction."""
+        rows = []
+        now = datetime.now().isoformat()
+        for position, verse in verses:
+            extra = {key: value for key, value in verse.items() if key.startswith('transliteration_')}
+            rows.append((section, chapter, position, verse['verse_number'], verse['sanskrit'], verse.get('transliteration'),
+                         verse.get('translation'), json.dumps(extra, ensure_ascii=False) if extra else None,
+                         verse.get('translation_source'), now))
+        with self.lock, self.conn:
+            self.conn.executemany("""
+                INSERT INTO verses (section, chapter, position, verse_number, sanskrit, transliteration, translation,
+                                    transliterations, translation_source, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (section, chapter, position) DO UPDATE SET
+                    verse_number = excluded.verse_number, sanskrit = excluded.sanskrit,
+                    transliteration = excluded.transliteration, translation = excluded.translation,
+                    transliterations = excluded.transliterations, translation_source = excluded.translation_source,
+                    updated = excluded.updated
+            """, rows)
+
+    def upsert_interpretation(self, section: int, chapter: int, position: int, result: Dict[str, str],
+                              generation: Optional[str] = None) -> None:
+        """Store one verse group's interpretation; `generation` identifies the model and prompt that produced it (None if unknown)."""
+        with self.lock, self.conn:
+            self.conn.execute(f"""
+                INSERT INTO interpretations (section, chapter, position, {', '.join(INTERPRETATION_FIELDS)}, generation, updated)
+                VALUES (?, ?, ?, {', '.join('?' for _ in INTERPRETATION_FIELDS)}, ?, ?)
+                ON CONFLICT (section, chapter, position) DO UPDATE SET
+                    {', '.join(f'{field} = excluded.{field}' for field in INTERPRETATION_FIELDS)},
+                    generation = excluded.generation, updated = excluded.updated
+            """, (section, chapter, position, *[result.get(field) for field in INTERPRETATION_FIELDS], generation,
+                  datetime.now().isoformat()))
+
+    def chapters(self) -> List[Tuple[int, int]]:
+        with self.lock:
+            return [(row['section'], row['chapter'])
+                    for row in self.conn.execute("SELECT section, chapter FROM chapters ORDER BY section, chapter")]
+
+    def chapter_updated(self, section: int, chapter: int) -> Optional[str]:
+        """When any row of the chapter last changed, so derived indexes can tell whether they are stale."""
+        with self.lock:
+            return self.conn.execute("""
+                SELECT MAX(updated) FROM (
+                    SELECT updated FROM chapters WHERE section = ? AND chapter = ?
+                    UNION ALL SELECT MAX(updated) FROM verses WHERE section = ? AND chapter = ?
+                    UNION ALL SELECT MAX(updated) FROM interpretations WHERE section = ? AND chapter = ?)
+            """, (section, chapter) * 3).fetchone()[0]
+
+    def chapter(self, section: int, chapter: int) -> Optional[sqlite3.Row]:
+        with self.lock:
+            return self.conn.execute("SELECT * FROM chapters WHERE section = ? AND chapter = ?", (section, chapter)).fetchone()
+
+    def verses(self, section: Optional[int] = None, chapter: Optional[int] = None,
+               verse_number: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Verses of the whole book, one section or one chapter, in book order, as in the translated JSON."""
+        conditions, params = [], []
+        for column, value in (("section", section), ("chapter", chapter), ("verse_number", verse_number)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            rows = self.conn.execute(f"SELECT * FROM verses {where} ORDER BY section, chapter, position", params).fetchall()
+        for row in rows:
+            verse = {"section": row['section'], "chapter": row['chapter'], "position": row['position'],
+                     "verse_number": row['verse_number'], "sanskrit": row['sanskrit'],
+                     "transliteration": row['transliteration'], "translation": row['translation']}
+            if row['transliterations']:
+                verse.update(json.loads(row['transliterations']))
+            if row['translation_source']:
+                verse['translation_source'] = row['translation_source']
+            yield verse
+
+    def interpretations(self, section: int, chapter: int, generation: Optional[str] = None) -> List[Dict[str, str]]:
+        """A chapter's interpretations in group order; with `generation`, only those produced under it."""
+        query = "SELECT * FROM interpretations WHERE section = ? AND chapter = ?"
+        params = [section, chapter]
+        if generation is not None:
+            query += " AND generation = ?"
+            params.append(generation)
+        with self.lock:
+            rows = self.conn.execute(f"{query} ORDER BY position", params).fetchall()
+        return [{field: row[field] for field in INTERPRETATION_FIELDS} for row in rows]
+
+    def chapter_book(self, section: int, chapter: int, translated: bool = False) -> Dict[str, Any]:
+        """A chapter in the layout of charaka_samhita_output.json, or charaka_samhita_translated.json if translated."""
+        row = self.chapter(section, chapter)
+        if row is None:
+            raise KeyError(f"{chapter_code(section, chapter)} is not in {self.path}")
+        verses = []
+        for verse in self.verses(section, chapter):
+            exported = {"verse_number": verse['verse_number'], "sanskrit": verse['sanskrit']}
+            if translated:
+                exported.update({key: value for key, value in verse.items()
+                                 if key not in ("section", "chapter", "position", "verse_number", "sanskrit")})
+            verses.append(exported)
+        return {
+            "timestamp": row['timestamp'],
+            "book": {
+                "title": row['title'],
+                "volume": row['volume'],
+                "section": section,
+                "chapter": chapter,
+                "chapter_name": row['chapter_name'],
+                "sanskrit_verses": verses,
+                "verse_groups": json.loads(row['verse_groups'])
+            }
+        }
+
+    def export_chapter(self, section: int, chapter: int, root: str = ".", formats: Iterable[str] = ("json", "docx", "txt")) -> List[str]:
+        """Regenerate a chapter's ExtractedFromOCR and InterpretationByClaude files under root."""
+        code = chapter_code(section, chapter)
+        ocr_folder = os.path.join(root, "ExtractedFromOCR", code)
+        interpretation_folder = os.path.join(root, "InterpretationByClaude", code, "output")
+        base = self.chapter_book(section, chapter)
+        results = self.interpretations(section, chapter)
+        has_translations = any(verse['translation'] is not None or verse['transliteration'] is not None
+                               for verse in self.verses(section, chapter))
+        written = []
+
+        if "json" in formats:
+            dump_json(base, os.path.join(ocr_folder, 'charaka_samhita_output.json'))
+            written.append(os.path.join(ocr_folder, 'charaka_samhita_output.json'))
+            if has_translations:
+                dump_json(self.chapter_book(section, chapter, translated=True), os.path.join(ocr_folder, 'charaka_samhita_translated.json'))
+                written.append(os.path.join(ocr_folder, 'charaka_samhita_translated.json'))
+            if results:
+                book = {key: base['book'][key] for key in ("title", "volume", "section", "chapter", "chapter_name")}
+                dump_json({"timestamp": base['timestamp'], "book": book, "translations": results},
+                          os.path.join(interpretation_folder, 'charaka_samhita_translated_detailed_full.json'))
+                written.append(os.path.join(interpretation_folder, 'charaka_samhita_translated_detailed_full.json'))
+        # The report writers build on the store, so they are imported here rather than at the top
+        from ReportWriter import write_interpretation_text, write_ocr_docx
+        if "txt" in formats and results:
+            written.append(write_interpretation_text(
+                results, os.path.join(interpretation_folder, 'charaka_samhita_translated_detailed_full.txt')))
+        if "docx" in formats:
+            ocr_text = self.chapter(section, chapter)['ocr_text']
+            os.makedirs(ocr_folder, exist_ok=True)
+            write_ocr_docx(base['book']['sanskrit_verses'], base['book']['verse_groups'], [ocr_text or ""],
+                           os.path.join(ocr_folder, 'charaka_samhita_output.docx'))
+            written.append(os.path.join(ocr_folder, 'charaka_samhita_output.docx'))
+
+        logger.info(f"Exported {code} to {len(written)} files under {root}")
+        return written
+
+    def import_chapter(self, section: int, chapter: int, root: str = ".") -> None:
+        """Load a chapter's existing JSON (and Word OCR text) files into the store."""
+        code = chapter_code(section, chapter)
+        ocr_folder = os.path.join(root, "ExtractedFromOCR", code)
+        with open(os.path.join(ocr_folder, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+            base = json.load(f)
+        docx_path = os.path.join(ocr_folder, 'charaka_samhita_output.docx')
+        ocr_text = read_docx_ocr_text(docx_path) if os.path.exists(docx_path) else None
+        self.upsert_chapter(base['book'], base['timestamp'], ocr_text)
+
+        translated_path = os.path.join(ocr_folder, 'charaka_samhita_translated.json')
+        if os.path.exists(translated_path):
+            with open(translated_path, 'r', encoding='utf-8') as f:
+                self.upsert_verses(section, chapter, enumerate(json.load(f)['book']['sanskrit_verses']))
+
+        interpretation_path = os.path.join(root, "InterpretationByClaude", code, "output", 'charaka_samhita_translated_detailed_full.json')
+        if os.path.exists(interpretation_path):
+            with open(interpretation_path, 'r', encoding='utf-8') as f:
+                for position, result in enumerate(json.load(f)['translations']):
+                    self.upsert_interpretation(section, chapter, position, result)
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+def stored_chapters(root: str = ".") -> List[Tuple[int, int]]:
+    folder = os.path.join(root, "ExtractedFromOCR")
+    codes = [name for name in os.listdir(folder)
+             if re.fullmatch(r'S\d+C\d+', name) and os.path.exists(os.path.join(folder, name, 'charaka_samhita_output.json'))]
+    return sorted(parse_chapter_code(code) for code in codes)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Load the pipeline's JSON outputs into the corpus store, or regenerate them from it")
+    parser.add_argument("command", choices=["import", "export"], help="import existing files, or export files from the store")
+    parser.add_argument("--chapters", nargs='+', help="Chapter codes, e.g. S1C3 S1C5 (default: all)")
+    parser.add_argument("--root", default=".", help="Folder holding (import) or receiving (export) ExtractedFromOCR and InterpretationByClaude")
+    parser.add_argument("--formats", nargs='+', choices=["json", "docx", "txt"], default=["json", "docx", "txt"], help="Formats to export")
+    parser.add_argument("--corpus", default=CORPUS_FILE, help=f"Corpus database (default: {CORPUS_FILE})")
+    args = parser.parse_args()
+
+    with CorpusStore(args.corpus) as store:
+        if args.command == "import":
+            chapters = [parse_chapter_code(code) for code in args.chapters] if args.chapters else stored_chapters(args.root)
+            for section, chapter in chapters:
+                store.import_chapter(section, chapter, args.root)
+        else:
+            chapters = [parse_chapter_code(code) for code in args.chapters] if args.chapters else store.chapters()
+            for section, chapter in chapters:
+                store.export_chapter(section, chapter, args.root, args.formats)
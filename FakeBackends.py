@@ -0,0 +1,418 @@
+from __future__ import annotations
+
+import os
+import re
+import glob
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from google.cloud import documentai_v1 as documentai
+
+# Recorded outputs checked into the repository, replayed by the fakes
+RECORDED_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+class FakeBackendError(Exception):
+    """Raised by the fake backends to simulate transient API failures."""
+
+def fake_document(text: str, running_head: Optional[str] = None, folio: Optional[str] = None,
+                  confidence: float = 0.95) -> documentai.Document:
+    """A one-page Document AI response for `text`, with one paragraph per line stacked down the page.
+
+    Every paragraph and the page itself report `confidence`.
+
+    An optional running head and folio number are placed in the top and bottom margins and,
+    as Document AI does, also appear at the start and end of document.text.
+    """
+    # Only the protobuf types are needed, not a client or credentials
+    from google.cloud import documentai_v1 as documentai
+
+    lines = [line for line in text.split('\n') if line.strip()]
+    blocks = [(line, 0.08 + 0.84 * i / max(len(lines), 1), 0.08 + 0.84 * (i + 1) / max(len(lines), 1))
+              for i, line in enumerate(lines)]
+    if running_head:
+        blocks.insert(0, (running_head, 0.02, 0.04))
+    if folio:
+        blocks.append((folio, 0.95, 0.97))
+
+    full_text = ""
+    paragraphs = []
+    for line, top, bottom in blocks:
+        start = len(full_text)
+        full_text += line + "\n"
+        vertices = [documentai.NormalizedVertex(x=x, y=y) for x, y in ((0.1, top), (0.9, top), (0.9, bottom), (0.1, bottom))]
+        paragraphs.append(documentai.Document.Page.Paragraph(layout=documentai.Document.Page.Layout(
+            text_anchor=documentai.Document.TextAnchor(text_segments=[
+                documentai.Document.TextAnchor.TextSegment(start_index=start, end_index=len(full_text))]),
+            bounding_poly=documentai.BoundingPoly(normalized_vertices=vertices), confidence=confidence)))
+    page = documentai.Document.Page(page_number=1, paragraphs=paragraphs, layout=documentai.Document.Page.Layout(confidence=confidence),
+                                    dimension=documentai.Document.Page.Dimension(width=2480, height=3508, unit="pixels"))
+    return documentai.Document(text=full_text, pages=[page], mime_type="image/png")
+
+class FakeDocumentAIClient:
+    """Offline stand-in for documentai.DocumentProcessorServiceClient.
+
+    Returns a Document with the recorded page text keyed by the SHA-256 of the uploaded image
+    bytes (or `default_text` for unknown pages) after a configurable latency, and fails a
+    configurable fraction of calls. With `running_heads`, each page also gets a Devanagari
+    running head and a folio number in its margins. `page_confidences` sets the OCR confidence
+    reported for pages by hash (0.95 otherwise). Safe to share between threads like the
+    real client.
+    """
+
+    def __init__(self, page_texts: Optional[Dict[str, str]] = None, default_text: str = "",
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 0,
+                 running_heads: bool = False, page_confidences: Optional[Dict[str, float]] = None):
+        self.page_texts = page_texts or {}
+        self.page_confidences = page_confidences or {}
+        self.running_heads = running_heads
+        self.default_text = default_text
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def process_document(self, request=None, **kwargs):
+        request = request or SimpleNamespace(**kwargs)
+        content = request.raw_document.content
+        with self.lock:
+            self.calls += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            fail = self.random.random() < self.error_rate
+            if fail:
+                self.failures += 1
+        time.sleep(delay)
+        if fail:
+            raise FakeBackendError("Simulated Document AI failure")
+        page_hash = hashlib.sha256(content).hexdigest()
+        text = self.page_texts.get(page_hash, self.default_text)
+        confidence = self.page_confidences.get(page_hash, 0.95)
+        if self.running_heads:
+            return SimpleNamespace(document=fake_document(text, "चरकसंहिता", str(int(page_hash[:4], 16) % 900 + 1),
+                                                          confidence))
+        return SimpleNamespace(document=fake_document(text, confidence=confidence))
+
+class FakeTranslateClient:
+    """Offline stand-in for translate_v2.Client.
+
+    Accepts a single string or a list like the real client. Each call sleeps `latency`
+    plus `per_segment_latency` per text; a call fails if any of its texts is in
+    `failing_texts` or, at random, with probability `error_rate`.
+    """
+
+    def __init__(self, translations: Optional[Dict[str, str]] = None, latency: float = 0.0, per_segment_latency: float = 0.0,
+                 error_rate: float = 0.0, failing_texts=(), seed: int = 0):
+        self.translations = translations or {}
+        self.latency = latency
+        self.per_segment_latency = per_segment_latency
+        self.error_rate = error_rate
+        self.failing_texts = set(failing_texts)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.segments = 0
+        self.failures = 0
+
+    def translate(self, values, target_language=None, format_=None, **kwargs):
+        texts = [values] if isinstance(values, str) else list(values)
+        with self.lock:
+            self.calls += 1
+            self.segments += len(texts)
+            fail = self.random.random() < self.error_rate or any(text in self.failing_texts for text in texts)
+            if fail:
+                self.failures += 1
+        time.sleep(self.latency + self.per_segment_latency * len(texts))
+        if fail:
+            raise FakeBackendError("Simulated Translate failure")
+        results = [{"input": text, "translatedText": self.translations.get(text, f"[{target_language}] {text}")}
+                   for text in texts]
+        return results[0] if isinstance(values, str) else results
+
+def fake_interpretation(prompt: str) -> str:
+    """A response in the six-section layout the interpretation prompt asks for, tied to the prompt by its hash."""
+    digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+    sections = ["Translation", "Vocabulary and Key Terms", "Context and Significance", "Detailed Interpretation",
+                "Ayurvedic Principles and Applications", "Conclusion"]
+    return "\n".join(f"{i}. {name}:\n{name} for prompt {digest}.\n" for i, name in enumerate(sections, 1))
+
+def recorded_chapters() -> List[str]:
+    """Chapter codes with a recorded OCR Word document under ExtractedFromOCR."""
+    folder = os.path.join(RECORDED_ROOT, 'ExtractedFromOCR')
+    return sorted(c for c in os.listdir(folder)
+                  if os.path.exists(os.path.join(folder, c, 'charaka_samhita_output.docx')))
+
+def load_recorded_ocr_text(chapter_code: str) -> str:
+    """Recover the OCR text of a chapter from the 'OCR Content' section of its saved Word output."""
+    from CorpusStore import read_docx_ocr_text
+    return read_docx_ocr_text(os.path.join(RECORDED_ROOT, 'ExtractedFromOCR', chapter_code, 'charaka_samhita_output.docx'))
+
+def image_folder_for(chapter_code: str) -> str:
+    section, chapter = re.match(r'S(\d+)C(\d+)', chapter_code).groups()
+    return os.path.join(RECORDED_ROOT, 'ExtractedImage', f'S{section}-Chapter{chapter}')
+
+def recorded_page_texts(chapter_code: str) -> Dict[str, str]:
+    """Spread a chapter's recorded OCR text over its page images, keyed by image hash."""
+    folder = image_folder_for(chapter_code)
+    if not os.path.isdir(folder):
+        return {}
+    image_files = sorted(f for f in os.listdir(folder) if f.endswith('.png'))
+    lines = load_recorded_ocr_text(chapter_code).splitlines()
+    per_page = -(-len(lines) // max(len(image_files), 1))
+
+    page_texts = {}
+    for i, image_file in enumerate(image_files):
+        with open(os.path.join(folder, image_file), 'rb') as f:
+            page_hash = hashlib.sha256(f.read()).hexdigest()
+        page_texts[page_hash] = '\n'.join(lines[i * per_page:(i + 1) * per_page])
+    return page_texts
+
+def recorded_translations(chapter_code: str) -> Dict[str, str]:
+    with open(os.path.join(RECORDED_ROOT, 'ExtractedFromOCR', chapter_code, 'charaka_samhita_translated.json'), 'r', encoding='utf-8') as f:
+        verses = json.load(f)['book']['sanskrit_verses']
+    return {verse['sanskrit']: verse['translation'] for verse in verses}
+
+def all_recorded_page_texts() -> Dict[str, str]:
+    page_texts = {}
+    for code in recorded_chapters():
+        page_texts.update(recorded_page_texts(code))
+    return page_texts
+
+def all_recorded_translations() -> Dict[str, str]:
+    translations = {}
+    for code in recorded_chapters():
+        if os.path.exists(os.path.join(RECORDED_ROOT, 'ExtractedFromOCR', code, 'charaka_samhita_translated.json')):
+            translations.update(recorded_translations(code))
+    return translations
+
+def recorded_interpretation_responder() -> Callable[[str], str]:
+    """A MockBatchServer responder that replays the recorded interpretations under InterpretationByClaude.
+
+    A prompt for a verse group that was interpreted before gets that interpretation back in the
+    numbered-section layout; any other prompt gets fake_interpretation.
+    """
+    from ReportWriter import INTERPRETATION_SECTIONS
+
+    responses = {}
+    for path in glob.glob(os.path.join(RECORDED_ROOT, 'InterpretationByClaude', '*', 'output', '*.json')):
+        with open(path, 'r', encoding='utf-8') as f:
+            results = json.load(f).get('translations', [])
+        for result in results:
+            if result.get('translation') == "Error occurred":
+                continue
+            responses[result['sanskrit'].strip()] = "\n".join(
+                f"{i}. {label}:\n{result[field]}\n" for i, (label, field) in enumerate(INTERPRETATION_SECTIONS[1:], 1))
+
+    def respond(prompt: str) -> str:
+        sanskrit = prompt.split('Charaka Samhita:', 1)[-1].strip()
+        return responses.get(sanskrit) or fake_interpretation(prompt)
+
+    return respond
+
+# A passage marker in a packed interpretation prompt
+PACKED_PASSAGE_PATTERN = re.compile(r'^=== GROUP (\d+) ===$', re.MULTILINE)
+
+class MockBatchServer:
+    """Local HTTP stand-in for the Anthropic Messages and Message Batches endpoints.
+
+    Serves POST /v1/messages, POST /v1/messages/batches, GET /v1/messages/batches/<id> and its
+    /results on 127.0.0.1. Batches stay "in_progress" for `processing_seconds` after submission;
+    every message is answered by `responder(prompt)`, and batch requests whose prompt contains one
+    of `failing_texts` come back "errored". Synchronous requests sleep `latency` first.
+    System prompts marked with cache_control are prompt-cached once they reach
+    `min_cacheable_tokens`, and usage reports cache reads and writes like the real API.
+    Requests with "stream": true get server-sent events, `stream_chunk_chars` of text every
+    `stream_chunk_delay` seconds, with `trailing_text` appended after the response.
+    A packed prompt (several passages under "=== GROUP n ===" markers) is answered passage by
+    passage, each exactly as its single-group prompt would be, under its marker; with
+    `dropped_marker_rate` a marker is left out, as a model that ignored the format would.
+    Use as a context manager and point the client at `url`.
+    """
+
+    def __init__(self, responder: Callable[[str], str] = fake_interpretation, processing_seconds: float = 0.0,
+                 latency: float = 0.0, failing_texts=(), min_cacheable_tokens: int = 1024,
+                 stream_chunk_chars: int = 40, stream_chunk_delay: float = 0.0, trailing_text: str = "",
+                 dropped_marker_rate: float = 0.0, seed: int = 0):
+        self.responder = responder
+        self.processing_seconds = processing_seconds
+        self.latency = latency
+        self.failing_texts = list(failing_texts)
+        self.min_cacheable_tokens = min_cacheable_tokens
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_chunk_delay = stream_chunk_delay
+        self.trailing_text = trailing_text
+        self.dropped_marker_rate = dropped_marker_rate
+        self.dropped_markers = 0
+        self.random = random.Random(seed)
+        self.streamed_chars = 0
+        self.lock = threading.Lock()
+        self.prompt_cache = set()
+        self.batches = {}
+        self.message_calls = 0
+        self.batch_polls = 0
+        self.server = None
+        self.url = None
+
+    def answer(self, prompt: str) -> str:
+        from generateInterpretationWithClaudeSonnet import build_prompt
+
+        passages = PACKED_PASSAGE_PATTERN.split(prompt)
+        if len(passages) == 1:
+            return self.responder(prompt)
+        answers = []
+        for number, text in zip(passages[1::2], passages[2::2]):
+            with self.lock:
+                dropped = self.random.random() < self.dropped_marker_rate
+                self.dropped_markers += dropped
+            marker = "" if dropped else f"=== GROUP {number} ===\n"
+            answers.append(marker + self.responder(build_prompt(text.strip())))
+        return "\n".join(answers)
+
+    def message(self, params: Dict) -> Dict:
+        prompt = params["messages"][0]["content"]
+        if not isinstance(prompt, str):
+            prompt = "".join(block.get("text", "") for block in prompt)
+        text = self.answer(prompt) + self.trailing_text
+
+        # Prompt caching: a system prefix ending in a cache_control block is written on first use
+        # and read afterwards, provided it reaches the minimum cacheable length
+        system = params.get("system", "")
+        blocks = [{"type": "text", "text": system}] if isinstance(system, str) else system
+        system_tokens = sum(len(block["text"]) for block in blocks) // 3
+        usage = {"input_tokens": len(prompt) // 3, "output_tokens": len(text) // 4,
+                 "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        if blocks and "cache_control" in blocks[-1] and system_tokens >= self.min_cacheable_tokens:
+            prefix_hash = hashlib.sha256(json.dumps(blocks, sort_keys=True).encode('utf-8')).hexdigest()
+            with self.lock:
+                cached = prefix_hash in self.prompt_cache
+                self.prompt_cache.add(prefix_hash)
+            usage["cache_read_input_tokens" if cached else "cache_creation_input_tokens"] = system_tokens
+        else:
+            usage["input_tokens"] += system_tokens
+
+        return {
+            "type": "message",
+            "role": "assistant",
+            "model": params["model"],
+            "content": [{"type": "text", "text": text}],
+            "usage": usage
+        }
+
+    def batch_result(self, request: Dict) -> Dict:
+        prompt = json.dumps(request["params"]["messages"], ensure_ascii=False)
+        if any(text in prompt for text in self.failing_texts):
+            result = {"type": "errored", "error": {"type": "invalid_request_error", "message": "Simulated batch failure"}}
+        else:
+            result = {"type": "succeeded", "message": self.message(request["params"])}
+        return {"custom_id": request["custom_id"], "result": result}
+
+    def batch_status(self, batch_id: str) -> Dict:
+        batch = self.batches[batch_id]
+        ended = time.monotonic() - batch["submitted"] >= self.processing_seconds
+        succeeded = sum(1 for r in batch["results"] if r["result"]["type"] == "succeeded")
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {"processing": 0 if ended else len(batch["results"]),
+                               "succeeded": succeeded if ended else 0,
+                               "errored": len(batch["results"]) - succeeded if ended else 0,
+                               "canceled": 0, "expired": 0},
+            "results_url": f"{self.url}/messages/batches/{batch_id}/results" if ended else None
+        }
+
+    def __enter__(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status: int, body: str, content_type: str = "application/json"):
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_event(self, event: str, data: Dict):
+                self.wfile.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+            def stream(self, message: Dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+                self.end_headers()
+                text = message["content"][0]["text"]
+                try:
+                    self.send_event("message_start", {"type": "message_start", "message": {
+                        **message, "content": [], "usage": {**message["usage"], "output_tokens": 1}}})
+                    self.send_event("content_block_start", {"type": "content_block_start", "index": 0,
+                                                            "content_block": {"type": "text", "text": ""}})
+                    for start in range(0, len(text), mock.stream_chunk_chars):
+                        time.sleep(mock.stream_chunk_delay)
+                        chunk = text[start:start + mock.stream_chunk_chars]
+                        self.send_event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                                "delta": {"type": "text_delta", "text": chunk}})
+                        with mock.lock:
+                            mock.streamed_chars += len(chunk)
+                    self.send_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+                    self.send_event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn"},
+                                                      "usage": {"output_tokens": message["usage"]["output_tokens"]}})
+                    self.send_event("message_stop", {"type": "message_stop"})
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading early, which ends generation
+                    pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path == "/v1/messages":
+                    with mock.lock:
+                        mock.message_calls += 1
+                    time.sleep(mock.latency)
+                    if payload.get("stream"):
+                        self.stream(mock.message(payload))
+                    else:
+                        self.reply(200, json.dumps(mock.message(payload), ensure_ascii=False))
+                elif self.path == "/v1/messages/batches":
+                    # Answered before taking the lock, which message() takes for the prompt cache
+                    results = [mock.batch_result(r) for r in payload["requests"]]
+                    with mock.lock:
+                        batch_id = f"msgbatch_{len(mock.batches) + 1:04d}"
+                        mock.batches[batch_id] = {"submitted": time.monotonic(), "results": results}
+                    self.reply(200, json.dumps(mock.batch_status(batch_id)))
+                else:
+                    self.reply(404, json.dumps({"type": "error", "error": {"type": "not_found_error"}}))
+
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                if parts[:3] == ["v1", "messages", "batches"] and len(parts) >= 4 and parts[3] in mock.batches:
+                    batch_id = parts[3]
+                    if len(parts) == 4:
+                        with mock.lock:
+                            mock.batch_polls += 1
+                        self.reply(200, json.dumps(mock.batch_status(batch_id)))
+                        return
+                    if parts[4:] == ["results"] and mock.batch_status(batch_id)["processing_status"] == "ended":
+                        lines = [json.dumps(r, ensure_ascii=False) for r in mock.batches[batch_id]["results"]]
+                        self.reply(200, "\n".join(lines) + "\n", "application/x-jsonl")
+                        return
+                self.reply(404, json.dumps({"type": "error", "error": {"type": "not_found_error"}}))
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,10 +1,14 @@
 import json
 import os
 import logging
-from google.cloud import translate_v2 as translate
-from google.oauth2 import service_account
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from indic_transliteration import sanscript
-from indic_transliteration.sanscript import transliterate
+from TransliterationService import default_service as transliteration_service
+from PipelineMetrics import metrics
+from PipelineJournal import PipelineJournal, content_hash
+from CorpusStore import CorpusStore
+from Backends import make_translation_backend
+from VerseDedup import cluster_verses, translation_index, verse_reference
 
 # Set up logging
 log_folder = "logs"
@@ -15,6 +19,10 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Translate v2 accepts at most 128 segments per request and recommends staying under 5K characters
+MAX_BATCH_SEGMENTS = 128
+MAX_BATCH_CHARS = 5000
+
 def load_json(file_path):
     logging.debug(f"Attempting to load JSON from {file_path}")
     try:
@@ -39,7 +47,8 @@ def save_json(data, file_path):
 def translate_text(client, text, target_language='en'):
     logging.debug(f"Attempting to translate text: {text[:50]}...")
     try:
-        result = client.translate(text, target_language=target_language, format_='text')
+        with metrics.timer("translation_verse"):
+            result = client.translate(text, target_language=target_language, format_='text')
         translation = result['translatedText']
         logging.debug(f"Successfully translated text")
         return translation
@@ -47,49 +56,191 @@ def translate_text(client, text, target_language='en'):
         logging.error(f"Error translating text: {e}")
         return None
 
-def transliterate_sanskrit(text):
-    logging.debug(f"Attempting to transliterate text: {text[:50]}...")
+def make_batches(texts, max_chars=MAX_BATCH_CHARS, max_segments=MAX_BATCH_SEGMENTS):
+    """Pack texts, in order, into batches of indices bounded by total characters and segment count."""
+    batches = []
+    batch, batch_chars = [], 0
+    for i, text in enumerate(texts):
+        if batch and (batch_chars + len(text) > max_chars or len(batch) >= max_segments):
+            batches.append(batch)
+            batch, batch_chars = [], 0
+        batch.append(i)
+        batch_chars += len(text)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def translate_batch(client, texts, target_language='en'):
+    logging.debug(f"Attempting to translate a batch of {len(texts)} texts")
+    try:
+        with metrics.timer("translation_batch"):
+            results = client.translate(texts, target_language=target_language, format_='text')
+        metrics.increment("verses_translated", len(texts))
+        logging.debug(f"Successfully translated batch")
+        return [result['translatedText'] for result in results]
+    except Exception as e:
+        # Fall back to one request per text so a single bad item doesn't fail the whole batch
+        logging.error(f"Error translating batch of {len(texts)} texts, retrying individually: {e}")
+        metrics.increment("translation_batch_fallbacks")
+        return [translate_text(client, text, target_language) for text in texts]
+
+def translate_batches(client, texts, target_language='en', max_workers=4, max_chars=MAX_BATCH_CHARS, max_segments=MAX_BATCH_SEGMENTS):
+    """Translate texts in size-bounded batches run concurrently, yielding (indices, translations) as each batch finishes."""
+    batches = make_batches(texts, max_chars, max_segments)
+    logging.info(f"Translating {len(texts)} texts in {len(batches)} batches")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(translate_batch, client, [texts[i] for i in batch], target_language): batch
+                   for batch in batches}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+def transliterate_sanskrit(text, scheme=sanscript.IAST):
     try:
-        transliterated = transliterate(text, sanscript.DEVANAGARI, sanscript.IAST)
-        logging.debug(f"Successfully transliterated text")
-        return transliterated
+        return transliteration_service.transliterate(text, scheme)
     except Exception as e:
-        logging.error(f"Error transliterating text: {e}")
+        logging.error(f"Error transliterating text {text[:50]}: {e}")
         return None
 
-def process_verses(input_json, output_json, credentials_path):
+def transliterate_chapter(texts, schemes=(sanscript.IAST,)):
+    """Transliterate every verse of a chapter into each scheme; a verse that fails gets None for every scheme."""
+    try:
+        return transliteration_service.transliterate_many(texts, schemes)
+    except Exception as e:
+        logging.error(f"Error transliterating chapter, falling back to one verse at a time: {e}")
+        return [{scheme: transliterate_sanskrit(text, scheme) for scheme in schemes} for text in texts]
+
+def process_verses(input_json, output_json, credentials_path, journal=None, max_workers=4, client=None, extra_schemes=(), store=None,
+                   dedup_index=None, unique=False):
+    """Transliterate and translate a chapter's verses; returns the number of verses left incomplete.
+
+    Identical and near-identical verses are translated once and the translation is copied to the
+    others, and a verse matching one already translated in dedup_index reuses that translation
+    (new translations are added to it). A copied translation names the verse it was made for in
+    'translation_source'. unique=True translates every verse.
+    """
     logging.info(f"Starting process_verses with input: {input_json}, output: {output_json}")
     try:
         # Set up the translation client
-        credentials = service_account.Credentials.from_service_account_file(credentials_path)
-        client = translate.Client(credentials=credentials)
+        if client is None:
+            client = make_translation_backend("google", credentials_path)
 
         data = load_json(input_json)
 
-        for verse in data['book']['sanskrit_verses']:
+        # IAST is the 'transliteration' field; other schemes are stored as 'transliteration_<scheme>'
+        schemes = [sanscript.IAST] + [scheme for scheme in extra_schemes if scheme != sanscript.IAST]
+
+        section, chapter = data['book']['section'], data['book']['chapter']
+        pending = []
+        resumed = []
+        for i, verse in enumerate(data['book']['sanskrit_verses']):
             sanskrit_text = verse['sanskrit']
 
-            transliteration = transliterate_sanskrit(sanskrit_text)
-            translation = translate_text(client, sanskrit_text)
+            # OCR can repeat verse numbers, so journal items are keyed by position as well
+            item = f"{i}:{verse['verse_number']}"
+            verse_hash = content_hash(sanskrit_text, schemes)
+            done = journal.get("translation", item, verse_hash) if journal else None
+            if done is not None:
+                verse.update(done)
+                resumed.append((i, verse))
+                logging.info(f"Skipping verse {verse['verse_number']}, already in journal")
+                metrics.increment("translation_journal_hits")
+                continue
+            pending.append((i, verse, item, verse_hash))
+        if store:
+            store.upsert_verses(section, chapter, resumed)
 
-            verse['transliteration'] = transliteration
-            verse['translation'] = translation
+        texts = [verse['sanskrit'] for _, verse, _, _ in pending]
+        with metrics.timer("transliteration_chapter"):
+            transliterations = transliterate_chapter(texts, schemes)
+        logging.info(f"Transliterated {len(texts)} verses; word cache: {transliteration_service.cache_info()}")
+
+        if unique:
+            reused, clusters = {}, {i: [i] for i in range(len(texts))}
+        else:
+            reused, clusters = cluster_verses(texts, dedup_index)
+        saved = len(texts) - len(clusters)
+        if saved:
+            logging.info(f"Section {section} chapter {chapter}: translating {len(clusters)} of {len(texts)} verses; "
+                         f"{len(reused)} reuse a corpus translation, {saved - len(reused)} share one with a near-duplicate")
+            metrics.increment("translation_dedup_reused", len(reused))
+            metrics.increment("translation_dedup_shared", saved - len(reused))
+
+        def complete(i, translation, source=None):
+            _, verse, item, verse_hash = pending[i]
+            completed = {"transliteration": transliterations[i][sanscript.IAST], "translation": translation}
+            for scheme in schemes[1:]:
+                completed[f'transliteration_{scheme}'] = transliterations[i][scheme]
+            verse.update(completed)
+            # Recorded apart from `completed`, whose None values mark a failed verse
+            if source:
+                verse['translation_source'] = source
+            else:
+                verse.pop('translation_source', None)
+
+            # Failed verses are left out of the journal so the next run retries them
+            if journal and None not in completed.values():
+                journal.record("translation", item, verse_hash, {**completed, "translation_source": source} if source else completed)
 
             logging.info(f"Processed verse {verse['verse_number']}")
 
+        for i, value in reused.items():
+            complete(i, value["translation"], value["source"])
+        if store and reused:
+            store.upsert_verses(section, chapter, [(pending[i][0], pending[i][1]) for i in reused])
+
+        representatives = list(clusters)
+        for indices, translations in translate_batches(client, [texts[i] for i in representatives], max_workers=max_workers):
+            done = []
+            for j, translation in zip(indices, translations):
+                representative = representatives[j]
+                source = verse_reference(section, chapter, pending[representative][1]['verse_number'])
+                if dedup_index is not None and translation is not None:
+                    dedup_index.add(texts[representative], {"translation": translation, "source": source})
+                for i in clusters[representative]:
+                    complete(i, translation, source if i != representative else None)
+                    done.append(i)
+
+            # One upsert per translation batch, instead of rewriting a whole JSON file
+            if store:
+                store.upsert_verses(section, chapter, [(pending[i][0], pending[i][1]) for i in done])
+
         save_json(data, output_json)
         logging.info(f"Processed JSON saved to {output_json}")
+
+        # Number of verses still missing a translation or transliteration
+        return sum(1 for verse in data['book']['sanskrit_verses']
+                   if verse.get('translation') is None or verse.get('transliteration') is None)
     except Exception as e:
         logging.error(f"Error in process_verses: {e}")
         raise
 
+def translate_chapter(input_json, output_json, credentials_path, max_workers=4, client=None, dedup_index=None, unique=False):
+    """Translate and transliterate one chapter, resuming from its journal; returns the number of failed verses.
+
+    Without a dedup_index, verses are matched against every translation already in the corpus store.
+    """
+    journal_path = os.path.join("journal", f"translation_{os.path.basename(os.path.dirname(output_json))}.jsonl")
+
+    journal = PipelineJournal(journal_path)
+    store = CorpusStore()
+    try:
+        if dedup_index is None and not unique:
+            dedup_index = translation_index(store)
+        return process_verses(input_json, output_json, credentials_path, journal, max_workers, client, store=store,
+                              dedup_index=dedup_index, unique=unique)
+    finally:
+        store.close()
+        journal.close()
+
 if __name__ == "__main__":
     input_json = "ExtractedFromOCR/S1C5/charaka_samhita_output.json"
     output_json = "ExtractedFromOCR/S1C5/charaka_samhita_translated.json"
     credentials_path = "csprocessor-service-account.json"
 
     try:
-        process_verses(input_json, output_json, credentials_path)
+        translate_chapter(input_json, output_json, credentials_path)
         logging.info("Processing completed successfully.")
     except Exception as e:
         logging.error(f"An error occurred: {e}")
+    finally:
+        metrics.write_summary(f"translation_{os.path.basename(os.path.dirname(output_json))}")
@@ -1,11 +1,32 @@
+from __future__ import annotations
+
 import os
 import re
 import json
+import time
 import logging
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Union
 from datetime import datetime
-from google.cloud import documentai_v1 as documentai
-from docx import Document
+from PipelineJournal import PipelineJournal, content_hash, file_hash
+from PageArchive import PageArchive, PageFolder, open_pages, page_source_name
+from ResponseCache import ResponseCache
+from PreprocessImages import PREPROCESSED_FOLDER, CACHE_FOLDER as PREPROCESS_CACHE_FOLDER, cached_preprocess, preprocess_folder
+from PipelineMetrics import metrics
+from VerseIndex import VerseIndex
+from CorpusStore import CorpusStore
+from ReportWriter import write_ocr_docx
+
+# The Document AI library is imported where a real request or response is built, so the
+# parser, the OCR cache and the fake backends work without it being loaded
+if TYPE_CHECKING:
+    from google.cloud import documentai_v1 as documentai
+
+# zstd is optional: without it cached Document AI responses are stored uncompressed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Set up logging
 log_folder = "logs"
@@ -14,13 +35,21 @@ log_file = os.path.join(log_folder, f"charaka_samhita_processing_{datetime.now()
 logging.basicConfig(filename=log_file, level=logging.DEBUG,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-def process_document(project_id: str, location: str, processor_id: str, file_path: str) -> documentai.Document:
+def process_document(project_id: str, location: str, processor_id: str, file_path: str, client: documentai.DocumentProcessorServiceClient = None,
+                     content: Union[bytes, memoryview] = None) -> documentai.Document:
+    """OCR one page image; `content` is its bytes if the caller already has them, e.g. from a page archive."""
+    from google.cloud import documentai_v1 as documentai
+
     logging.info(f"Processing document: {file_path}")
-    client = documentai.DocumentProcessorServiceClient()
+    # Reuse the caller's client so its gRPC channel is shared across pages
+    client = client or documentai.DocumentProcessorServiceClient()
     name = f"projects/{project_id}/locations/{location}/processors/{processor_id}"
 
-    with open(file_path, "rb") as image:
-        image_content = image.read()
+    if content is not None:
+        image_content = bytes(content)
+    else:
+        with open(file_path, "rb") as image:
+            image_content = image.read()
 
     raw_document = documentai.RawDocument(content=image_content, mime_type="image/png")
     request = documentai.ProcessRequest(name=name, raw_document=raw_document)
@@ -33,122 +62,390 @@ def process_document(project_id: str, location: str, processor_id: str, file_pat
         logging.error(f"Error processing document: {e}")
         raise
 
-def extract_text(document: documentai.Document) -> str:
-    """Extract text from the entire document."""
-    return document.text
+# Full Document AI responses, keyed by page image hash and processor
+OCR_CACHE_FILE = os.path.join("ExtractedFromOCR", "cache", "ocr_documents.sqlite")
+
+# Pages are flagged for re-OCR below this mean confidence, or with more than MAX_LOW_CONFIDENCE_SHARE
+# of their text below LOW_CONFIDENCE, or when a verse line is less than MIN_VERSE_DEVANAGARI_SHARE Devanagari
+PAGE_CONFIDENCE_THRESHOLD = 0.8
+LOW_CONFIDENCE = 0.5
+MAX_LOW_CONFIDENCE_SHARE = 0.2
+MIN_VERSE_DEVANAGARI_SHARE = 0.8
+# A re-OCR result keeping less of the page's Devanagari than this lost text and is never used
+MIN_RETAINED_DEVANAGARI = 0.9
+
+# Per-page OCR records of a chapter (text, confidence, anomalies), next to its JSON output
+PAGES_FILE_NAME = 'charaka_samhita_pages.json'
+# Re-OCR uploads a deskewed, cropped grayscale page ("gray", as PreprocessImages --mode names it): a
+# different image from both the raw scan and the default bilevel preprocessing, so not the same cached OCR result
+REOCR_PREPROCESS_OPTIONS = {"mode": "gray"}
+
+# Paragraphs this close to the top or bottom of the page (fraction of its height) and no
+# longer than this are running heads or folio numbers, not text
+MARGIN_BAND = 0.06
+MARGIN_TEXT_MAX_CHARS = 60
+
+def encode_document(document: documentai.Document) -> bytes:
+    """A Document AI response in its protobuf wire format, zstd-compressed when zstandard is installed."""
+    from google.cloud import documentai_v1 as documentai
+
+    data = documentai.Document.serialize(document)
+    if zstandard:
+        return b'Z' + zstandard.ZstdCompressor(level=10).compress(data)
+    return b'P' + data
+
+def decode_document(value: bytes) -> documentai.Document:
+    from google.cloud import documentai_v1 as documentai
+
+    data = value[1:]
+    if value[:1] == b'Z':
+        if zstandard is None:
+            raise RuntimeError("The OCR cache holds zstd-compressed documents; install zstandard to read them")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return documentai.Document.deserialize(data)
+
+def ocr_cache_key(image_hash: str, processor_id: str) -> str:
+    return ResponseCache.make_key(image=image_hash, processor=processor_id)
+
+def anchor_text(document: documentai.Document, text_anchor: documentai.Document.TextAnchor) -> str:
+    return "".join(document.text[segment.start_index:segment.end_index] for segment in text_anchor.text_segments)
+
+def normalized_box(layout: documentai.Document.Page.Layout, dimension: documentai.Document.Page.Dimension) -> tuple:
+    """(left, top, right, bottom) of a layout element as fractions of the page size."""
+    poly = layout.bounding_poly
+    if poly.normalized_vertices:
+        xs = [v.x for v in poly.normalized_vertices]
+        ys = [v.y for v in poly.normalized_vertices]
+    elif poly.vertices and dimension.width and dimension.height:
+        xs = [v.x / dimension.width for v in poly.vertices]
+        ys = [v.y / dimension.height for v in poly.vertices]
+    else:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+def layout_text(document: documentai.Document) -> str:
+    """Page text rebuilt from Document AI's paragraph layout rather than the flat document.text.
+
+    Short paragraphs lying entirely in the top or bottom margin (running heads, folio numbers)
+    are dropped, since a folio number reads as the start of a verse and a Devanagari running
+    head would be glued into one. The remaining paragraphs are grouped into columns by
+    horizontal overlap and read column by column, top to bottom. Pages without paragraph
+    layout fall back to document.text.
+    """
+    if not any(page.paragraphs for page in document.pages):
+        return document.text
+
+    page_texts = []
+    for page in document.pages:
+        paragraphs = []
+        for paragraph in page.paragraphs:
+            text = anchor_text(document, paragraph.layout.text_anchor).strip()
+            box = normalized_box(paragraph.layout, page.dimension)
+            if not text:
+                continue
+            if box and (box[3] < MARGIN_BAND or box[1] > 1 - MARGIN_BAND) and len(text) <= MARGIN_TEXT_MAX_CHARS:
+                metrics.increment("ocr_layout_margin_paragraphs")
+                continue
+            paragraphs.append((box or (0.0, 0.0, 1.0, 0.0), text))
+
+        # Columns: paragraphs whose horizontal extents overlap belong to the same column, so a
+        # full-width paragraph joins everything into one column read top to bottom
+        columns = []
+        for box, text in sorted(paragraphs, key=lambda p: p[0][0]):
+            if columns and box[0] < columns[-1]['right']:
+                columns[-1]['right'] = max(columns[-1]['right'], box[2])
+                columns[-1]['paragraphs'].append((box, text))
+            else:
+                columns.append({'right': box[2], 'paragraphs': [(box, text)]})
+        page_texts.append("\n".join(text for column in columns
+                                     for _, text in sorted(column['paragraphs'], key=lambda p: p[0][1])))
+    return "\n".join(page_texts)
+
+def extract_text(document: documentai.Document, layout: bool = False) -> str:
+    """Extract text from the entire document, in Document AI's order or rebuilt from its layout."""
+    return layout_text(document) if layout else document.text
+
+def document_confidence(document: documentai.Document) -> tuple[Optional[float], Optional[float]]:
+    """A page's mean OCR confidence and the share of its text below LOW_CONFIDENCE, weighted by text length.
+
+    Tokens are used where Document AI returns them, otherwise lines, then paragraphs, then
+    the page's own confidence. (None, None) when the response carries no confidence at all.
+    """
+    weighted, low, total = 0.0, 0.0, 0
+    page_confidences = []
+    for page in document.pages:
+        elements = page.tokens or page.lines or page.paragraphs
+        for element in elements:
+            weight = len(anchor_text(document, element.layout.text_anchor).strip())
+            if weight:
+                weighted += element.layout.confidence * weight
+                low += weight if element.layout.confidence < LOW_CONFIDENCE else 0
+                total += weight
+        if not elements and page.layout.confidence:
+            page_confidences.append(page.layout.confidence)
+    if total:
+        return round(weighted / total, 4), round(low / total, 4)
+    if page_confidences:
+        return round(sum(page_confidences) / len(page_confidences), 4), None
+    return None, None
+
+def ocr_page(project_id: str, location: str, processor_id: str, file_path: str, client: documentai.DocumentProcessorServiceClient,
+             retries: int = 3, delay: float = 5, cache: ResponseCache = None, image_hash: str = None,
+             cache_only: bool = False, content: Union[bytes, memoryview] = None, refresh: bool = False) -> documentai.Document:
+    """OCR one page image, or return its Document AI response from the cache if the same image was OCRed before.
+
+    refresh=True always makes a new call and leaves the cache as it is.
+    """
+    if refresh:
+        cache = None
+    if cache is not None:
+        image_hash = image_hash or file_hash(file_path)
+        value = cache.get(ocr_cache_key(image_hash, processor_id))
+        if value is not None:
+            metrics.increment("ocr_cache_hits")
+            return decode_document(value)
+        if cache_only:
+            raise LookupError(f"{file_path} is not in the OCR cache")
+    for attempt in range(retries):
+        try:
+            with metrics.timer("ocr_page"):
+                document = process_document(project_id, location, processor_id, file_path, client, content)
+            break
+        except Exception as e:
+            if attempt < retries - 1:
+                metrics.increment("ocr_retries")
+                wait = delay * 2 ** attempt
+                logging.warning(f"OCR failed for {file_path} (attempt {attempt + 1}/{retries}): {e}. Retrying in {wait} seconds...")
+                time.sleep(wait)
+            else:
+                logging.error(f"OCR failed for {file_path} after {retries} attempts")
+                raise
+    if cache is not None:
+        value = encode_document(document)
+        metrics.increment("ocr_cache_bytes", len(value))
+        cache.set(ocr_cache_key(image_hash, processor_id), value)
+    return document
+
+DEVANAGARI_PATTERN = re.compile(r'[\u0900-\u097F]')
+# Anything in a verse line other than Devanagari, digits, whitespace and ordinary punctuation
+FOREIGN_CHARACTER_PATTERN = re.compile(r'[^\s\u0900-\u097F\d.,;:!?()\[\]\-–—\'"|]')
+NON_DEVANAGARI_PATTERN = re.compile(r'[^\u0900-\u097F\s।॥]+')
+VERSE_GROUP_PATTERN = re.compile(r'\[(\d+(?:-\d+)?)\]')
+VERSE_END_PATTERN = re.compile(r'।।\s*(\d+)\s*।।')
+VERSE_START_PATTERN = re.compile(r'(\d+)\.?\s*(.+)')
 
 def is_sanskrit(text: str) -> bool:
-    return bool(re.search(r'[\u0900-\u097F]', text))
+    return DEVANAGARI_PATTERN.search(text) is not None
 
 def extract_verses_and_groups(ocr_text: str) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split OCR text into numbered Sanskrit verses and the verse groups cited in the translation.
+
+    Single pass over the lines with two states: outside a verse, or collecting one. The parts
+    of the open verse are kept in a list and joined once, and whether it contains Devanagari
+    is tracked as parts arrive rather than by rescanning the growing verse.
+    """
     sanskrit_verses = []
     verse_groups = []
-    current_verse = ""
+    verse_parts = []
+    verse_has_sanskrit = False
     current_verse_number = None
 
-    lines = ocr_text.splitlines()
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
+    for line in ocr_text.splitlines():
+        line = line.strip()
         if not line:
-            i += 1
             continue
 
-        # Detect verse groups
-        verse_group_match = re.search(r'\[(\d+(?:-\d+)?)\]', line)
-        if verse_group_match:
-            verse_groups.append(verse_group_match.group(1))
+        # Detect verse groups, e.g. "[11-14]" at the end of a translation paragraph
+        if '[' in line:
+            verse_group_match = VERSE_GROUP_PATTERN.search(line)
+            if verse_group_match:
+                verse_groups.append(verse_group_match.group(1))
 
-        # Check for verse end
-        verse_end_match = re.search(r'।।\s*(\d+)\s*।।', line)
+        # Check for verse end, e.g. "।।१५।।"
+        verse_end_match = VERSE_END_PATTERN.search(line) if '।।' in line else None
         if verse_end_match:
-            verse_number = int(verse_end_match.group(1))
-            current_verse += " " + line[:verse_end_match.start()].strip()
-            if is_sanskrit(current_verse):
+            tail = line[:verse_end_match.start()]
+            if verse_has_sanskrit or is_sanskrit(tail):
+                verse_parts.append(tail)
                 sanskrit_verses.append({
-                    "verse_number": verse_number,
-                    "sanskrit": clean_sanskrit(current_verse)
+                    "verse_number": int(verse_end_match.group(1)),
+                    "sanskrit": clean_sanskrit(" ".join(verse_parts))
                 })
-            current_verse = ""
+            verse_parts = []
+            verse_has_sanskrit = False
             current_verse_number = None
         elif current_verse_number is not None:
-            current_verse += " " + line
+            verse_parts.append(line)
+            verse_has_sanskrit = verse_has_sanskrit or is_sanskrit(line)
         else:
-            # Check for verse start
-            verse_start_match = re.match(r'^(\d+)\.?\s*(.+)', line)
+            # Check for verse start: a leading number (Latin or Devanagari digits)
+            verse_start_match = VERSE_START_PATTERN.match(line) if line[0].isdecimal() else None
             if verse_start_match:
-                if current_verse and is_sanskrit(current_verse):
-                    sanskrit_verses.append({
-                        "verse_number": current_verse_number,
-                        "sanskrit": clean_sanskrit(current_verse)
-                    })
                 current_verse_number = int(verse_start_match.group(1))
-                current_verse = verse_start_match.group(2)
+                verse_parts = [verse_start_match.group(2)]
+                verse_has_sanskrit = is_sanskrit(verse_parts[0])
             elif is_sanskrit(line):
-                current_verse = line
                 current_verse_number = len(sanskrit_verses) + 1
-
-        i += 1
+                verse_parts = [line]
+                verse_has_sanskrit = True
 
     # Handle any remaining verse
-    if current_verse and is_sanskrit(current_verse):
+    if verse_has_sanskrit:
         sanskrit_verses.append({
             "verse_number": current_verse_number or len(sanskrit_verses) + 1,
-            "sanskrit": clean_sanskrit(current_verse)
+            "sanskrit": clean_sanskrit(" ".join(verse_parts))
         })
 
     return sanskrit_verses, verse_groups
 
 def clean_sanskrit(text: str) -> str:
-    # Remove non-Devanagari characters except for । and ॥
-    cleaned = re.sub(r'[^\u0900-\u097F\s।॥]', '', text)
-    # Remove extra spaces
-    cleaned = re.sub(r'\s+', ' ', cleaned).strip()
-    return cleaned
-
-def process_all_images(project_id: str, location: str, processor_id: str, folder_path: str) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[str]]:
-    all_ocr_text = ""
-    image_files = sorted([f for f in os.listdir(folder_path) if f.endswith('.png')])
-
-    for image_file in image_files:
+    # Remove non-Devanagari characters except for । and ॥, then collapse whitespace
+    return " ".join(NON_DEVANAGARI_PATTERN.sub('', text).split())
+
+def devanagari_share(text: str) -> float:
+    devanagari = len(DEVANAGARI_PATTERN.findall(text))
+    foreign = len(FOREIGN_CHARACTER_PATTERN.findall(text))
+    return devanagari / (devanagari + foreign) if devanagari + foreign else 1.0
+
+def page_anomalies(page_texts: List[str]) -> List[List[str]]:
+    """Parse problems that point at a page's OCR, for each page of a chapter in order.
+
+    Verse numbers are read from the verse ends ("।।१५।।") across page boundaries: a gap or a
+    repeated number is reported on the page where it shows and, when it falls between two
+    pages, on the page before as well. A lower number starts a new sequence, as the summary
+    verses at the end of a chapter do. A verse line that is mostly Latin letters or symbols
+    (OCR debris such as "।।३।। ab need aniliyono") is reported on its page.
+    """
+    anomalies = [[] for _ in page_texts]
+    previous = None
+    for page, text in enumerate(page_texts):
+        for match in VERSE_END_PATTERN.finditer(text):
+            number = int(match.group(1))
+            if previous is not None:
+                previous_page, previous_number = previous
+                note = None
+                if number > previous_number + 1:
+                    missing = f"{previous_number + 1}" if number == previous_number + 2 else f"{previous_number + 1}-{number - 1}"
+                    note = f"verse {missing} missing between {previous_number} and {number}"
+                elif number == previous_number:
+                    note = f"verse {number} repeated"
+                if note:
+                    anomalies[page].append(note)
+                    if previous_page != page:
+                        anomalies[previous_page].append(note)
+            previous = (page, number)
+        for line in text.splitlines():
+            if is_sanskrit(line):
+                share = devanagari_share(line)
+                if share < MIN_VERSE_DEVANAGARI_SHARE:
+                    anomalies[page].append(f"verse line only {share:.0%} Devanagari: {line.strip()[:40]}")
+    return anomalies
+
+def low_confidence(record: Dict[str, Any]) -> bool:
+    return (record.get("confidence") is not None and record["confidence"] < PAGE_CONFIDENCE_THRESHOLD) \
+        or (record.get("low_confidence_share") is not None and record["low_confidence_share"] > MAX_LOW_CONFIDENCE_SHARE)
+
+def assess_pages(records: List[Dict[str, Any]]) -> List[str]:
+    """Record each page's parse anomalies and whether it is flagged for re-OCR; returns the flagged page names."""
+    for record, anomalies in zip(records, page_anomalies([record["text"] for record in records])):
+        record["anomalies"] = anomalies
+        record["flagged"] = bool(anomalies) or low_confidence(record)
+    return [record["page"] for record in records if record["flagged"]]
+
+def page_quality(record: Dict[str, Any], anomalies: List[str]) -> tuple:
+    """Orders OCR results of one page, best last: fewest anomalies, then confident, then highest confidence."""
+    return -len(anomalies), not low_confidence(record), record.get("confidence") or 0.0
+
+def ocr_pages(project_id: str, location: str, processor_id: str, folder_path: str, journal: PipelineJournal = None,
+              max_workers: int = 4, client: documentai.DocumentProcessorServiceClient = None, retry_delay: float = 5,
+              cache: ResponseCache = None, layout: bool = False, cache_only: bool = False,
+              overrides: Dict[str, Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """OCR every page of a folder or page archive and return one record per page, in page order.
+
+    A record holds the page name, its image hash, its text, the OCR confidence (see
+    document_confidence), the layout mode and its source, "ocr" or a re-OCR method. `overrides`
+    are earlier re-OCR records by page name; one replaces the page's OCR while the image hash and
+    layout mode it was made for still match.
+    """
+    pages = open_pages(folder_path)
+    image_files = pages.names()
+    overrides = overrides or {}
+    # One client for the whole chapter; its channel is thread-safe and multiplexes concurrent requests
+    if not cache_only and client is None:
+        from Backends import make_ocr_backend
+        client = make_ocr_backend("documentai")
+
+    def ocr_image(image_file: str) -> Dict[str, Any]:
         file_path = os.path.join(folder_path, image_file)
-        document = process_document(project_id, location, processor_id, file_path)
-        all_ocr_text += extract_text(document) + "\n\n"
-
-    sanskrit_verses, verse_groups = extract_verses_and_groups(all_ocr_text)
+        page_hash = pages.page_hash(image_file)
+        override = overrides.get(image_file)
+        if override and override["hash"] == page_hash and override["layout"] == layout:
+            logging.info(f"Using the {override['source']} text of {image_file}")
+            metrics.increment("ocr_reocr_reused")
+            return override
+        # Layout text is a different result from the same image, so it is journaled under its own hash
+        text_hash = content_hash(page_hash, "layout") if layout else page_hash
+        page = journal.get("ocr", image_file, text_hash) if journal else None
+        if page is not None:
+            logging.info(f"Skipping OCR for {image_file}, already in journal")
+            metrics.increment("ocr_journal_hits")
+            # Journals written before confidences were kept hold the page text alone
+            if isinstance(page, str):
+                page = {"text": page, "confidence": None, "low_confidence_share": None}
+        else:
+            document = ocr_page(project_id, location, processor_id, file_path, client, delay=retry_delay,
+                                cache=cache, image_hash=page_hash, cache_only=cache_only,
+                                content=pages.page_bytes(image_file) if isinstance(pages, PageArchive) else None)
+            confidence, low_confidence_share = document_confidence(document)
+            page = {"text": extract_text(document, layout), "confidence": confidence,
+                    "low_confidence_share": low_confidence_share}
+            if journal:
+                journal.record("ocr", image_file, text_hash, page)
+        return {"page": image_file, "hash": page_hash, **page, "layout": layout, "source": "ocr"}
+
+    # executor.map keeps pages in file order
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(ocr_image, image_files))
+    finally:
+        pages.close()
+
+def chapter_ocr_text(records: List[Dict[str, Any]]) -> str:
+    return "".join(f"{record['text']}\n\n" for record in records)
+
+def process_all_images(project_id: str, location: str, processor_id: str, folder_path: str, journal: PipelineJournal = None,
+                       max_workers: int = 4, client: documentai.DocumentProcessorServiceClient = None, retry_delay: float = 5,
+                       cache: ResponseCache = None, layout: bool = False, cache_only: bool = False) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[str]]:
+    """OCR every page of a folder or page archive and parse the chapter's verses and groups.
+
+    Pages in an archive are uploaded straight from its memory mapping, and their hashes come
+    from its index, so cached and journaled pages are never read. With a cache, each page's full Document AI response is kept under its image hash, so
+    re-extracting the text (e.g. with layout=True) or re-parsing never repeats a paid call;
+    cache_only=True raises LookupError rather than calling the API for an uncached page.
+    """
+    records = ocr_pages(project_id, location, processor_id, folder_path, journal, max_workers, client, retry_delay,
+                        cache, layout, cache_only)
+    all_ocr_text = chapter_ocr_text(records)
+
+    with metrics.timer("parse_chapter"):
+        sanskrit_verses, verse_groups = extract_verses_and_groups(all_ocr_text)
     return sanskrit_verses, verse_groups, [all_ocr_text]
 
 def save_to_word(sanskrit_verses: List[Dict[str, Any]], verse_groups: List[Dict[str, Any]], ocr_content: List[str], output_path: str) -> None:
-    document = Document()
-    document.add_heading('Charaka Samhita OCR Output', 0)
-
-    document.add_heading('OCR Content', level=1)
-    for content in ocr_content:
-        document.add_paragraph(content)
-
-    document.add_heading('Sanskrit Verses', level=1)
-    for verse in sanskrit_verses:
-        if verse.get('error'):
-            document.add_paragraph(f"Error: {verse['error']}")
-        document.add_paragraph(f"Verse {verse.get('verse_number', 'Unknown')}: {verse['sanskrit']}")
+    write_ocr_docx(sanskrit_verses, verse_groups, ocr_content, output_path)
 
-    document.add_heading('Verse Groups', level=1)
-    for group in verse_groups:
-        document.add_paragraph(f"Verse Group: {group}")
-
-    document.save(output_path)
-    logging.info(f"OCR output has been written to {output_path}")
-
-def process_text(ocr_text: str) -> dict:
+def process_text(ocr_text: str, section: int = 1, chapter: int = 5) -> dict:
     sanskrit_verses, verse_groups = extract_verses_and_groups(ocr_text)
+    # Flag OCR numbering problems (gaps, duplicates, verses outside every group) while they are cheap to fix
+    VerseIndex(sanskrit_verses).log_report(verse_groups, f"S{section}C{chapter}")
 
     output = {
         "timestamp": datetime.now().isoformat(),
         "book": {
             "title": "Charaka Samhita",
             "volume": 1,
-            "section": 1,
-            "chapter": 5,
+            "section": section,
+            "chapter": chapter,
             "chapter_name": "",
             "sanskrit_verses": sanskrit_verses,
             "verse_groups": verse_groups
@@ -157,6 +454,202 @@ def process_text(ocr_text: str) -> dict:
 
     return output
 
+def chapter_output_folder(section: int, chapter: int) -> str:
+    return f"ExtractedFromOCR/S{section}C{chapter}"
+
+def load_page_records(section: int, chapter: int) -> List[Dict[str, Any]]:
+    """The per-page OCR records written with a chapter's output, or [] if it has none yet."""
+    pages_path = os.path.join(chapter_output_folder(section, chapter), PAGES_FILE_NAME)
+    if not os.path.exists(pages_path):
+        return []
+    with open(pages_path, encoding='utf-8') as f:
+        return json.load(f)["pages"]
+
+def save_page_records(records: List[Dict[str, Any]], section: int, chapter: int) -> str:
+    output_folder = chapter_output_folder(section, chapter)
+    os.makedirs(output_folder, exist_ok=True)
+    pages_path = os.path.join(output_folder, PAGES_FILE_NAME)
+    temp_path = f"{pages_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({"section": section, "chapter": chapter, "pages": records}, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, pages_path)
+    return pages_path
+
+def write_chapter_output(records: List[Dict[str, Any]], section: int, chapter: int) -> str:
+    """Parse a chapter from its page records and write its JSON, pages file, corpus store entry and Word document."""
+    flagged = assess_pages(records)
+    metrics.increment("ocr_flagged_pages", len(flagged))
+    for record in records:
+        if record["flagged"]:
+            confidence = "unknown" if record["confidence"] is None else f"{record['confidence']:.2f}"
+            logging.warning(f"S{section}C{chapter} page {record['page']} flagged for re-OCR "
+                            f"(confidence {confidence}): {'; '.join(record['anomalies']) or 'low confidence'}")
+
+    ocr_text = chapter_ocr_text(records)
+    if not ocr_text.strip():
+        logging.error("No OCR content extracted")
+        raise ValueError("No OCR content extracted")
+    with metrics.timer("parse_chapter"):
+        result = process_text(ocr_text, section, chapter)
+    sanskrit_verses, verse_groups = result['book']['sanskrit_verses'], result['book']['verse_groups']
+
+    # Log the extracted content for debugging
+    logging.debug(f"Extracted Sanskrit verses: {sanskrit_verses}")
+    logging.debug(f"Extracted verse groups: {verse_groups}")
+
+    # Create output folder structure
+    output_folder = chapter_output_folder(section, chapter)
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Write the JSON output to a file
+    json_output_path = os.path.join(output_folder, 'charaka_samhita_output.json')
+    with open(json_output_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    logging.info(f"JSON output has been written to {json_output_path}")
+    save_page_records(records, section, chapter)
+
+    # Keep the corpus store in step with the chapter files
+    with CorpusStore() as store:
+        store.upsert_chapter(result['book'], result['timestamp'], ocr_text)
+
+    # Save the OCR output to a Word document for readability
+    docx_output_path = os.path.join(output_folder, 'charaka_samhita_output.docx')
+    save_to_word(sanskrit_verses, verse_groups, [ocr_text], docx_output_path)
+
+    logging.info(f"Word document has been saved to {docx_output_path}")
+    return output_folder
+
+def process_chapter(project_id: str, location: str, processor_id: str, folder_path: str, section: int, chapter: int,
+                    ocr_workers: int = 4, preprocess_pages: bool = False,
+                    client: documentai.DocumentProcessorServiceClient = None, layout: bool = False,
+                    cache_only: bool = False) -> str:
+    """OCR and parse one chapter's page images (a folder or a page archive); returns the folder holding the JSON and Word output.
+
+    Pages come from the OCR cache when they were OCRed before; with cache_only=True the
+    chapter is re-parsed from the cache alone, without any Document AI calls. Pages replaced
+    by reocr_chapter keep their re-OCR text while their images are unchanged.
+    """
+    # A chapter's folder and its page archive share a journal: their pages have the same names and hashes
+    journal_path = os.path.join("journal", f"ocr_{page_source_name(folder_path)}.jsonl")
+
+    journal = PipelineJournal(journal_path)
+    cache = ResponseCache(OCR_CACHE_FILE)
+    try:
+        if preprocess_pages:
+            folder_path = preprocess_folder(folder_path)
+
+        previous = {record["page"]: record for record in load_page_records(section, chapter)}
+        overrides = {name: record for name, record in previous.items() if record["source"] != "ocr"}
+        # Process all images in the folder, skipping pages already OCRed
+        records = ocr_pages(project_id, location, processor_id, folder_path, journal, ocr_workers, client,
+                            cache=cache, layout=layout, cache_only=cache_only, overrides=overrides)
+        # Re-OCR methods already tried on an unchanged page are not tried again
+        for record in records:
+            earlier = previous.get(record["page"])
+            if earlier and earlier["hash"] == record["hash"] and earlier.get("attempts"):
+                record["attempts"] = earlier["attempts"]
+
+        return write_chapter_output(records, section, chapter)
+    finally:
+        cache.close()
+        journal.close()
+
+def reocr_candidate(project_id: str, location: str, processor_id: str, pages: Union[PageArchive, PageFolder],
+                    name: str, client: documentai.DocumentProcessorServiceClient, cache: ResponseCache,
+                    preprocess_pages: bool, layout: bool) -> Dict[str, Any]:
+    """OCR one page again: its image preprocessed with REOCR_PREPROCESS_OPTIONS, or else as it is without the cache."""
+    if preprocess_pages:
+        output_folder = os.path.join(PREPROCESSED_FOLDER, f"{page_source_name(pages.path)}-reocr")
+        os.makedirs(output_folder, exist_ok=True)
+        os.makedirs(PREPROCESS_CACHE_FOLDER, exist_ok=True)
+        file_path = os.path.join(output_folder, name)
+        cached_preprocess(pages.path, name, file_path, REOCR_PREPROCESS_OPTIONS)
+        document = ocr_page(project_id, location, processor_id, file_path, client, cache=cache)
+    else:
+        document = ocr_page(project_id, location, processor_id, os.path.join(pages.path, name), client, refresh=True,
+                            content=pages.page_bytes(name) if isinstance(pages, PageArchive) else None)
+    confidence, low_confidence_share = document_confidence(document)
+    return {"text": extract_text(document, layout), "confidence": confidence, "low_confidence_share": low_confidence_share}
+
+def reocr_chapter(project_id: str, location: str, processor_id: str, folder_path: str, section: int, chapter: int,
+                  pages: List[str] = None, preprocess_pages: bool = False,
+                  client: documentai.DocumentProcessorServiceClient = None, ocr_workers: int = 4) -> List[str]:
+    """OCR only the flagged pages of an OCRed chapter again and splice the better results into its output.
+
+    A page is flagged by write_chapter_output for low OCR confidence or parse anomalies. With
+    preprocess_pages=True its image is preprocessed before the new call, otherwise the same
+    image goes to Document AI again past the cache. A result replaces the page's text only if
+    the page then has fewer anomalies, or as many and a better confidence, and keeps at least
+    MIN_RETAINED_DEVANAGARI of its Devanagari; the chapter's other pages are left exactly as
+    they are. Each method is tried once per flagged page, so running this again costs nothing
+    until the pages change. `pages` names pages to re-OCR whether flagged or not.
+    Returns the names of the pages replaced.
+    """
+    records = load_page_records(section, chapter)
+    if not records:
+        raise FileNotFoundError(f"S{section}C{chapter} has no {PAGES_FILE_NAME}; OCR the chapter first")
+    method = "preprocessed" if preprocess_pages else "fresh"
+    assess_pages(records)
+    positions = {record["page"]: i for i, record in enumerate(records)}
+    if pages:
+        unknown = [name for name in pages if name not in positions]
+        if unknown:
+            raise ValueError(f"S{section}C{chapter} has no pages {unknown}")
+        targets = list(pages)
+    else:
+        targets = [record["page"] for record in records if record["flagged"] and method not in record.get("attempts", [])]
+    if not targets:
+        logging.info(f"S{section}C{chapter}: no pages to re-OCR ({method})")
+        return []
+
+    logging.info(f"S{section}C{chapter}: re-OCRing {len(targets)} of {len(records)} pages ({method}): {', '.join(targets)}")
+    if client is None:
+        from Backends import make_ocr_backend
+        client = make_ocr_backend("documentai")
+    cache = ResponseCache(OCR_CACHE_FILE)
+    source = open_pages(folder_path)
+    try:
+        with ThreadPoolExecutor(max_workers=ocr_workers) as executor:
+            candidates = list(executor.map(
+                lambda name: reocr_candidate(project_id, location, processor_id, source, name, client, cache,
+                                             preprocess_pages, records[positions[name]]["layout"]),
+                targets))
+    finally:
+        source.close()
+        cache.close()
+    metrics.increment("ocr_reocr_pages", len(targets))
+
+    # Judged one page at a time against the text as it stands, so a fix on one page counts for its neighbours
+    replaced = []
+    for name, candidate in zip(targets, candidates):
+        position = positions[name]
+        current = records[position]
+        texts = [record["text"] for record in records]
+        before = page_anomalies(texts)[position]
+        texts[position] = candidate["text"]
+        after = page_anomalies(texts)[position]
+        retained = len(DEVANAGARI_PATTERN.findall(candidate["text"])) / max(len(DEVANAGARI_PATTERN.findall(current["text"])), 1)
+        attempts = current.get("attempts", []) + [method]
+        if retained >= MIN_RETAINED_DEVANAGARI and page_quality(candidate, after) > page_quality(current, before):
+            # The hash stays the one the chapter is OCRed from, so full runs keep using this text
+            records[position] = {**current, **candidate, "source": f"reocr-{method}", "attempts": attempts}
+            replaced.append(name)
+            logging.info(f"S{section}C{chapter} page {name}: re-OCR text used, "
+                         f"{len(before)} -> {len(after)} anomalies, confidence {current['confidence']} -> {candidate['confidence']}")
+        else:
+            current["attempts"] = attempts
+            logging.info(f"S{section}C{chapter} page {name}: re-OCR text no better, page kept "
+                         f"({len(after)} anomalies, {retained:.0%} of its Devanagari)")
+    metrics.increment("ocr_reocr_replaced", len(replaced))
+
+    if replaced:
+        write_chapter_output(records, section, chapter)
+    else:
+        assess_pages(records)
+        save_page_records(records, section, chapter)
+    return replaced
+
 # Main execution
 if __name__ == "__main__":
     # Set Google Cloud credentials
@@ -167,41 +660,26 @@ if __name__ == "__main__":
     location = "us"
     processor_id = "1fb139ed60959696"
     folder_path = "ExtractedImage/S1-Chapter5"
+    section, chapter = 1, 5
+    ocr_workers = 4
+    # Upload grayscale/bilevel, deskewed and cropped pages instead of the raw multi-megabyte PNGs
+    preprocess_pages = False
+    # Rebuild page text from the paragraph layout (drops running heads and folio numbers)
+    layout = False
+    # Re-parse from the cached Document AI responses only, without calling the API
+    cache_only = False
+    # OCR only the pages flagged in the last run again (preprocessed if preprocess_pages) and splice in better text
+    reocr = False
 
     try:
-        # Process all images in the folder
-        sanskrit_verses, verse_groups, ocr_content = process_all_images(project_id, location, processor_id, folder_path)
-
-        # Log the extracted content for debugging
-        logging.debug(f"Extracted Sanskrit verses: {sanskrit_verses}")
-        logging.debug(f"Extracted verse groups: {verse_groups}")
-
-        # Process the OCR text
-        if ocr_content and ocr_content[0]:
-            result = process_text(ocr_content[0])
+        if reocr:
+            reocr_chapter(project_id, location, processor_id, folder_path, section, chapter,
+                          preprocess_pages=preprocess_pages, ocr_workers=ocr_workers)
         else:
-            logging.error("No OCR content extracted")
-            raise ValueError("No OCR content extracted")
-
-        # Create output folder structure
-        section = result['book']['section']
-        chapter = result['book']['chapter']
-        output_folder = f"ExtractedFromOCR/S{section}C{chapter}"
-        os.makedirs(output_folder, exist_ok=True)
-
-        # Write the JSON output to a file
-        json_output_path = os.path.join(output_folder, 'charaka_samhita_output.json')
-        with open(json_output_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-
-        logging.info(f"JSON output has been written to {json_output_path}")
-
-        # Save the OCR output to a Word document for readability
-        docx_output_path = os.path.join(output_folder, 'charaka_samhita_output.docx')
-        save_to_word(sanskrit_verses, verse_groups, ocr_content, docx_output_path)
-
-        logging.info(f"Word document has been saved to {docx_output_path}")
-
+            process_chapter(project_id, location, processor_id, folder_path, section, chapter, ocr_workers, preprocess_pages,
+                            layout=layout, cache_only=cache_only)
     except Exception as e:
         logging.error(f"An error occurred: {e}")
         raise
+    finally:
+        metrics.write_summary(f"ocr_{os.path.basename(folder_path)}")
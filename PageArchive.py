@@ -0,0 +1,249 @@
+import io
+import os
+import mmap
+import glob
+import struct
+import hashlib
+import logging
+import argparse
+from typing import Dict, List, NamedTuple, Tuple, Union
+
+from PipelineJournal import file_hash
+from PipelineMetrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# One file per chapter next to its image folder: ExtractedImage/S1-Chapter5.pages
+ARCHIVE_EXTENSION = ".pages"
+ARCHIVE_MAGIC = b"CSPAGES\x00"
+ARCHIVE_VERSION = 1
+# magic, version, page count
+HEADER = struct.Struct('<8sII')
+# page name, offset, length, width, height, SHA-256 of the page bytes
+ENTRY = struct.Struct('<64sQQII32s')
+# Page buffers start on allocation-granularity boundaries, so each one maps onto whole memory pages
+ALIGNMENT = mmap.ALLOCATIONGRANULARITY
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+class PageEntry(NamedTuple):
+    offset: int
+    length: int
+    width: int
+    height: int
+    sha256: str
+
+def png_size(header: bytes) -> Tuple[int, int]:
+    """Width and height from a PNG's IHDR chunk, without decoding the image."""
+    if header[:8] != PNG_SIGNATURE or header[12:16] != b"IHDR":
+        raise ValueError("Not a PNG image")
+    return struct.unpack('>II', header[16:24])
+
+def archive_path_for(folder_path: str) -> str:
+    return os.path.normpath(folder_path) + ARCHIVE_EXTENSION
+
+def page_source_name(path: str) -> str:
+    """The chapter folder name of a page folder or archive, e.g. "S1-Chapter5", for journals and metrics."""
+    name = os.path.basename(os.path.normpath(path))
+    return name[:-len(ARCHIVE_EXTENSION)] if name.endswith(ARCHIVE_EXTENSION) else name
+
+def build_archive(folder_path: str, archive_path: str = None) -> str:
+    """Pack a folder of page PNGs into one archive file and return its path.
+
+    The PNG streams are stored byte for byte, so a page's SHA-256 is the hash of its image file
+    and OCR cache and journal entries made from the folder stay valid for the archive. The
+    archive is written to a temporary file and moved into place, so readers never see half of it.
+    """
+    archive_path = archive_path or archive_path_for(folder_path)
+    names = sorted(f for f in os.listdir(folder_path) if f.endswith('.png'))
+    for name in names:
+        if len(name.encode('utf-8')) > 64:
+            raise ValueError(f"Page name {name!r} is longer than 64 bytes")
+    index_end = HEADER.size + ENTRY.size * len(names)
+
+    temp_path = f"{archive_path}.{os.getpid()}.tmp"
+    entries = []
+    try:
+        with metrics.timer("page_archive_build"), open(temp_path, 'wb') as archive:
+            offset = -(-index_end // ALIGNMENT) * ALIGNMENT
+            for name in names:
+                with open(os.path.join(folder_path, name), 'rb') as f:
+                    data = f.read()
+                width, height = png_size(data[:24])
+                archive.seek(offset)
+                archive.write(data)
+                entries.append((name, PageEntry(offset, len(data), width, height, hashlib.sha256(data).hexdigest())))
+                offset = -(-(offset + len(data)) // ALIGNMENT) * ALIGNMENT
+
+            archive.seek(0)
+            archive.write(HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, len(entries)))
+            for name, entry in entries:
+                archive.write(ENTRY.pack(name.encode('utf-8'), entry.offset, entry.length, entry.width, entry.height,
+                                         bytes.fromhex(entry.sha256)))
+        os.replace(temp_path, archive_path)
+    finally:
+        # Left behind only if the build failed part way, e.g. on a file that is not a PNG
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    size = sum(entry.length for _, entry in entries)
+    metrics.increment("page_archive_pages", len(entries))
+    logger.info(f"Packed {len(entries)} pages ({size:,} bytes) from {folder_path} into {archive_path}")
+    return archive_path
+
+def ensure_archive(folder_path: str) -> str:
+    """The folder's archive, rebuilt first if any page image is newer than it or the pages differ."""
+    archive_path = archive_path_for(folder_path)
+    names = sorted(f for f in os.listdir(folder_path) if f.endswith('.png'))
+    if os.path.exists(archive_path):
+        archive_mtime = os.path.getmtime(archive_path)
+        with PageArchive(archive_path) as archive:
+            current = archive.names() == names
+        if current and all(os.path.getmtime(os.path.join(folder_path, name)) <= archive_mtime for name in names):
+            return archive_path
+    return build_archive(folder_path, archive_path)
+
+class PageArchive:
+    """Read-only, memory-mapped view of a page archive.
+
+    Opening reads only the header and index; page_bytes() is a zero-copy memoryview of one page's
+    PNG stream in the mapping, so handing it to an upload touches no other page, and
+    page_hash() comes from the index without reading the page at all. image() decodes a page
+    only when its pixels are needed. Safe to share between threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"{path} is empty, not a page archive")
+        magic, version, count = HEADER.unpack_from(self.map, 0)
+        if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {ARCHIVE_VERSION} page archive")
+        self.entries: Dict[str, PageEntry] = {}
+        for i in range(count):
+            name, offset, length, width, height, digest = ENTRY.unpack_from(self.map, HEADER.size + i * ENTRY.size)
+            self.entries[name.rstrip(b'\x00').decode('utf-8')] = PageEntry(offset, length, width, height, digest.hex())
+        self.view = memoryview(self.map)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def names(self) -> List[str]:
+        return list(self.entries)
+
+    def page_bytes(self, name: str) -> memoryview:
+        entry = self.entries[name]
+        return self.view[entry.offset:entry.offset + entry.length]
+
+    def page_hash(self, name: str) -> str:
+        return self.entries[name].sha256
+
+    def page_length(self, name: str) -> int:
+        return self.entries[name].length
+
+    def page_size(self, name: str) -> Tuple[int, int]:
+        entry = self.entries[name]
+        return entry.width, entry.height
+
+    def image(self, name: str):
+        from PIL import Image
+
+        # BytesIO copies the compressed stream only; the pixels are decoded on first access
+        return Image.open(io.BytesIO(self.page_bytes(name)))
+
+    def close(self) -> None:
+        if getattr(self, 'view', None) is not None:
+            self.view.release()
+            self.view = None
+        try:
+            self.map.close()
+        except BufferError:
+            # A caller still holds a page's memoryview; the mapping is released with it
+            logger.debug(f"{self.path} is still in use, leaving its mapping open")
+        except AttributeError:
+            pass
+        self.file.close()
+
+class PageFolder:
+    """A chapter's folder of page PNGs behind the same interface as PageArchive."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files = sorted(f for f in os.listdir(path) if f.endswith('.png'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.files
+
+    def names(self) -> List[str]:
+        return list(self.files)
+
+    def page_path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def page_bytes(self, name: str) -> bytes:
+        with open(self.page_path(name), 'rb') as f:
+            return f.read()
+
+    def page_hash(self, name: str) -> str:
+        return file_hash(self.page_path(name))
+
+    def page_length(self, name: str) -> int:
+        return os.path.getsize(self.page_path(name))
+
+    def page_size(self, name: str) -> Tuple[int, int]:
+        with open(self.page_path(name), 'rb') as f:
+            return png_size(f.read(24))
+
+    def image(self, name: str):
+        from PIL import Image
+
+        return Image.open(self.page_path(name))
+
+    def close(self) -> None:
+        pass
+
+def open_pages(path: str) -> Union[PageArchive, PageFolder]:
+    """The pages of a chapter, from a page archive file or a folder of PNGs."""
+    return PageArchive(path) if os.path.isfile(path) else PageFolder(path)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Pack folders of page PNGs into memory-mappable page archives")
+    parser.add_argument("folders", nargs='*', help="Page image folders (default: every folder under ExtractedImage)")
+    parser.add_argument("--verify", action="store_true", help="Check every archived page against its image file")
+    args = parser.parse_args()
+
+    folders = args.folders or sorted(p for p in glob.glob(os.path.join("ExtractedImage", "*")) if os.path.isdir(p))
+    for folder in folders:
+        path = build_archive(folder)
+        if args.verify:
+            with PageArchive(path) as archive, PageFolder(folder) as pages:
+                mismatched = [name for name in pages.names()
+                              if name not in archive or archive.page_hash(name) != pages.page_hash(name)
+                              or hashlib.sha256(archive.page_bytes(name)).hexdigest() != archive.page_hash(name)]
+            if mismatched:
+                raise SystemExit(f"{path}: pages {mismatched} differ from {folder}")
+        print(f"{folder} -> {path} ({os.path.getsize(path):,} bytes)")
@@ -0,0 +1,1192 @@
+import os
+import json
+import time
+import glob
+import logging
+import argparse
+from typing import Callable, Dict, List, Optional, Tuple
+
+from FakeBackends import (FakeDocumentAIClient, FakeTranslateClient, MockBatchServer, fake_interpretation, image_folder_for,
+                          load_recorded_ocr_text, recorded_chapters, recorded_page_texts, recorded_translations)
+
+def report(label: str, elapsed: float, items: int, unit: str) -> None:
+    print(f"{label:<40} {elapsed * 1000:10.1f} ms  {items / elapsed:10.1f} {unit}/s")
+
+def benchmark_ocr(args) -> None:
+    from ImageToBaseJson import process_all_images
+
+    folder = image_folder_for(args.chapter)
+    pages = len([f for f in os.listdir(folder) if f.endswith('.png')])
+    page_texts = recorded_page_texts(args.chapter)
+    print(f"OCR of {pages} pages from {folder} against a fake Document AI "
+          f"({args.latency * 1000:.0f} ms latency, {args.error_rate:.0%} errors)")
+
+    baseline = None
+    for workers in args.workers:
+        client = FakeDocumentAIClient(page_texts, latency=args.latency, error_rate=args.error_rate)
+        start = time.perf_counter()
+        result = process_all_images('project', 'us', 'processor', folder, max_workers=workers, client=client, retry_delay=0)
+        elapsed = time.perf_counter() - start
+        report(f"workers={workers} (calls={client.calls}, failures={client.failures})", elapsed, pages, 'pages')
+        if baseline is None:
+            baseline = result
+        elif result != baseline:
+            raise AssertionError(f"Output with {workers} workers differs from {args.workers[0]} workers")
+
+def benchmark_ocr_cache(args) -> None:
+    import shutil
+    import tempfile
+    from ImageToBaseJson import process_all_images, zstandard
+    from ResponseCache import ResponseCache
+
+    work = tempfile.mkdtemp()
+    try:
+        for chapter_code in args.chapters:
+            folder = image_folder_for(chapter_code)
+            pages = len([f for f in os.listdir(folder) if f.endswith('.png')])
+            page_texts = recorded_page_texts(chapter_code)
+            cache = ResponseCache(os.path.join(work, f"{chapter_code}.sqlite"))
+            print(f"{chapter_code}: {pages} pages against a fake Document AI ({args.latency * 1000:.0f} ms latency) "
+                  f"whose pages have a Devanagari running head and a folio number")
+
+            # Without margin text, for reference
+            clean = process_all_images('project', 'us', 'processor', folder, max_workers=args.workers,
+                                       client=FakeDocumentAIClient(page_texts), retry_delay=0)[:2]
+
+            client = FakeDocumentAIClient(page_texts, latency=args.latency, running_heads=True)
+            start = time.perf_counter()
+            ocr = process_all_images('project', 'us', 'processor', folder, max_workers=args.workers, client=client,
+                                     retry_delay=0, cache=cache)
+            report(f"OCR and cache (calls={client.calls})", time.perf_counter() - start, pages, 'pages')
+
+            start = time.perf_counter()
+            reparsed = process_all_images('project', 'us', 'processor', folder, max_workers=args.workers,
+                                          retry_delay=0, cache=cache, cache_only=True)
+            report("re-parse from cache", time.perf_counter() - start, pages, 'pages')
+            if reparsed != ocr:
+                raise AssertionError(f"{chapter_code}: parsing the cached documents differs from the original OCR")
+
+            start = time.perf_counter()
+            layout = process_all_images('project', 'us', 'processor', folder, max_workers=args.workers,
+                                        retry_delay=0, cache=cache, cache_only=True, layout=True)
+            report("re-parse from cache with layout", time.perf_counter() - start, pages, 'pages')
+            if client.calls != pages:
+                raise AssertionError(f"{chapter_code}: re-parsing called Document AI {client.calls - pages} times")
+
+            text_verses, layout_verses, clean_verses = ocr[0], layout[0], clean[0]
+            differing = sum(1 for verse in text_verses if verse not in clean_verses)
+            print(f"  verses differing from the parse without margin text: text {differing}, "
+                  f"layout {sum(1 for verse in layout_verses if verse not in clean_verses)} (of {len(clean_verses)})")
+            if layout[:2] != clean:
+                raise AssertionError(f"{chapter_code}: the layout parse still includes margin text")
+
+            stored = cache.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            text_bytes = sum(len(text.encode('utf-8')) for text in page_texts.values())
+            print(f"  cached {stored:,} bytes ({'zstd' if zstandard else 'uncompressed'} protobuf) for {text_bytes:,} bytes of page text")
+            cache.close()
+    finally:
+        shutil.rmtree(work)
+
+def benchmark_parse(args) -> None:
+    from ImageToBaseJson import extract_verses_and_groups
+
+    # Golden check: re-parsing the recorded OCR text must reproduce the saved output exactly
+    chapter_texts = []
+    for chapter_code in recorded_chapters():
+        ocr_text = load_recorded_ocr_text(chapter_code)
+        chapter_texts.append(ocr_text)
+        with open(os.path.join('ExtractedFromOCR', chapter_code, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+            expected = json.load(f)['book']
+        sanskrit_verses, verse_groups = extract_verses_and_groups(ocr_text)
+        if sanskrit_verses != expected['sanskrit_verses'] or verse_groups != expected['verse_groups']:
+            raise AssertionError(f"Parser output for {chapter_code} differs from the recorded output")
+        print(f"{chapter_code}: {len(sanskrit_verses)} verses, {len(verse_groups)} groups match the recorded output")
+
+    # Synthetic volume: the recorded chapters repeated until it is whole-Samhita sized
+    volume_text = "\n\n".join(chapter_texts * args.repeat)
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        sanskrit_verses, verse_groups = extract_verses_and_groups(volume_text)
+        timings.append(time.perf_counter() - start)
+    print(f"Synthetic volume: {len(volume_text):,} characters, {len(volume_text.splitlines()):,} lines")
+    report(f"parse (best of {args.runs}, {len(sanskrit_verses)} verses)", min(timings), len(sanskrit_verses), 'verses')
+
+def benchmark_translate(args) -> None:
+    from GenerateCompleteJson import translate_text, translate_batches
+
+    translations = recorded_translations(args.chapter)
+    texts = list(translations)
+    # Verses that fail whenever they are sent, to exercise the per-item fallback
+    failing = texts[::len(texts) // args.failing_verses][:args.failing_verses] if args.failing_verses else []
+    print(f"Translation of {len(texts)} verses from {args.chapter} against a fake Translate client "
+          f"({args.latency * 1000:.0f} ms per request, {len(failing)} verses always failing)")
+
+    client = FakeTranslateClient(translations, latency=args.latency, failing_texts=failing)
+    start = time.perf_counter()
+    expected = [translate_text(client, text) for text in texts]
+    report(f"per verse (calls={client.calls})", time.perf_counter() - start, len(texts), 'verses')
+
+    for workers in args.workers:
+        client = FakeTranslateClient(translations, latency=args.latency, failing_texts=failing)
+        start = time.perf_counter()
+        result = [None] * len(texts)
+        for indices, batch_translations in translate_batches(client, texts, max_workers=workers, max_chars=args.max_chars):
+            for i, translation in zip(indices, batch_translations):
+                result[i] = translation
+        report(f"batched, workers={workers} (calls={client.calls})", time.perf_counter() - start, len(texts), 'verses')
+        if result != expected:
+            raise AssertionError("Batched translations differ from per-verse translations")
+
+def benchmark_transliterate(args) -> None:
+    from indic_transliteration import sanscript
+    from indic_transliteration.sanscript import transliterate
+    from TransliterationService import TransliterationService, SCHEMES
+
+    texts = []
+    for chapter_code in recorded_chapters():
+        with open(os.path.join('ExtractedFromOCR', chapter_code, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+            texts.extend(verse['sanskrit'] for verse in json.load(f)['book']['sanskrit_verses'])
+    volume = texts * args.repeat
+    schemes = [SCHEMES[name] for name in args.schemes]
+    print(f"Transliteration of {len(volume)} verses into {', '.join(args.schemes)}")
+
+    start = time.perf_counter()
+    expected = [{scheme: transliterate(text, sanscript.DEVANAGARI, scheme) for scheme in schemes} for text in volume]
+    report("per verse, uncached", time.perf_counter() - start, len(volume), 'verses')
+
+    service = TransliterationService()
+    start = time.perf_counter()
+    result = service.transliterate_many(volume, schemes)
+    report(f"service batch ({service.cache_info().currsize} cached words)", time.perf_counter() - start, len(volume), 'verses')
+    if result != expected:
+        raise AssertionError("TransliterationService output differs from per-verse transliteration")
+
+def benchmark_batch(args) -> None:
+    import generateInterpretationWithClaudeSonnet as interpretation
+    from PipelineMetrics import metrics
+
+    with open(os.path.join('ExtractedFromOCR', args.chapter, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+        book = json.load(f)['book']
+    verses = book['sanskrit_verses']
+    # Verse groups whose batch requests always come back errored, to exercise the error mapping
+    failing = [verses[i]['sanskrit'] for i in range(0, len(verses), max(len(verses) // args.failing_groups, 1))][:args.failing_groups] \
+        if args.failing_groups else []
+    print(f"Interpretation of {len(book['verse_groups'])} verse groups from {args.chapter} against a mock API "
+          f"({args.latency * 1000:.0f} ms per request, batches end after {args.processing_seconds:.1f}s)")
+
+    with MockBatchServer(latency=args.latency, processing_seconds=args.processing_seconds) as server:
+        interpretation.API_BASE = server.url
+        start = time.perf_counter()
+        expected = interpretation.process_verses(book, max_workers=args.workers)
+        elapsed = time.perf_counter() - start
+        cost = interpretation.usage_cost(metrics.summary()["counters"], "llm")
+        report(f"messages, workers={args.workers} (calls={server.message_calls})", elapsed, len(expected), 'groups')
+        print(f"{'':<40} estimated cost ${cost:.4f}")
+
+    with MockBatchServer(processing_seconds=args.processing_seconds, failing_texts=failing) as server:
+        interpretation.API_BASE = server.url
+        start = time.perf_counter()
+        result = interpretation.process_verses_batch(book, poll_interval=args.poll_interval)
+        elapsed = time.perf_counter() - start
+        cost = interpretation.usage_cost(metrics.summary()["counters"], "llm_batch") * interpretation.BATCH_DISCOUNT
+        report(f"batch (batches={len(server.batches)}, polls={server.batch_polls})", elapsed, len(result), 'groups')
+        print(f"{'':<40} estimated cost ${cost:.4f}")
+
+    errored = [i for i, r in enumerate(result) if r["translation"] == "Error occurred"]
+    mismatched = [i for i, (r, e) in enumerate(zip(result, expected)) if r != e and i not in errored]
+    if mismatched:
+        raise AssertionError(f"Batch results differ from synchronous results for groups {mismatched}")
+    print(f"Batch results match synchronous results; {len(errored)} groups errored "
+          f"({sum(1 for r in expected if r['translation'] == 'Error occurred')} also fail synchronously)")
+
+def benchmark_prompt_cache(args) -> None:
+    import generateInterpretationWithClaudeSonnet as interpretation
+    from PipelineMetrics import PipelineMetrics
+
+    with open(os.path.join('ExtractedFromOCR', args.chapter, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+        book = json.load(f)['book']
+    print(f"Interpretation of {len(book['verse_groups'])} verse groups from {args.chapter} against a mock API; "
+          f"instructions are ~{interpretation.estimate_tokens(interpretation.INTERPRETATION_INSTRUCTIONS)} tokens, "
+          f"cached from {args.min_cacheable_tokens}")
+
+    # The client only warms the prompt cache up when the mock would cache the instructions
+    interpretation.MIN_CACHEABLE_TOKENS = args.min_cacheable_tokens
+    for label, cache_control in (("without prompt caching", False), ("with prompt caching", True)):
+        # Fresh counters per run, so each cost covers only its own requests
+        interpretation.metrics = PipelineMetrics()
+        params = interpretation.message_params
+        if not cache_control:
+            def uncached_params(prompt, params=params):
+                request = params(prompt)
+                request["system"] = [{"type": "text", "text": block["text"]} for block in request["system"]]
+                return request
+            interpretation.message_params = uncached_params
+        try:
+            with MockBatchServer(latency=args.latency, min_cacheable_tokens=args.min_cacheable_tokens) as server:
+                interpretation.API_BASE = server.url
+                start = time.perf_counter()
+                results = interpretation.process_verses(book, max_workers=args.workers)
+                elapsed = time.perf_counter() - start
+        finally:
+            interpretation.message_params = params
+        counters = interpretation.metrics.summary()["counters"]
+        report(label, elapsed, len(results), 'groups')
+        print(f"{'':<40} input tokens: {counters.get('llm_prompt_cache_read_tokens', 0):,} cache read, "
+              f"{counters.get('llm_prompt_cache_write_tokens', 0):,} cache write, {counters.get('llm_input_tokens', 0):,} uncached; "
+              f"estimated cost ${interpretation.usage_cost(counters):.4f}")
+
+SECTION_FIELDS = ["translation", "vocabulary", "context", "interpretation", "ayurvedic_principles", "conclusion"]
+HEADER_VARIANTS = {
+    "plain": "{n}. {name}:",
+    "bold": "**{n}. {name}:**",
+    "heading": "## {n}. {name}",
+    "unnumbered heading": "### {name}:",
+    "bold name": "{n}) **{name}**",
+}
+
+def benchmark_stream(args) -> None:
+    import generateInterpretationWithClaudeSonnet as interpretation
+
+    # Golden check: rebuild responses from recorded interpretations with each header style,
+    # feed them in small chunks and expect the recorded sections back
+    checked = 0
+    for json_file in sorted(glob.glob(os.path.join('InterpretationByClaude', '*', 'output', 'charaka_samhita_translated_detailed_full.json'))):
+        with open(json_file, 'r', encoding='utf-8') as f:
+            recorded = [r for r in json.load(f)['translations'] if r['translation'] != "Error occurred"]
+        for result in recorded:
+            for style, header in HEADER_VARIANTS.items():
+                text = "\n".join(f"{header.format(n=n, name=name)}\n{result[field]}\n"
+                                 for n, (name, field) in enumerate(zip(interpretation.SECTIONS, SECTION_FIELDS), 1))
+                parser = interpretation.SectionParser()
+                for start in range(0, len(text), 7):
+                    parser.feed(text[start:start + 7])
+                sections = parser.close()
+                parsed = [sections.get(name, "").strip() for name in interpretation.SECTIONS]
+                if parsed != [result[field] for field in SECTION_FIELDS]:
+                    raise AssertionError(f"{json_file} verses {result['verses']}: {style} headers parsed differently")
+                checked += 1
+    print(f"Section parser reproduces {checked} recorded responses across {len(HEADER_VARIANTS)} header styles")
+
+    with open(os.path.join('ExtractedFromOCR', args.chapter, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+        book = json.load(f)['book']
+    print(f"Interpretation of {len(book['verse_groups'])} verse groups from {args.chapter} against a mock API "
+          f"({args.chunk_delay * 1000:.0f} ms per 40-character chunk, {len(args.trailing_text)} characters after the conclusion)")
+
+    runs = {}
+    for label, stream in (("complete responses", False), ("streamed", True)):
+        first = []
+        start = time.perf_counter()
+        with MockBatchServer(stream_chunk_delay=args.chunk_delay, trailing_text=args.trailing_text) as server:
+            interpretation.API_BASE = server.url
+            if not stream:
+                # A complete response takes as long as streaming all of it would
+                server.latency = args.chunk_delay * -(-len(fake_interpretation("") + args.trailing_text) // server.stream_chunk_chars)
+            results = interpretation.process_verses(book, max_workers=args.workers, stream=stream,
+                                                    on_result=lambda i, r: first.append(time.perf_counter() - start))
+        elapsed = time.perf_counter() - start
+        report(label, elapsed, len(results), 'groups')
+        print(f"{'':<40} first result after {min(first) * 1000:.0f} ms"
+              + (f", {server.streamed_chars:,} characters streamed" if stream else ""))
+        runs[label] = results
+    if runs["complete responses"] != runs["streamed"]:
+        raise AssertionError("Streamed results differ from complete responses")
+
+def benchmark_pack(args) -> None:
+    import generateInterpretationWithClaudeSonnet as interpretation
+    from FakeBackends import recorded_interpretation_responder
+    from PipelineMetrics import PipelineMetrics
+
+    books = []
+    for code in args.chapters:
+        with open(os.path.join('ExtractedFromOCR', code, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+            books.append(json.load(f)['book'])
+    responder = recorded_interpretation_responder()
+    print(f"Interpretation of {sum(len(book['verse_groups']) for book in books)} verse groups from {', '.join(args.chapters)} "
+          f"against a mock API replaying the recorded analyses ({args.latency * 1000:.0f} ms per request, "
+          f"{args.chunk_delay * 1000:.0f} ms per 40-character chunk), up to {interpretation.PACK_MAX_GROUPS} groups per packed request")
+
+    runs = {}
+    for label, pack, dropped_marker_rate in (("one group per request", False, 0.0), ("packed", True, 0.0),
+                                             (f"packed, {args.dropped_markers:.0%} markers dropped", True, args.dropped_markers)):
+        # Fresh counters per run, so each cost covers only its own requests
+        interpretation.metrics = PipelineMetrics()
+        with MockBatchServer(responder, latency=args.latency, stream_chunk_delay=args.chunk_delay,
+                             dropped_marker_rate=dropped_marker_rate) as server:
+            interpretation.API_BASE = server.url
+            start = time.perf_counter()
+            results = [interpretation.process_verses(book, max_workers=args.workers, stream=True, unique=True, pack=pack)
+                       for book in books]
+            elapsed = time.perf_counter() - start
+        counters = interpretation.metrics.summary()["counters"]
+        report(label, elapsed, sum(map(len, results)), 'groups')
+        print(f"{'':<40} {server.message_calls} requests ({counters.get('llm_packed_requests', 0)} packed, "
+              f"{counters.get('llm_pack_fallbacks', 0)} fallbacks), "
+              f"{counters.get('llm_input_tokens', 0) + counters.get('llm_prompt_cache_read_tokens', 0) + counters.get('llm_prompt_cache_write_tokens', 0):,} "
+              f"input tokens, {counters.get('llm_output_tokens', 0):,} output tokens; estimated cost ${interpretation.usage_cost(counters):.4f}")
+        runs[label] = results
+
+    # A packed group's analysis is the one it gets on its own, whether or not it had to fall back
+    expected = runs["one group per request"]
+    for label, results in runs.items():
+        if results != expected:
+            raise AssertionError(f"{label}: results differ from one group per request")
+    print("Packed results match one group per request")
+
+def ocr_variant(text: str, rng) -> str:
+    """text with one letter dropped, the commonest OCR error between printings of a formula."""
+    letters = [i for i, c in enumerate(text) if not c.isspace()]
+    i = rng.choice(letters)
+    return text[:i] + text[i + 1:]
+
+def benchmark_dedup(args) -> None:
+    import random
+    import tempfile
+    import generateInterpretationWithClaudeSonnet as interpretation
+    from GenerateCompleteJson import process_verses as translate_verses
+    from VerseDedup import GROUP_SIMILARITY, NearDuplicateIndex, cluster_verses
+
+    chapters = [code for code in recorded_chapters()
+                if os.path.exists(os.path.join('ExtractedFromOCR', code, 'charaka_samhita_translated.json'))]
+    translations = {}
+    for code in chapters:
+        translations.update(recorded_translations(code))
+    print(f"Translation and interpretation of {len(chapters)} chapters in book order against fake backends, "
+          f"every verse versus once per cluster of near-duplicates")
+    print(f"{'':<8} {'verses':>7} {'translated':>18} {'groups':>7} {'interpreted':>18}")
+
+    work = tempfile.mkdtemp()
+    translation_duplicates, interpretation_duplicates = NearDuplicateIndex(), NearDuplicateIndex(GROUP_SIMILARITY)
+    totals = [0, 0, 0, 0, 0, 0]
+    try:
+        for code in chapters:
+            input_json = os.path.join('ExtractedFromOCR', code, 'charaka_samhita_output.json')
+            with open(input_json, 'r', encoding='utf-8') as f:
+                book = json.load(f)['book']
+            counts, outputs = [], {}
+            for unique in (True, False):
+                client = FakeTranslateClient(translations)
+                output_json = os.path.join(work, f"{code}_{unique}.json")
+                translate_verses(input_json, output_json, None, client=client,
+                                 dedup_index=None if unique else translation_duplicates, unique=unique)
+                with open(output_json, 'r', encoding='utf-8') as f:
+                    outputs[unique] = json.load(f)['book']['sanskrit_verses']
+                with MockBatchServer() as server:
+                    interpretation.API_BASE = server.url
+                    interpretation.process_verses(book, max_workers=args.workers, unique=unique,
+                                                  dedup_index=None if unique else interpretation_duplicates)
+                counts += [client.segments, server.message_calls]
+
+            # Every verse translated through a cluster got the translation of a near-duplicate
+            texts = [verse['sanskrit'] for verse in outputs[True]]
+            reference = NearDuplicateIndex()
+            for verse in outputs[True]:
+                reference.add(verse['sanskrit'], verse['translation'])
+            for verse in outputs[False]:
+                if verse['translation'] not in translations.values() and reference.lookup(verse['sanskrit']) is None:
+                    raise AssertionError(f"{code} verse {verse['verse_number']}: translation has no near-duplicate source")
+            verses, groups = len(texts), len(book['verse_groups'])
+            print(f"{code:<8} {verses:>7} {counts[0]:>8} -> {counts[2]:>6} {groups:>7} {counts[1]:>8} -> {counts[3]:>6}")
+            for i, value in enumerate([verses, counts[0], counts[2], groups, counts[1], counts[3]]):
+                totals[i] += value
+        print(f"{'total':<8} {totals[0]:>7} {totals[1]:>8} -> {totals[2]:>6} {totals[3]:>7} {totals[4]:>8} -> {totals[5]:>6}")
+    finally:
+        import shutil
+        shutil.rmtree(work)
+
+    # Scale: every recorded verse in each of `volumes` printings, with a letter dropped from some
+    # of them as OCR does, clustered against the printings before it
+    rng = random.Random(0)
+    texts = [verse for code in chapters for verse in recorded_translations(code)]
+    volume_texts = [[ocr_variant(text, rng) if rng.random() < args.noise else text for text in texts]
+                    for _ in range(args.volumes)]
+    known = NearDuplicateIndex()
+    start = time.perf_counter()
+    reused = 0
+    for volume in volume_texts:
+        matched, clusters = cluster_verses(volume, known)
+        reused += len(matched)
+        for representative in clusters:
+            known.add(volume[representative], representative)
+    elapsed = time.perf_counter() - start
+    total = len(texts) * args.volumes
+    report(f"{args.volumes} printings, {args.noise:.0%} with an OCR slip", elapsed, total, 'verses')
+    print(f"{'':<40} {reused:,} of {total:,} verses reuse an earlier printing; the index holds {len(known):,} distinct verses")
+
+def linear_group_verses(group: str, verses: List[Dict]) -> List[Dict]:
+    """The per-group filter VerseIndex replaces."""
+    if '-' in group:
+        start, end = map(int, group.split('-'))
+        return [v for v in verses if start <= v['verse_number'] <= end]
+    return [v for v in verses if v['verse_number'] == int(group)]
+
+def benchmark_index(args) -> None:
+    from VerseIndex import VerseIndex, parse_group
+
+    chapters = []
+    for chapter_code in recorded_chapters():
+        with open(os.path.join('ExtractedFromOCR', chapter_code, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+            book = json.load(f)['book']
+        chapters.append(book)
+        index = VerseIndex(book['sanskrit_verses'])
+        for group in book['verse_groups']:
+            try:
+                expected = linear_group_verses(group, book['sanskrit_verses'])
+            except ValueError:
+                continue
+            if index.lookup(group) != expected:
+                raise AssertionError(f"{chapter_code} group {group}: index lookup differs from the linear filter")
+        numbering = index.report(book['verse_groups'])
+        print(f"{chapter_code}: " + ", ".join(f"{name.replace('_', ' ')} {values}" for name, values in numbering.items() if values))
+
+    # A whole-book corpus: the recorded chapters repeated and renumbered one after another
+    verses, groups, offset = [], [], 0
+    for _ in range(args.repeat):
+        for book in chapters:
+            verses.extend({**v, 'verse_number': v['verse_number'] + offset} for v in book['sanskrit_verses'])
+            for group in book['verse_groups']:
+                try:
+                    start, end = parse_group(group)
+                except ValueError:
+                    continue
+                groups.append(f"{start + offset}-{end + offset}")
+            offset += max(v['verse_number'] for v in book['sanskrit_verses']) + 1
+    print(f"Synthetic corpus: {len(verses):,} verses, {len(groups):,} groups")
+
+    start = time.perf_counter()
+    expected = [linear_group_verses(group, verses) for group in groups]
+    report("linear scan per group", time.perf_counter() - start, len(groups), 'groups')
+    start = time.perf_counter()
+    index = VerseIndex(verses)
+    result = [index.lookup(group) for group in groups]
+    report("index build + lookups", time.perf_counter() - start, len(groups), 'groups')
+    if result != expected:
+        raise AssertionError("Index lookups differ from the linear filter on the synthetic corpus")
+
+def benchmark_corpus(args) -> None:
+    import shutil
+    import tempfile
+    from CorpusStore import CorpusStore, stored_chapters
+
+    work = tempfile.mkdtemp()
+    try:
+        store = CorpusStore(os.path.join(work, 'corpus.sqlite'))
+        start = time.perf_counter()
+        chapters = stored_chapters()
+        for section, chapter in chapters:
+            store.import_chapter(section, chapter)
+        report(f"import {len(chapters)} chapters", time.perf_counter() - start, len(chapters), 'chapters')
+
+        # Golden check: exporting must reproduce the files byte for byte
+        start = time.perf_counter()
+        exported = []
+        for section, chapter in chapters:
+            exported.extend(store.export_chapter(section, chapter, os.path.join(work, 'export'), formats=("json", "txt")))
+        report(f"export {len(exported)} JSON/TXT files", time.perf_counter() - start, len(exported), 'files')
+        for path in exported:
+            original = os.path.relpath(path, os.path.join(work, 'export'))
+            with open(path, 'rb') as a, open(original, 'rb') as b:
+                if a.read() != b.read():
+                    raise AssertionError(f"Exported {original} differs from the original")
+        print(f"All {len(exported)} exported files are identical to the originals")
+
+        # Updating one verse: rewrite the chapter's translated JSON, or upsert one row
+        section, chapter = chapters[-1]
+        translated_path = os.path.join('ExtractedFromOCR', f"S{section}C{chapter}", 'charaka_samhita_translated.json')
+        scratch_path = os.path.join(work, 'translated.json')
+        start = time.perf_counter()
+        for i in range(args.updates):
+            with open(translated_path if i == 0 else scratch_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            data['book']['sanskrit_verses'][i % len(data['book']['sanskrit_verses'])]['translation'] = f"revised {i}"
+            with open(scratch_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        report("JSON load + rewrite per update", time.perf_counter() - start, args.updates, 'updates')
+        verses = list(store.verses(section, chapter))
+        start = time.perf_counter()
+        for i in range(args.updates):
+            verse = verses[i % len(verses)]
+            store.upsert_verses(section, chapter, [(verse['position'], {**verse, 'translation': f"revised {i}"})])
+        report("corpus store upsert per update", time.perf_counter() - start, args.updates, 'updates')
+        store.close()
+    finally:
+        shutil.rmtree(work)
+
+def synthetic_corpus(path: str, volumes: int):
+    """A multi-volume corpus store: every recorded chapter copied into each of `volumes` sections."""
+    from CorpusStore import CorpusStore, stored_chapters
+
+    store = CorpusStore(path)
+    source = CorpusStore(path + '.source')
+    for section, chapter in stored_chapters():
+        source.import_chapter(section, chapter)
+    recorded = source.chapters()
+    for volume in range(1, volumes + 1):
+        for n, (section, chapter) in enumerate(recorded, 1):
+            row = source.chapter(section, chapter)
+            verses = list(source.verses(section, chapter))
+            book = {'section': volume, 'chapter': n, 'title': row['title'], 'volume': volume,
+                    'chapter_name': row['chapter_name'], 'verse_groups': json.loads(row['verse_groups']),
+                    'sanskrit_verses': verses}
+            store.upsert_chapter(book, row['timestamp'])
+            store.upsert_verses(volume, n, [(verse['position'], verse) for verse in verses])
+            for position, result in enumerate(source.interpretations(section, chapter)):
+                store.upsert_interpretation(volume, n, position, result)
+    source.close()
+    return store
+
+def benchmark_search(args) -> None:
+    import shutil
+    import tempfile
+    from SearchIndex import SearchIndex
+
+    work = tempfile.mkdtemp()
+    try:
+        store = synthetic_corpus(os.path.join(work, 'corpus.sqlite'), args.volumes)
+        chapters = store.chapters()
+        verse_count = sum(len(list(store.verses(*c))) for c in chapters)
+        print(f"Synthetic corpus: {args.volumes} volumes, {len(chapters)} chapters, {verse_count:,} verses")
+
+        index = SearchIndex(os.path.join(work, 'search.sqlite'))
+        start = time.perf_counter()
+        index.refresh(store)
+        report("index build", time.perf_counter() - start, len(chapters), 'chapters')
+        start = time.perf_counter()
+        unchanged = index.refresh(store)
+        report("refresh with nothing changed", time.perf_counter() - start, len(chapters), 'chapters')
+        verse = next(iter(store.verses(*chapters[-1])))
+        store.upsert_verses(*chapters[-1], [(verse['position'], {**verse, 'translation': "revised translation"})])
+        start = time.perf_counter()
+        refreshed = index.refresh(store)
+        report("refresh after one verse update", time.perf_counter() - start, len(chapters), 'chapters')
+        if unchanged or refreshed != [chapters[-1]]:
+            raise AssertionError(f"Incremental refresh reindexed {unchanged} and then {refreshed}")
+
+        # Each script and spelling of a term must find exactly the same verses
+        for spellings in args.equivalent:
+            hit_sets = [{(r['chapter'], r['kind'], r['position']) for r in index.search(q, limit=10000) if r['field'] == 'sanskrit'}
+                        for q in spellings.split('|')]
+            if not hit_sets[0] or any(hits != hit_sets[0] for hits in hit_sets):
+                raise AssertionError(f"Spellings {spellings} find different verses: {[len(hits) for hits in hit_sets]}")
+            print(f"{spellings}: {len(hit_sets[0])} verses for every spelling")
+
+        timings = []
+        for _ in range(args.runs):
+            for query in args.queries:
+                start = time.perf_counter()
+                index.search(query)
+                timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"{len(timings)} queries: median {timings[len(timings) // 2] * 1000:.2f} ms, "
+              f"p95 {timings[int(len(timings) * 0.95)] * 1000:.2f} ms, max {timings[-1] * 1000:.2f} ms")
+        index.close()
+        store.close()
+    finally:
+        shutil.rmtree(work)
+
+def in_memory_report(corpus_path: str, folder: str) -> None:
+    """The previous approach for comparison: the whole book's text joined into one string and one Word document."""
+    from docx import Document
+    from CorpusStore import CorpusStore
+    from ReportWriter import INTERPRETATION_SECTIONS, chapter_title, interpretation_text_parts
+
+    with CorpusStore(corpus_path) as store:
+        chapters = [(store.chapter(*c), store.interpretations(*c)) for c in store.chapters()]
+    text = "".join(f"{chapter_title(row)}\n" + "".join(interpretation_text_parts(results)) + "\n\n"
+                   for row, results in chapters if results)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, 'charaka_samhita.txt'), 'w', encoding='utf-8') as f:
+        f.write(text)
+    document = Document()
+    for row, results in chapters:
+        document.add_heading(chapter_title(row), level=1)
+        for i, result in enumerate(results, 1):
+            document.add_heading(f"{i}. Verses {result['verses']}", level=2)
+            for label, field in INTERPRETATION_SECTIONS:
+                document.add_heading(label, level=3)
+                for paragraph in (result[field] or "").split('\n\n'):
+                    document.add_paragraph(paragraph)
+    document.save(os.path.join(folder, 'charaka_samhita.docx'))
+
+def measure_report(mode: str, corpus_path: str, folder: str, workers: int, queue) -> None:
+    # Runs in a fresh process so each mode's peak memory is measured from the same baseline
+    import resource
+    from ReportWriter import write_book_report
+
+    start = time.perf_counter()
+    if mode == "in memory":
+        in_memory_report(corpus_path, folder)
+    else:
+        write_book_report(corpus_path, folder=folder, formats=("txt", "md", "docx"), workers=workers)
+    queue.put((time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss))
+
+def benchmark_report(args) -> None:
+    import shutil
+    import tempfile
+    import zipfile
+    import multiprocessing
+    from docx import Document
+
+    work = tempfile.mkdtemp()
+    try:
+        corpus_path = os.path.join(work, 'corpus.sqlite')
+        store = synthetic_corpus(corpus_path, args.volumes)
+        chapters = store.chapters()
+        groups = sum(len(store.interpretations(*c)) for c in chapters)
+        store.close()
+        print(f"Synthetic corpus: {args.volumes} volumes, {len(chapters)} chapters, {groups:,} interpreted verse groups")
+
+        context = multiprocessing.get_context('spawn')
+        modes = [("in memory", 1)] + [("streaming", workers) for workers in args.workers]
+        for mode, workers in modes:
+            queue = context.Queue()
+            process = context.Process(target=measure_report,
+                                      args=(mode, corpus_path, os.path.join(work, mode.replace(' ', '_') + str(workers)), workers, queue))
+            process.start()
+            elapsed, peak_kb, worker_peak_kb = queue.get()
+            process.join()
+            label = mode if mode == "in memory" else f"{mode}, {workers} DOCX workers"
+            workers_note = f", largest worker {worker_peak_kb / 1024:.0f} MB" if mode != "in memory" else ""
+            print(f"{label:<28} {elapsed:6.2f} s   peak memory {peak_kb / 1024:.0f} MB{workers_note}")
+
+        # The assembled document must hold every chapter's paragraphs, in order, plus the page breaks
+        folder = os.path.join(work, f"streaming{args.workers[-1]}")
+        parts = [os.path.join(folder, 'chapters', f"S{s}C{c}.docx") for s, c in chapters]
+        expected = [p.text for path in parts for p in Document(path).paragraphs]
+        assembled = [p.text for p in Document(os.path.join(folder, 'charaka_samhita.docx')).paragraphs if p.text or p.runs]
+        with zipfile.ZipFile(os.path.join(folder, 'charaka_samhita.docx')) as docx:
+            page_breaks = docx.read('word/document.xml').count(b'w:type="page"')
+        if len(assembled) != len(expected) + page_breaks or [t for t in assembled if t] != [t for t in expected if t] \
+                or page_breaks != len(parts) - 1:
+            raise AssertionError("The assembled Word document does not match its chapter parts")
+        print(f"Assembled Word document holds all {len(expected):,} paragraphs of its {len(parts)} chapter parts")
+    finally:
+        shutil.rmtree(work)
+
+def process_memory() -> Dict[str, int]:
+    """Current resident memory in kB, split into private (RssAnon) and file-backed (RssFile) pages."""
+    fields = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'RssAnon', 'RssFile'):
+                fields[key] = int(value.split()[0])
+    return fields
+
+def measure_page_source(path: str, queue) -> None:
+    # Runs in a fresh process so each layout's memory is measured from the same baseline
+    from PIL import Image  # imported before timing, so the first image open is not charged for it
+    from PageArchive import open_pages
+
+    timings = {}
+    start = time.perf_counter()
+    pages = open_pages(path)
+    names = pages.names()
+    timings["open"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for name in names:
+        pages.page_hash(name)
+    timings["hash every page"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    page = pages.page_bytes(names[len(names) // 2])
+    timings["one page's bytes"] = time.perf_counter() - start
+    del page
+
+    start = time.perf_counter()
+    for name in names:
+        # The upload copies each page into its request, as process_document does
+        bytes(pages.page_bytes(name))
+    timings["upload copies of every page"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pages.page_size(names[0])
+    timings["page size"] = time.perf_counter() - start
+
+    # Resident memory once every page has been read and uploaded, before any pixels are decoded
+    memory = process_memory()
+
+    start = time.perf_counter()
+    image = pages.image(names[0])
+    timings["open image (lazy)"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    image.load()
+    timings["decode one page"] = time.perf_counter() - start
+    del image
+
+    pages.close()
+    queue.put((timings, memory))
+
+def benchmark_archive(args) -> None:
+    import shutil
+    import tempfile
+    import multiprocessing
+    import ImageToBaseJson
+    from FakeBackends import all_recorded_page_texts
+    from PageArchive import PageArchive, PageFolder, build_archive
+
+    folders = [os.path.join('ExtractedImage', name) for name in args.chapters]
+    work = tempfile.mkdtemp()
+    try:
+        archives, folder_bytes, archive_bytes = [], 0, 0
+        start = time.perf_counter()
+        for folder in folders:
+            archives.append(build_archive(folder, os.path.join(work, os.path.basename(folder) + '.pages')))
+            folder_bytes += sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder) if f.endswith('.png'))
+            archive_bytes += os.path.getsize(archives[-1])
+        elapsed = time.perf_counter() - start
+        pages = sum(len(PageFolder(folder)) for folder in folders)
+        report(f"convert {len(folders)} folders to archives", elapsed, pages, 'pages')
+        print(f"{'':<40} {folder_bytes:,} bytes of PNGs -> {archive_bytes:,} bytes of archives")
+
+        # Every archived page is its image file byte for byte, so OCR from either gives the same chapter
+        for folder, archive_path in zip(folders, archives):
+            with PageArchive(archive_path) as archive, PageFolder(folder) as images:
+                for name in images.names():
+                    if archive.page_hash(name) != images.page_hash(name) or bytes(archive.page_bytes(name)) != images.page_bytes(name) \
+                            or archive.page_size(name) != images.image(name).size:
+                        raise AssertionError(f"{archive_path} {name} differs from its image file")
+        client = FakeDocumentAIClient(all_recorded_page_texts())
+        for folder, archive_path in zip(folders, archives):
+            if ImageToBaseJson.process_all_images("p", "l", "fake", folder, client=client)[:2] \
+                    != ImageToBaseJson.process_all_images("p", "l", "fake", archive_path, client=client)[:2]:
+                raise AssertionError(f"{archive_path}: OCR output differs from {folder}")
+        print(f"Archives match their folders page for page, and OCR from them gives the same verses and groups")
+
+        # Page cache is warm for both layouts: this compares the access path, not the disk
+        context = multiprocessing.get_context('spawn')
+        runs = {}
+        for label, path in (("folder of PNGs", folders[0]), ("page archive", archives[0])):
+            queue = context.Queue()
+            process = context.Process(target=measure_page_source, args=(path, queue))
+            process.start()
+            runs[label] = queue.get()
+            process.join()
+        print(f"\n{os.path.basename(folders[0])}: {len(PageFolder(folders[0]))} pages")
+        print(f"{'':<30} " + " ".join(f"{label:>16}" for label in runs))
+        for step in runs["folder of PNGs"][0]:
+            print(f"{step:<30} " + " ".join(f"{timings[step] * 1000:>13.2f} ms" for timings, _ in runs.values()))
+        # File-backed pages of the mapping are shared with every process reading the archive and reclaimable
+        for key, label in (("RssAnon", "private memory"), ("RssFile", "file-backed memory")):
+            print(f"{label:<30} " + " ".join(f"{memory.get(key, 0) / 1024:>13.1f} MB" for _, memory in runs.values()))
+    finally:
+        shutil.rmtree(work)
+
+def benchmark_reocr(args) -> None:
+    import re
+    import shutil
+    import tempfile
+    import ImageToBaseJson
+    from PageArchive import PageFolder
+    from PreprocessImages import CACHE_FOLDER, cached_preprocess
+    from PipelineJournal import file_hash
+
+    section, chapter = map(int, re.match(r'S(\d+)C(\d+)', args.chapter).groups())
+    folder = os.path.abspath(image_folder_for(args.chapter))
+    page_texts = recorded_page_texts(args.chapter)
+    with PageFolder(folder) as pages:
+        names = pages.names()
+        hashes = {name: pages.page_hash(name) for name in names}
+    clean = [page_texts[hashes[name]] for name in names]
+
+    # Damage pages the recorded OCR got right: a lost verse number, Latin debris in a verse line,
+    # and a page whose text is right but reported with low confidence
+    anomalies = ImageToBaseJson.page_anomalies(clean)
+    candidates = [i for i, text in enumerate(clean) if not anomalies[i] and len(ImageToBaseJson.VERSE_END_PATTERN.findall(text)) >= 3]
+    damaged = candidates[::max(len(candidates) // args.damaged, 1)][:args.damaged]
+    texts, confidences = {}, {}
+    for n, i in enumerate(damaged):
+        text = clean[i]
+        if n % 3 == 0:
+            # A verse end between two others on the page, so the gap it leaves is in one numbering sequence
+            ends = list(ImageToBaseJson.VERSE_END_PATTERN.finditer(text))
+            end = ends[len(ends) // 2]
+            text = text[:end.start()] + text[end.end():]
+        elif n % 3 == 1:
+            lines = text.split('\n')
+            verse_line = next(j for j, line in enumerate(lines) if ImageToBaseJson.is_sanskrit(line))
+            lines[verse_line] += " ovrshot aami load bnaoulon wwlug dalasgole"
+            text = '\n'.join(lines)
+        else:
+            confidences[hashes[names[i]]] = 0.6
+        texts[hashes[names[i]]] = text
+
+    work = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        for path in glob.glob('*.py'):
+            os.symlink(os.path.abspath(path), os.path.join(work, path))
+        os.chdir(work)
+        # The fake returns the recorded text for a page's re-OCR image, whatever the scan gave
+        os.makedirs(CACHE_FOLDER, exist_ok=True)
+        for name in names:
+            output = os.path.join(work, f"variant_{name}")
+            cached_preprocess(folder, name, output, ImageToBaseJson.REOCR_PREPROCESS_OPTIONS)
+            texts.setdefault(file_hash(output), page_texts[hashes[name]])
+            os.remove(output)
+        client = FakeDocumentAIClient({**page_texts, **texts}, latency=args.latency, page_confidences=confidences)
+        print(f"{args.chapter}: {len(names)} pages against a fake Document AI ({args.latency * 1000:.0f} ms latency), "
+              f"{len(damaged)} of them damaged: {', '.join(names[i] for i in damaged)}")
+
+        start = time.perf_counter()
+        ImageToBaseJson.process_chapter('project', 'us', 'fake', folder, section, chapter, client=client)
+        report(f"full OCR (calls={client.calls})", time.perf_counter() - start, len(names), 'pages')
+        records = ImageToBaseJson.load_page_records(section, chapter)
+        flagged = [record["page"] for record in records if record["flagged"]]
+        print(f"  flagged {len(flagged)} pages: {', '.join(flagged)}")
+        missed = [names[i] for i in damaged if names[i] not in flagged]
+        if missed:
+            raise AssertionError(f"Damaged pages {missed} were not flagged")
+
+        full_calls = client.calls
+        start = time.perf_counter()
+        replaced = ImageToBaseJson.reocr_chapter('project', 'us', 'fake', folder, section, chapter,
+                                                 preprocess_pages=True, client=client)
+        targeted_calls = client.calls - full_calls
+        report(f"targeted re-OCR (calls={targeted_calls})", time.perf_counter() - start, len(flagged), 'pages')
+        print(f"  replaced {len(replaced)} pages: {', '.join(replaced)}; "
+              f"{len(flagged) - len(replaced)} flagged pages kept their text")
+        if sorted(replaced) != sorted(names[i] for i in damaged):
+            raise AssertionError(f"Re-OCR replaced {replaced}, expected the damaged pages")
+
+        expected = ImageToBaseJson.extract_verses_and_groups("".join(f"{text}\n\n" for text in clean))
+
+        def check_output(label: str) -> None:
+            with open(os.path.join('ExtractedFromOCR', args.chapter, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+                book = json.load(f)['book']
+            if (book['sanskrit_verses'], book['verse_groups']) != expected:
+                raise AssertionError(f"Chapter output {label} differs from OCR of the undamaged pages")
+
+        check_output("after re-OCR")
+        # The replaced pages persist: a full run takes the rest from the journal and calls nothing
+        calls = client.calls
+        ImageToBaseJson.process_chapter('project', 'us', 'fake', folder, section, chapter, client=client)
+        if client.calls != calls:
+            raise AssertionError(f"A full re-run made {client.calls - calls} OCR calls")
+        check_output("after a full re-run")
+        if ImageToBaseJson.reocr_chapter('project', 'us', 'fake', folder, section, chapter, preprocess_pages=True,
+                                         client=client) or client.calls != calls:
+            raise AssertionError("A second re-OCR of the same pages made OCR calls")
+        print(f"Output matches OCR of the undamaged pages; re-running re-OCR or the full chapter makes no calls")
+        print(f"OCR calls to fix the chapter: {len(names)} for a full re-OCR, {targeted_calls} targeted")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work)
+
+BENCHMARK_HISTORY_FOLDER = os.path.join('metrics', 'benchmarks')
+
+def measure(function: Callable[[], int], rounds: int) -> Dict[str, float]:
+    """Run function `rounds` times; it returns the number of items it processed."""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        items = function()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    median = timings[len(timings) // 2]
+    return {"min": timings[0], "median": median, "items": items, "per_second": items / median if median else 0.0}
+
+def suite_stages(args, work: str) -> Dict[str, Tuple[str, Callable[[], int]]]:
+    """Each stage of the pipeline on the sample chapters, as (unit, function returning the item count)."""
+    import shutil
+    from Backends import llm_backend
+    from BookToImageSplitToEachPage import rasterize_document
+    from CorpusStore import CorpusStore
+    from GenerateCompleteJson import translate_batches
+    from ImageToBaseJson import extract_verses_and_groups, process_all_images
+    from ReportWriter import write_book_report
+    from SearchIndex import SearchIndex
+    from TransliterationService import TransliterationService, SCHEMES
+    import generateInterpretationWithClaudeSonnet as interpretation
+
+    chapters = recorded_chapters()
+    ocr_texts = [load_recorded_ocr_text(code) for code in chapters]
+    books = []
+    for code in chapters:
+        with open(os.path.join('ExtractedFromOCR', code, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+            books.append(json.load(f)['book'])
+    verses = [verse['sanskrit'] for book in books for verse in book['sanskrit_verses']]
+    translations = {}
+    for code in chapters:
+        translations.update(recorded_translations(code))
+    image_chapters = [code for code in chapters if os.path.isdir(image_folder_for(code))]
+    store = synthetic_corpus(os.path.join(work, 'corpus.sqlite'), 1)
+    store.close()
+
+    def rasterize() -> int:
+        folder = os.path.join(work, 'rasterized')
+        shutil.rmtree(folder, ignore_errors=True)
+        saved, failed = rasterize_document(os.path.join('Book', f"{args.pdf}.pdf"), folder, end_page=args.pages, dpi=args.dpi)
+        if failed:
+            raise AssertionError(f"Pages {failed} could not be rasterized")
+        return len(saved)
+
+    def ocr() -> int:
+        pages = 0
+        for code in image_chapters:
+            client = FakeDocumentAIClient(recorded_page_texts(code), latency=args.latency)
+            process_all_images('project', 'us', 'processor', image_folder_for(code), max_workers=4, client=client, retry_delay=0)
+            pages += client.calls
+        return pages
+
+    def parse() -> int:
+        return sum(len(extract_verses_and_groups(text)[0]) for text in ocr_texts)
+
+    def translate() -> int:
+        client = FakeTranslateClient(translations, latency=args.latency)
+        return sum(len(indices) for indices, _ in translate_batches(client, verses, max_workers=4))
+
+    def transliterate() -> int:
+        return len(TransliterationService().transliterate_many(verses, list(SCHEMES.values())))
+
+    def interpret() -> int:
+        with llm_backend("fake", args.latency):
+            return sum(len(interpretation.process_verses(book, max_workers=4)) for book in books)
+
+    def search() -> int:
+        index_path = os.path.join(work, 'search.sqlite')
+        for path in glob.glob(index_path + '*'):
+            os.remove(path)
+        with CorpusStore(os.path.join(work, 'corpus.sqlite')) as corpus, SearchIndex(index_path) as index:
+            index.refresh(corpus)
+            for query in SUITE_QUERIES:
+                index.search(query)
+        return len(SUITE_QUERIES)
+
+    def report_stage() -> int:
+        return len(write_book_report(os.path.join(work, 'corpus.sqlite'), folder=os.path.join(work, 'reports'),
+                                     formats=("txt", "md", "docx"), workers=1))
+
+    def end_to_end() -> int:
+        import io
+        import contextlib
+        import ProcessWholeBook
+        book_chapters = [chapter.code for chapter in ProcessWholeBook.discover_chapters() if chapter.code in image_chapters]
+        run = os.path.join(work, 'end_to_end')
+        shutil.rmtree(run, ignore_errors=True)
+        # The run works in its own scratch tree, so its outputs, journals and caches stay out of the repository
+        fake = ['--chapters', *book_chapters, '--fake_backends', '--fake_root', run, '--fake_latency', str(args.latency), '--force']
+        try:
+            # The per-chapter status table is checked below rather than printed
+            with contextlib.redirect_stdout(io.StringIO()):
+                statuses = ProcessWholeBook.main(['--stages', 'ocr', 'translate', 'interpret', 'index', *fake])
+        finally:
+            logging.disable(logging.INFO)
+        failed = {key: status for key, status in statuses.items() if status != "built"}
+        if failed:
+            raise AssertionError(f"End-to-end run failed: {failed}")
+
+        # Golden check: the run reproduces the recorded verses and, where recorded, interpretations
+        for code in book_chapters:
+            for path, key in ((os.path.join('ExtractedFromOCR', code, 'charaka_samhita_output.json'), 'book'),
+                              (os.path.join('InterpretationByClaude', code, 'output', 'charaka_samhita_translated_detailed_full.json'), 'translations')):
+                if not os.path.exists(path):
+                    continue
+                with open(path, 'r', encoding='utf-8') as f, open(os.path.join(run, path), 'r', encoding='utf-8') as g:
+                    expected, produced = json.load(f)[key], json.load(g)[key]
+                if key == 'book':
+                    expected, produced = [(b['sanskrit_verses'], b['verse_groups']) for b in (expected, produced)]
+                if produced != expected:
+                    raise AssertionError(f"End-to-end {path} differs from the recorded output")
+        return len(book_chapters)
+
+    return {
+        "rasterize": ("pages", rasterize),
+        "ocr": ("pages", ocr),
+        "parse": ("verses", parse),
+        "translate": ("verses", translate),
+        "transliterate": ("verses", transliterate),
+        "interpret": ("groups", interpret),
+        "search": ("queries", search),
+        "report": ("files", report_stage),
+        "end_to_end": ("chapters", end_to_end),
+    }
+
+SUITE_QUERIES = ["मात्रा", "mātrā", "matra", "digestion", "vata pitta kapha", "agni"]
+
+def previous_suite_run(folder: str, latency: float) -> Optional[Dict]:
+    """The latest earlier run with the same simulated latency, the only runs its timings compare with."""
+    for path in sorted(glob.glob(os.path.join(folder, 'suite_*.json')), reverse=True):
+        with open(path, 'r', encoding='utf-8') as f:
+            run = json.load(f)
+        if run.get("latency") == latency:
+            return run
+    return None
+
+def benchmark_suite(args) -> None:
+    import shutil
+    import platform
+    import subprocess
+    import tempfile
+
+    work = tempfile.mkdtemp()
+    try:
+        stages = suite_stages(args, work)
+        selected = args.stages or list(stages)
+        previous = previous_suite_run(args.history, args.latency)
+        print(f"{len(selected)} stages, {args.rounds} rounds each, {args.latency * 1000:.0f} ms per fake backend call"
+              + (f"; comparing with the run of {previous['timestamp']}" if previous else ""))
+
+        results, regressions = {}, []
+        for name in selected:
+            unit, function = stages[name]
+            result = results[name] = {**measure(function, args.rounds), "unit": unit}
+            line = f"{name:<14} {result['median'] * 1000:10.1f} ms  {result['per_second']:10.2f} {unit}/s"
+            before = (previous or {}).get("stages", {}).get(name)
+            if before:
+                # The median, as reported, is less swayed than a single round by other load on the machine
+                change = result['median'] / before['median'] - 1
+                line += f"  {change:+7.1%}"
+                if change > args.tolerance:
+                    regressions.append(name)
+                    line += "  REGRESSION"
+            print(line)
+    finally:
+        shutil.rmtree(work)
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    run = {"timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'), "commit": commit, "python": platform.python_version(),
+           "rounds": args.rounds, "latency": args.latency, "stages": results}
+    os.makedirs(args.history, exist_ok=True)
+    path = os.path.join(args.history, f"suite_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=2)
+    print(f"Results written to {path}")
+    if regressions:
+        raise SystemExit(f"Median slower than the previous run by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the Charaka Samhita pipeline")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    ocr_parser = subparsers.add_parser('ocr', help="Page OCR throughput against a fake Document AI client")
+    ocr_parser.add_argument("--chapter", default="S1C5", help="Chapter code with recorded OCR output (default: S1C5)")
+    ocr_parser.add_argument("--workers", type=int, nargs='+', default=[1, 2, 4, 8], help="Worker counts to compare")
+    ocr_parser.add_argument("--latency", type=float, default=0.5, help="Simulated seconds per OCR call (default: 0.5)")
+    ocr_parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of OCR calls that fail (default: 0)")
+    ocr_parser.set_defaults(run=benchmark_ocr)
+
+    ocr_cache_parser = subparsers.add_parser('ocr_cache', help="OCR once into the response cache, then re-parse from it with and without layout")
+    ocr_cache_parser.add_argument("--chapters", nargs='+', default=["S1C5"], help="Chapter codes with recorded OCR output (default: S1C5)")
+    ocr_cache_parser.add_argument("--workers", type=int, default=4, help="Concurrent OCR requests (default: 4)")
+    ocr_cache_parser.add_argument("--latency", type=float, default=0.5, help="Simulated seconds per OCR call (default: 0.5)")
+    ocr_cache_parser.set_defaults(run=benchmark_ocr_cache)
+
+    parse_parser = subparsers.add_parser('parse', help="Golden check and microbenchmark of extract_verses_and_groups")
+    parse_parser.add_argument("--repeat", type=int, default=40, help="Copies of the recorded chapters in the synthetic volume (default: 40)")
+    parse_parser.add_argument("--runs", type=int, default=5, help="Timed runs (default: 5)")
+    parse_parser.set_defaults(run=benchmark_parse)
+
+    translate_parser = subparsers.add_parser('translate', help="Per-verse versus batched translation against a fake Translate client")
+    translate_parser.add_argument("--chapter", default="S1C5", help="Chapter code with recorded translations (default: S1C5)")
+    translate_parser.add_argument("--workers", type=int, nargs='+', default=[1, 4], help="Concurrent batches to compare")
+    translate_parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per request (default: 0.2)")
+    translate_parser.add_argument("--max_chars", type=int, default=5000, help="Characters per batch (default: 5000)")
+    translate_parser.add_argument("--failing_verses", type=int, default=0, help="Verses whose requests always fail (default: 0)")
+    translate_parser.set_defaults(run=benchmark_translate)
+
+    transliterate_parser = subparsers.add_parser('transliterate', help="Per-verse versus memoized batch transliteration")
+    transliterate_parser.add_argument("--repeat", type=int, default=10, help="Copies of the recorded verses (default: 10)")
+    transliterate_parser.add_argument("--schemes", nargs='+', default=["iast", "itrans", "slp1", "hk"], help="Target schemes")
+    transliterate_parser.set_defaults(run=benchmark_transliterate)
+
+    batch_parser = subparsers.add_parser('batch', help="Synchronous versus Message Batch interpretation against a mock API server")
+    batch_parser.add_argument("--chapter", default="S1C5", help="Chapter code with recorded OCR output (default: S1C5)")
+    batch_parser.add_argument("--workers", type=int, default=4, help="Concurrent synchronous requests (default: 4)")
+    batch_parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per synchronous request (default: 0.2)")
+    batch_parser.add_argument("--processing_seconds", type=float, default=1.0, help="Seconds until a batch ends (default: 1)")
+    batch_parser.add_argument("--poll_interval", type=float, default=0.1, help="First batch poll interval (default: 0.1)")
+    batch_parser.add_argument("--failing_groups", type=int, default=0, help="Verse groups whose batch requests error (default: 0)")
+    batch_parser.set_defaults(run=benchmark_batch)
+
+    prompt_cache_parser = subparsers.add_parser('prompt_cache', help="Input tokens and cost with and without prompt caching against a mock API server")
+    prompt_cache_parser.add_argument("--chapter", default="S1C5", help="Chapter code with recorded OCR output (default: S1C5)")
+    prompt_cache_parser.add_argument("--workers", type=int, default=4, help="Concurrent requests (default: 4)")
+    prompt_cache_parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per request (default: 0.05)")
+    prompt_cache_parser.add_argument("--min_cacheable_tokens", type=int, default=1024,
+                                     help="Shortest prefix the mock caches (default: 1024, as for Sonnet)")
+    prompt_cache_parser.set_defaults(run=benchmark_prompt_cache)
+
+    stream_parser = subparsers.add_parser('stream', help="Section parser golden check, and streamed versus complete responses against a mock API server")
+    stream_parser.add_argument("--chapter", default="S1C5", help="Chapter code with recorded OCR output (default: S1C5)")
+    stream_parser.add_argument("--workers", type=int, default=4, help="Concurrent requests (default: 4)")
+    stream_parser.add_argument("--chunk_delay", type=float, default=0.01, help="Simulated seconds per streamed chunk (default: 0.01)")
+    stream_parser.add_argument("--trailing_text", default="\n---\n" + "Further reading and notes. " * 20,
+                               help="Commentary the mock appends after the conclusion")
+    stream_parser.set_defaults(run=benchmark_stream)
+
+    pack_parser = subparsers.add_parser('pack', help="Requests, time and cost of packed versus one-group-per-request interpretation against a mock API server")
+    pack_parser.add_argument("--chapters", nargs='+', default=recorded_chapters(), help="Chapter codes with recorded OCR output (default: all)")
+    pack_parser.add_argument("--workers", type=int, default=4, help="Concurrent requests (default: 4)")
+    pack_parser.add_argument("--latency", type=float, default=0.3, help="Simulated seconds before each response starts (default: 0.3)")
+    pack_parser.add_argument("--chunk_delay", type=float, default=0.002, help="Simulated seconds per streamed chunk (default: 0.002)")
+    pack_parser.add_argument("--dropped_markers", type=float, default=0.2,
+                             help="Fraction of group markers the mock leaves out in the fallback run (default: 0.2)")
+    pack_parser.set_defaults(run=benchmark_pack)
+
+    archive_parser = subparsers.add_parser('archive', help="Page archives versus folders of PNGs: conversion, open/read latency and memory")
+    archive_parser.add_argument("--chapters", nargs='+',
+                                default=sorted(name for name in os.listdir('ExtractedImage') if os.path.isdir(os.path.join('ExtractedImage', name)))
+                                if os.path.isdir('ExtractedImage') else [],
+                                help="Folders under ExtractedImage to convert; the first is timed (default: all)")
+    archive_parser.set_defaults(run=benchmark_archive)
+
+    reocr_parser = subparsers.add_parser('reocr', help="Flag damaged pages of a chapter, re-OCR only those and check the spliced output")
+    reocr_parser.add_argument("--chapter", default="S1C4", help="Chapter to damage and repair (default: S1C4)")
+    reocr_parser.add_argument("--damaged", type=int, default=3, help="Pages to damage (default: 3)")
+    reocr_parser.add_argument("--latency", type=float, default=0.2, help="Fake Document AI latency in seconds (default: 0.2)")
+    reocr_parser.set_defaults(run=benchmark_reocr)
+
+    index_parser = subparsers.add_parser('index', help="Verse index lookups versus a linear scan per group, and numbering reports")
+    index_parser.add_argument("--repeat", type=int, default=20, help="Copies of the recorded chapters in the synthetic corpus (default: 20)")
+    index_parser.set_defaults(run=benchmark_index)
+
+    corpus_parser = subparsers.add_parser('corpus', help="Corpus store import/export round trip and per-verse update cost")
+    corpus_parser.add_argument("--updates", type=int, default=200, help="Single-verse updates to time (default: 200)")
+    corpus_parser.set_defaults(run=benchmark_corpus)
+
+    dedup_parser = subparsers.add_parser('dedup', help="Translation and LLM calls per chapter with and without near-duplicate clustering")
+    dedup_parser.add_argument("--workers", type=int, default=4, help="Concurrent interpretation requests (default: 4)")
+    dedup_parser.add_argument("--volumes", type=int, default=10, help="Printings of the recorded verses for the scale test (default: 10)")
+    dedup_parser.add_argument("--noise", type=float, default=0.3, help="Fraction of verses with an OCR slip in each printing (default: 0.3)")
+    dedup_parser.set_defaults(run=benchmark_dedup)
+
+    search_parser = subparsers.add_parser('search', help="Search index build, incremental refresh and query latency on a synthetic multi-volume corpus")
+    search_parser.add_argument("--volumes", type=int, default=24,
+                               help="Copies of the recorded chapters, one per section (default: 24, about the 120 chapters of the Samhita)")
+    search_parser.add_argument("--queries", nargs='+', default=["मात्रा", "mātrāśitīya", "vata pitta", "वातपित्त", "digestion", "rasayana"],
+                               help="Queries to time")
+    search_parser.add_argument("--equivalent", nargs='+', default=["मात्रा|mātrā|matra", "दीर्घञ्जीवितीयम्|dīrghañjīvitīyam|dirghanjivitiyam"],
+                               help="'|'-separated spellings that must find the same verses")
+    search_parser.add_argument("--runs", type=int, default=20, help="Timed runs of each query (default: 20)")
+    search_parser.set_defaults(run=benchmark_search)
+
+    report_parser = subparsers.add_parser('report', help="Whole-book TXT/Markdown/Word reports: in-memory versus streaming, time and peak memory")
+    report_parser.add_argument("--volumes", type=int, default=24, help="Copies of the recorded chapters, one per section (default: 24)")
+    report_parser.add_argument("--workers", type=int, nargs='+', default=[1, 4], help="DOCX worker process counts to compare")
+    report_parser.set_defaults(run=benchmark_report)
+
+    suite_parser = subparsers.add_parser('suite', help="Per-stage and end-to-end throughput on the sample chapters, compared with the previous run")
+    suite_parser.add_argument("--stages", nargs='+', choices=["rasterize", "ocr", "parse", "translate", "transliterate", "interpret",
+                                                              "search", "report", "end_to_end"], help="Stages to measure (default: all)")
+    suite_parser.add_argument("--rounds", type=int, default=3, help="Timed rounds per stage; the median is reported (default: 3)")
+    suite_parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per fake backend call (default: 0)")
+    suite_parser.add_argument("--pdf", default="S1-Chapter5", help="Book/ PDF to rasterize (default: S1-Chapter5)")
+    suite_parser.add_argument("--pages", type=int, default=3, help="Pages to rasterize (default: 3)")
+    suite_parser.add_argument("--dpi", type=int, default=150, help="Rasterization resolution (default: 150)")
+    suite_parser.add_argument("--tolerance", type=float, default=0.25, help="Median slowdown flagged as a regression (default: 0.25)")
+    suite_parser.add_argument("--history", default=BENCHMARK_HISTORY_FOLDER, help=f"Folder of earlier runs (default: {BENCHMARK_HISTORY_FOLDER})")
+    suite_parser.set_defaults(run=benchmark_suite)
+
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO)
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
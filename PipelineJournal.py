@@ -0,0 +1,81 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+def content_hash(*parts: Any) -> str:
+    """Hash of the inputs that determine an item's result (strings, bytes or JSON-serialisable values)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = json.dumps(part, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class PipelineJournal:
+    """Append-only JSONL journal of completed work items.
+
+    Each line records a (stage, item) pair, the hash of the inputs it was produced from and
+    its result. On startup the journal is replayed so a stage can skip items whose inputs
+    have not changed; the latest entry for an item wins.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash mid-write can leave a truncated last line
+                        logger.warning(f"Skipping malformed journal line in {path}")
+                        continue
+                    self.entries[(entry['stage'], entry['item'])] = entry
+        logger.info(f"Loaded {len(self.entries)} completed items from journal {path}")
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def get(self, stage: str, item: str, item_hash: str) -> Optional[Any]:
+        """Return the recorded result if the item was completed from the same inputs."""
+        entry = self.entries.get((stage, str(item)))
+        if entry is not None and entry['hash'] == item_hash:
+            return entry['result']
+        return None
+
+    def is_done(self, stage: str, item: str, item_hash: str) -> bool:
+        entry = self.entries.get((stage, str(item)))
+        return entry is not None and entry['hash'] == item_hash
+
+    def record(self, stage: str, item: str, item_hash: str, result: Any) -> None:
+        entry = {
+            "stage": stage,
+            "item": str(item),
+            "hash": item_hash,
+            "result": result,
+            "timestamp": datetime.now().isoformat()
+        }
+        with self.lock:
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.entries[(stage, str(item))] = entry
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
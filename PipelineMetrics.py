@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+METRICS_FOLDER = "metrics"
+
+class PipelineMetrics:
+    """Thread-safe latency samples and counters for one pipeline run.
+
+    Stages record latencies with `timer`/`observe` and events (retries, cache hits,
+    token counts) with `increment`. `write_summary` writes a JSON summary per run and
+    a Prometheus textfile with the latest values.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.counters: Dict[str, float] = {}
+        self.started = time.time()
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self.lock:
+            self.latencies.setdefault(name, []).append(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict:
+        with self.lock:
+            stages = {}
+            for name, samples in self.latencies.items():
+                ordered = sorted(samples)
+                stages[name] = {
+                    "count": len(ordered),
+                    "total_seconds": sum(ordered),
+                    "mean_seconds": sum(ordered) / len(ordered),
+                    "p50_seconds": ordered[len(ordered) // 2],
+                    "p95_seconds": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                    "max_seconds": ordered[-1]
+                }
+            return {
+                "started": datetime.fromtimestamp(self.started).isoformat(),
+                "wall_seconds": time.time() - self.started,
+                "stages": stages,
+                "counters": dict(self.counters)
+            }
+
+    def write_summary(self, run_name: str, folder: str = METRICS_FOLDER) -> str:
+        os.makedirs(folder, exist_ok=True)
+        summary = self.summary()
+        summary["run"] = run_name
+
+        json_path = os.path.join(folder, f"{run_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        lines = [f'charaka_run_wall_seconds{{run="{run_name}"}} {summary["wall_seconds"]:.6f}']
+        for name, stage in summary["stages"].items():
+            lines.append(f'charaka_stage_seconds_count{{run="{run_name}",stage="{name}"}} {stage["count"]}')
+            lines.append(f'charaka_stage_seconds_sum{{run="{run_name}",stage="{name}"}} {stage["total_seconds"]:.6f}')
+            lines.append(f'charaka_stage_seconds{{run="{run_name}",stage="{name}",quantile="0.5"}} {stage["p50_seconds"]:.6f}')
+            lines.append(f'charaka_stage_seconds{{run="{run_name}",stage="{name}",quantile="0.95"}} {stage["p95_seconds"]:.6f}')
+        for name, value in summary["counters"].items():
+            lines.append(f'charaka_{name}_total{{run="{run_name}"}} {value}')
+        prom_path = os.path.join(folder, f"{run_name}.prom")
+        # Write then rename so a textfile collector never reads a partial file
+        with open(f"{prom_path}.tmp", 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(f"{prom_path}.tmp", prom_path)
+
+        logger.info(f"Metrics summary written to {json_path} and {prom_path}")
+        return json_path
+
+# Shared by every stage in the process, like the logging module's root logger
+metrics = PipelineMetrics()
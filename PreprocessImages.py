@@ -0,0 +1,174 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Union
+
+from PIL import Image, ImageOps, ImageStat
+
+from PipelineMetrics import metrics
+from PageArchive import open_pages, page_source_name
+
+PREPROCESSED_FOLDER = "PreprocessedImage"
+CACHE_FOLDER = os.path.join(PREPROCESSED_FOLDER, "cache")
+
+def estimate_skew(image: Image.Image, max_angle: float = 3.0, step: float = 0.25) -> float:
+    """Find the rotation that makes text rows line up best (highest variance of row ink)."""
+    small = image.convert('L')
+    small.thumbnail((800, 800))
+    inverted = ImageOps.invert(small)
+
+    best_angle, best_score = 0.0, -1.0
+    steps = int(max_angle / step)
+    for i in range(-steps, steps + 1):
+        angle = i * step
+        rotated = inverted.rotate(angle, resample=Image.BILINEAR, fillcolor=0)
+        # Squash each row to one pixel: its value is the row's mean ink
+        row_profile = rotated.resize((1, rotated.height), Image.BOX)
+        score = ImageStat.Stat(row_profile).var[0]
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+def crop_margins(image: Image.Image, threshold: int = 200, padding: int = 20) -> Image.Image:
+    ink = image.point(lambda p: 255 if p < threshold else 0)
+    bbox = ink.getbbox()
+    if bbox is None:
+        return image
+    left, top, right, bottom = bbox
+    return image.crop((max(left - padding, 0), max(top - padding, 0),
+                       min(right + padding, image.width), min(bottom + padding, image.height)))
+
+def preprocess_image(source: Union[str, Image.Image], output_path: str, mode: str = "bilevel", deskew: bool = True,
+                     crop: bool = True, threshold: int = 160, optimize: bool = True) -> None:
+    """Preprocess one page, given as an image path or an opened (not yet decoded) image."""
+    source_path = source if isinstance(source, str) else source.filename or "page"
+    with (Image.open(source) if isinstance(source, str) else source) as opened:
+        image = opened.convert('L')
+
+    if deskew:
+        angle = estimate_skew(image)
+        if angle:
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+            logging.debug(f"Deskewed {source_path} by {angle} degrees")
+    if crop:
+        image = crop_margins(image)
+    if mode == "bilevel":
+        image = image.point(lambda p: 255 if p > threshold else 0).convert('1')
+
+    image.save(output_path, format="PNG", optimize=optimize)
+
+def options_key(options: Dict) -> str:
+    return ",".join(f"{k}={options[k]}" for k in sorted(options))
+
+def cached_preprocess(pages_path: str, name: str, output_path: str, options: Dict) -> Dict:
+    """Preprocess one page of a folder or page archive, reusing the cached variant for identical source bytes and options.
+
+    The source is only decoded on a cache miss; from an archive its hash comes from the index.
+    """
+    with open_pages(pages_path) as pages:
+        source_hash = pages.page_hash(name)
+        source_bytes = pages.page_length(name)
+        variant_hash = hashlib.sha256(f"{source_hash}:{options_key(options)}".encode('utf-8')).hexdigest()
+        cache_path = os.path.join(CACHE_FOLDER, f"{variant_hash}.png")
+
+        cached = os.path.exists(cache_path)
+        if not cached:
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            preprocess_image(pages.image(name), temp_path, **options)
+            os.replace(temp_path, cache_path)
+
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    try:
+        os.link(cache_path, output_path)
+    except OSError:
+        shutil.copyfile(cache_path, output_path)
+
+    return {
+        "page": name,
+        "cached": cached,
+        "source_bytes": source_bytes,
+        "output_bytes": os.path.getsize(cache_path)
+    }
+
+def preprocess_folder(folder_path: str, output_folder: Optional[str] = None, workers: Optional[int] = None, **options) -> str:
+    """Preprocess every page image of a chapter (a folder or a page archive) and return the folder holding the results."""
+    output_folder = output_folder or os.path.join(PREPROCESSED_FOLDER, page_source_name(folder_path))
+    os.makedirs(output_folder, exist_ok=True)
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+
+    with open_pages(folder_path) as pages:
+        image_files = pages.names()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        reports = list(executor.map(cached_preprocess,
+                                    [folder_path] * len(image_files),
+                                    image_files,
+                                    [os.path.join(output_folder, f) for f in image_files],
+                                    [options] * len(image_files)))
+    elapsed = time.perf_counter() - start
+
+    source_bytes = sum(r["source_bytes"] for r in reports)
+    output_bytes = sum(r["output_bytes"] for r in reports)
+    cache_hits = sum(r["cached"] for r in reports)
+    ratio = source_bytes / output_bytes if output_bytes else 0
+    metrics.observe("preprocess_chapter", elapsed)
+    metrics.increment("preprocess_source_bytes", source_bytes)
+    metrics.increment("preprocess_output_bytes", output_bytes)
+    metrics.increment("preprocess_cache_hits", cache_hits)
+    logging.info(f"Preprocessed {len(reports)} pages from {folder_path} into {output_folder} in {elapsed:.1f}s "
+                 f"({cache_hits} from cache): {source_bytes:,} -> {output_bytes:,} bytes, "
+                 f"saved {source_bytes - output_bytes:,} bytes ({ratio:.1f}x smaller)")
+    return output_folder
+
+def measure_ocr_latency(folder_path: str, image_files: List[str]) -> float:
+    from ImageToBaseJson import process_document
+    from google.cloud import documentai_v1 as documentai
+
+    client = documentai.DocumentProcessorServiceClient()
+    start = time.perf_counter()
+    for image_file in image_files:
+        process_document(PROJECT_ID, LOCATION, PROCESSOR_ID, os.path.join(folder_path, image_file), client)
+    return time.perf_counter() - start
+
+PROJECT_ID = "1039812532642"
+LOCATION = "us"
+PROCESSOR_ID = "1fb139ed60959696"
+
+if __name__ == "__main__":
+    # Configured here rather than on import, so scripts importing this module keep their own log file
+    log_dir = 'logs'
+    os.makedirs(log_dir, exist_ok=True)
+    logging.basicConfig(
+        filename=os.path.join(log_dir, 'image_preprocessing.log'),
+        level=logging.DEBUG,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Shrink page images before OCR")
+    parser.add_argument("--folder", default="ExtractedImage/S1-Chapter5", help="Folder of page PNGs (default: ExtractedImage/S1-Chapter5)")
+    parser.add_argument("--mode", choices=["bilevel", "gray"], default="bilevel", help="Output colour mode (default: bilevel)")
+    parser.add_argument("--threshold", type=int, default=160, help="Bilevel threshold, 0-255 (default: 160)")
+    parser.add_argument("--no_deskew", action="store_true", help="Skip skew correction")
+    parser.add_argument("--no_crop", action="store_true", help="Keep page margins")
+    parser.add_argument("--no_optimize", action="store_true", help="Skip lossless PNG recompression")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--measure_ocr", type=int, default=0, help="OCR this many pages before and after preprocessing and log the latency")
+    args = parser.parse_args()
+
+    output_folder = preprocess_folder(args.folder, workers=args.workers, mode=args.mode, threshold=args.threshold,
+                                      deskew=not args.no_deskew, crop=not args.no_crop, optimize=not args.no_optimize)
+
+    if args.measure_ocr:
+        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "csprocessor-service-account.json"
+        sample = sorted(f for f in os.listdir(args.folder) if f.endswith('.png'))[:args.measure_ocr]
+        before = measure_ocr_latency(args.folder, sample)
+        after = measure_ocr_latency(output_folder, sample)
+        logging.info(f"OCR latency for {len(sample)} pages: {before:.2f}s original, {after:.2f}s preprocessed")
+        print(f"OCR latency for {len(sample)} pages: {before:.2f}s original, {after:.2f}s preprocessed")
+
+    metrics.write_summary(f"preprocess_{os.path.basename(os.path.normpath(args.folder))}")
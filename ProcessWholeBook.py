@@ -0,0 +1,374 @@
+import os
+import re
+import glob
+import json
+import hashlib
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from BookToImageSplitToEachPage import rasterize_document
+import ImageToBaseJson
+import GenerateCompleteJson
+import generateInterpretationWithClaudeSonnet as interpretation
+from CorpusStore import CorpusStore
+from SearchIndex import SearchIndex, SEARCH_FILE
+from ResponseCache import ResponseCache
+from PipelineMetrics import metrics
+from Backends import make_ocr_backend, make_translation_backend, llm_backend
+from VerseDedup import translation_index, interpretation_index
+from PageArchive import ensure_archive
+
+BOOK_FOLDER = "Book"
+BUILD_FOLDER = "build"
+# Where --fake_backends runs by default, so fake outputs, journals and stores never mix with real ones
+FAKE_ROOT = os.path.join(BUILD_FOLDER, "fake")
+
+# Google Cloud project details
+PROJECT_ID = "1039812532642"
+LOCATION = "us"
+PROCESSOR_ID = "1fb139ed60959696"
+CREDENTIALS_PATH = "csprocessor-service-account.json"
+
+class Chapter:
+    """One chapter PDF, e.g. Book/S1-Chapter5.pdf, and the paths every stage derives from it."""
+
+    def __init__(self, pdf_path: str, section: int, chapter: int):
+        self.pdf_path = pdf_path
+        self.section = section
+        self.chapter = chapter
+        self.code = f"S{section}C{chapter}"
+        self.image_folder = os.path.join("ExtractedImage", f"S{section}-Chapter{chapter}")
+        self.ocr_folder = os.path.join("ExtractedFromOCR", self.code)
+        self.interpretation_folder = os.path.join("InterpretationByClaude", self.code, "output")
+
+def discover_chapters(book_folder: str = BOOK_FOLDER) -> List[Chapter]:
+    chapters = []
+    for file_name in os.listdir(book_folder):
+        match = re.fullmatch(r'S(\d+)-Chapter(\d+)\.pdf', file_name)
+        if match:
+            chapters.append(Chapter(os.path.join(book_folder, file_name), int(match.group(1)), int(match.group(2))))
+    return sorted(chapters, key=lambda c: (c.section, c.chapter))
+
+def prepare_fake_root(root: str) -> None:
+    """Link the chapter PDFs, page images and scripts into `root`; everything a run writes then lands there.
+
+    The page images come from the PDFs rather than a backend, so they are shared with the real tree.
+    """
+    os.makedirs(root, exist_ok=True)
+    for path in [BOOK_FOLDER, "ExtractedImage"] + glob.glob("*.py"):
+        link = os.path.join(root, path)
+        if not os.path.lexists(link):
+            os.symlink(os.path.abspath(path), link)
+
+class Stage:
+    """A step of the per-chapter DAG: it is rebuilt when its inputs' hash changes or an output is missing.
+
+    `options` are the command-line settings that change the stage's output; they are hashed
+    with the input files, so e.g. a different --dpi rasterizes the chapters again.
+    """
+
+    def __init__(self, name: str, deps: List[str], inputs: Callable[[Chapter], List[str]],
+                 outputs: Callable[[Chapter], List[str]], run: Callable[[Chapter], None], limit: int = 1,
+                 options: Dict = None):
+        self.name = name
+        self.deps = deps
+        self.inputs = inputs
+        self.outputs = outputs
+        self.run = run
+        self.limit = limit
+        self.options = options or {}
+        self.semaphore = threading.Semaphore(limit)
+
+def hash_inputs(paths: List[str], options: Dict = None) -> str:
+    digest = hashlib.sha256()
+    if options:
+        digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    for path in paths:
+        files = [path] if os.path.isfile(path) else sorted(
+            os.path.join(root, f) for root, _, names in os.walk(path) for f in names)
+        for file_path in files:
+            digest.update(file_path.encode('utf-8'))
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+def stamp_path(chapter: Chapter, stage_name: str) -> str:
+    return os.path.join(BUILD_FOLDER, chapter.code, f"{stage_name}.json")
+
+def read_stamp(chapter: Chapter, stage_name: str) -> Dict:
+    """The stage's stamp from its last build of the chapter, or {} if there is none."""
+    try:
+        with open(stamp_path(chapter, stage_name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def is_up_to_date(chapter: Chapter, stage: Stage, inputs_hash: str) -> bool:
+    for output in stage.outputs(chapter):
+        if not os.path.exists(output) or (os.path.isdir(output) and not os.listdir(output)):
+            return False
+    return read_stamp(chapter, stage.name).get("inputs_hash") == inputs_hash
+
+def write_stamp(chapter: Chapter, stage: Stage, inputs_hash: str) -> None:
+    os.makedirs(os.path.dirname(stamp_path(chapter, stage.name)), exist_ok=True)
+    with open(stamp_path(chapter, stage.name), 'w', encoding='utf-8') as f:
+        json.dump({"inputs_hash": inputs_hash, "options": stage.options, "built": datetime.now().isoformat()}, f, indent=2)
+
+def build(chapter: Chapter, stage: Stage, force: bool = False, dry_run: bool = False, touch: bool = False) -> str:
+    with stage.semaphore:
+        inputs = stage.inputs(chapter)
+        missing = [path for path in inputs if not os.path.exists(path)]
+        if missing:
+            if dry_run:
+                return "would run"
+            raise FileNotFoundError(f"{chapter.code}/{stage.name}: missing inputs {missing}")
+        inputs_hash = hash_inputs(inputs, stage.options)
+        if not force and is_up_to_date(chapter, stage, inputs_hash):
+            logging.info(f"{chapter.code}/{stage.name} is up to date")
+            return "up to date"
+        if dry_run:
+            return "would run"
+        if touch and all(os.path.exists(output) for output in stage.outputs(chapter)):
+            # Like make -t: accept existing outputs as built from the current inputs
+            write_stamp(chapter, stage, inputs_hash)
+            return "touched"
+
+        logging.info(f"Running {chapter.code}/{stage.name}")
+        with metrics.timer(f"book_{stage.name}"):
+            stage.run(chapter)
+
+        # Stamp with the hash taken before running, so inputs edited mid-run trigger another build
+        write_stamp(chapter, stage, inputs_hash)
+        return "built"
+
+def run_dag(chapters: List[Chapter], stages: List[Stage], force: bool = False, dry_run: bool = False, touch: bool = False) -> Dict:
+    """Run every (chapter, stage) task once its dependencies for that chapter have finished.
+
+    Chapters progress independently; each stage's semaphore caps how many chapters run it
+    at once, so e.g. OCR of one chapter overlaps with interpretation of another.
+    """
+    stage_by_name = {stage.name: stage for stage in stages}
+    pending = {(chapter.code, stage.name): (chapter, stage) for chapter in chapters for stage in stages}
+    statuses = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, sum(stage.limit for stage in stages))) as executor:
+        while pending or running:
+            for key, (chapter, stage) in list(pending.items()):
+                dep_statuses = [statuses.get((chapter.code, dep)) for dep in stage.deps if dep in stage_by_name]
+                if any(status is None for status in dep_statuses):
+                    continue
+                del pending[key]
+                if any(status.startswith(("failed", "skipped")) for status in dep_statuses):
+                    statuses[key] = "skipped (dependency failed)"
+                elif dry_run and "would run" in dep_statuses:
+                    statuses[key] = "would run"
+                else:
+                    running[executor.submit(build, chapter, stage, force, dry_run, touch)] = key
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                key = running.pop(future)
+                try:
+                    statuses[key] = future.result()
+                except Exception as e:
+                    logging.error(f"{key[0]}/{key[1]} failed: {e}", exc_info=True)
+                    statuses[key] = f"failed: {e}"
+    return statuses
+
+def make_stages(args, rate_limiter, cache) -> List[Stage]:
+    documentai_client = None
+    translate_client = None
+    backend = "fake" if args.fake_backends else None
+    # Fake OCR results are cached under their own processor id, apart from real Document AI responses
+    processor_id = "fake" if args.fake_backends else PROCESSOR_ID
+    duplicate_indexes = {}
+    duplicate_lock = threading.Lock()
+
+    def duplicate_index(kind: str):
+        # One index of each kind for the whole book, so a verse translated or interpreted in one
+        # chapter is reused by every chapter after it, including ones running concurrently
+        if args.unique:
+            return None
+        with duplicate_lock:
+            if kind not in duplicate_indexes:
+                with CorpusStore() as store:
+                    duplicate_indexes[kind] = translation_index(store) if kind == "translation" \
+                        else interpretation_index(store, interpretation.generation_key())
+            return duplicate_indexes[kind]
+
+    # Stages that finish with failed items raise, so the chapter is not stamped and the next run
+    # retries just those items (the rest are skipped, or come from the journals)
+    def run_rasterize(chapter: Chapter) -> None:
+        # Existing page images are kept, unless the last build rendered them at another resolution
+        built_dpi = read_stamp(chapter, "rasterize").get("options", {}).get("dpi", args.dpi)
+        _, failed = rasterize_document(chapter.pdf_path, chapter.image_folder, dpi=args.dpi, overwrite=built_dpi != args.dpi)
+        if failed:
+            raise RuntimeError(f"pages {failed} were not rasterized")
+
+    def run_ocr(chapter: Chapter) -> None:
+        nonlocal documentai_client
+        # One Document AI client for the whole book; its channel is shared by every chapter's OCR workers
+        documentai_client = documentai_client or make_ocr_backend(backend or "documentai", args.fake_latency)
+        # The archive is rebuilt when the rasterized pages are newer, and shares their OCR journal and cache entries
+        pages = ensure_archive(chapter.image_folder) if args.page_archive else chapter.image_folder
+        ImageToBaseJson.process_chapter(PROJECT_ID, LOCATION, processor_id, pages, chapter.section,
+                                        chapter.chapter, args.ocr_workers, args.preprocess, documentai_client,
+                                        layout=args.ocr_layout)
+
+    def run_reocr(chapter: Chapter) -> None:
+        nonlocal documentai_client
+        documentai_client = documentai_client or make_ocr_backend(backend or "documentai", args.fake_latency)
+        pages = ensure_archive(chapter.image_folder) if args.page_archive else chapter.image_folder
+        ImageToBaseJson.reocr_chapter(PROJECT_ID, LOCATION, processor_id, pages, chapter.section, chapter.chapter,
+                                      preprocess_pages=args.reocr_method == "preprocessed", client=documentai_client,
+                                      ocr_workers=args.ocr_workers)
+
+    def run_translate(chapter: Chapter) -> None:
+        nonlocal translate_client
+        translate_client = translate_client or make_translation_backend(backend or "google", CREDENTIALS_PATH, args.fake_latency)
+        failed = GenerateCompleteJson.translate_chapter(os.path.join(chapter.ocr_folder, 'charaka_samhita_output.json'),
+                                               os.path.join(chapter.ocr_folder, 'charaka_samhita_translated.json'),
+                                               CREDENTIALS_PATH, args.translate_workers, translate_client,
+                                               duplicate_index("translation"), args.unique)
+        if failed:
+            raise RuntimeError(f"{failed} verses were not translated")
+
+    def run_interpret(chapter: Chapter) -> None:
+        failed = interpretation.interpret_chapter(chapter.code, args.llm_workers, rate_limiter, cache, args.llm_backend,
+                                                  interpretation.STREAM_RESPONSES, duplicate_index("interpretation"), args.unique,
+                                                  args.pack_groups or interpretation.PACK_GROUPS)
+        if failed:
+            raise RuntimeError(f"{failed} verse groups failed")
+
+    def run_index(chapter: Chapter) -> None:
+        with CorpusStore() as store, SearchIndex() as index:
+            # Chapters built before the corpus store existed are imported from their files first
+            if store.chapter(chapter.section, chapter.chapter) is None:
+                store.import_chapter(chapter.section, chapter.chapter)
+            index.refresh(store, [(chapter.section, chapter.chapter)])
+
+    # Each stage's own script is one of its inputs, so editing e.g. the verse parser rebuilds
+    # the chapters downstream of it (cheaply, since the per-item journals still hold OCR results)
+    stages = [
+        Stage("rasterize", [],
+              lambda c: [c.pdf_path, 'BookToImageSplitToEachPage.py'],
+              lambda c: [c.image_folder],
+              run_rasterize, limit=1, options={"dpi": args.dpi}),
+        Stage("ocr", ["rasterize"],
+              lambda c: [c.image_folder, 'ImageToBaseJson.py', 'PageArchive.py'],
+              lambda c: [os.path.join(c.ocr_folder, 'charaka_samhita_output.json'),
+                         os.path.join(c.ocr_folder, 'charaka_samhita_output.docx')],
+              run_ocr, limit=args.max_chapters,
+              options={"preprocess": args.preprocess, "page_archive": args.page_archive, "ocr_layout": args.ocr_layout}),
+        # Opt-in: OCRs the pages the ocr stage flagged again and splices better text into its output
+        Stage("reocr", ["ocr"],
+              lambda c: [os.path.join(c.ocr_folder, ImageToBaseJson.PAGES_FILE_NAME), c.image_folder, 'ImageToBaseJson.py'],
+              lambda c: [os.path.join(c.ocr_folder, 'charaka_samhita_output.json'),
+                         os.path.join(c.ocr_folder, 'charaka_samhita_output.docx')],
+              run_reocr, limit=args.max_chapters, options={"reocr_method": args.reocr_method, "page_archive": args.page_archive}),
+        Stage("translate", ["ocr", "reocr"],
+              lambda c: [os.path.join(c.ocr_folder, 'charaka_samhita_output.json'), 'GenerateCompleteJson.py', 'VerseDedup.py'],
+              lambda c: [os.path.join(c.ocr_folder, 'charaka_samhita_translated.json')],
+              run_translate, limit=args.max_chapters, options={"unique": args.unique}),
+        Stage("interpret", ["ocr", "reocr"],
+              lambda c: [os.path.join(c.ocr_folder, 'charaka_samhita_output.json'), 'generateInterpretationWithClaudeSonnet.py',
+                         'VerseDedup.py'],
+              lambda c: [os.path.join(c.interpretation_folder, 'charaka_samhita_translated_detailed_full.json'),
+                         os.path.join(c.interpretation_folder, 'charaka_samhita_translated_detailed_full.txt')],
+              # A chapter waiting on a Message Batch holds no quota, so batches for every chapter can be in flight
+              run_interpret, limit=args.max_chapters if args.llm_backend == "messages" else max(len(discover_chapters()), 1),
+              options={"llm_backend": args.llm_backend, "pack_groups": args.pack_groups or interpretation.PACK_GROUPS,
+                       "unique": args.unique}),
+        Stage("index", ["translate", "interpret"],
+              lambda c: [os.path.join(c.ocr_folder, 'charaka_samhita_translated.json'),
+                         os.path.join(c.interpretation_folder, 'charaka_samhita_translated_detailed_full.json'), 'SearchIndex.py'],
+              lambda c: [SEARCH_FILE],
+              run_index, limit=1),
+    ]
+    return [stage for stage in stages if stage.name in args.stages]
+
+def run_book(args) -> Dict:
+    log_folder = "logs"
+    os.makedirs(log_folder, exist_ok=True)
+    logging.basicConfig(filename=os.path.join(log_folder, f"whole_book_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"),
+                        level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(threadName)s - %(message)s', force=True)
+    os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", CREDENTIALS_PATH)
+
+    chapters = discover_chapters()
+    if args.chapters:
+        chapters = [chapter for chapter in chapters if chapter.code in args.chapters]
+    logging.info(f"Processing chapters {[chapter.code for chapter in chapters]} through stages {args.stages}")
+
+    # The API quota and the response cache are shared by every chapter
+    # Fake backends have no quota, and their responses are kept out of the shared Claude response cache
+    rate_limiter = None if args.fake_backends else interpretation.RateLimiter(interpretation.REQUESTS_PER_MINUTE,
+                                                                              interpretation.TOKENS_PER_MINUTE)
+    cache = None if args.fake_backends else ResponseCache(interpretation.CACHE_FILE, max_age_days=interpretation.CACHE_MAX_AGE_DAYS,
+                                                          max_size_mb=interpretation.CACHE_MAX_SIZE_MB)
+    try:
+        with llm_backend("fake" if args.fake_backends else "anthropic", args.fake_latency):
+            return run_dag(chapters, make_stages(args, rate_limiter, cache), args.force, args.dry_run, args.touch)
+    finally:
+        if cache:
+            cache.close()
+        interpretation.record_llm_cost()
+        metrics.write_summary("whole_book")
+
+def main(argv: List[str] = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Run the whole Charaka Samhita pipeline for every chapter PDF in Book/")
+    parser.add_argument("--chapters", nargs='+', help="Chapter codes to process, e.g. S1C3 S1C5 (default: every Book/S*-Chapter*.pdf)")
+    parser.add_argument("--stages", nargs='+', default=["rasterize", "ocr", "translate", "interpret", "index"],
+                        help="Stages to run (reocr, which OCRs flagged pages again, is opt-in); a stage whose dependency is not selected uses the existing outputs")
+    parser.add_argument("--force", action="store_true", help="Rebuild even when inputs are unchanged")
+    parser.add_argument("--dry_run", action="store_true", help="Only report which stages would run")
+    parser.add_argument("--touch", action="store_true", help="Mark existing outputs as up to date instead of rebuilding them")
+    parser.add_argument("--max_chapters", type=int, default=4, help="Chapters running the same stage at once (default: 4)")
+    parser.add_argument("--dpi", type=int, default=300, help="Rasterization resolution (default: 300)")
+    parser.add_argument("--ocr_workers", type=int, default=4, help="Concurrent OCR requests per chapter (default: 4)")
+    parser.add_argument("--preprocess", action="store_true", help="OCR preprocessed page images")
+    parser.add_argument("--page_archive", action="store_true",
+                        help="Pack each chapter's page images into one memory-mapped archive and OCR from it")
+    parser.add_argument("--ocr_layout", action="store_true", help="Rebuild page text from the OCR paragraph layout, dropping running heads and folio numbers")
+    parser.add_argument("--reocr_method", choices=["preprocessed", "fresh"], default="preprocessed",
+                        help="How the reocr stage OCRs flagged pages again: a preprocessed image, or the same image "
+                             "past the OCR cache (default: %(default)s)")
+    parser.add_argument("--translate_workers", type=int, default=4, help="Concurrent translation batches per chapter (default: 4)")
+    parser.add_argument("--llm_workers", type=int, default=interpretation.MAX_WORKERS, help="Concurrent Claude requests per chapter")
+    parser.add_argument("--llm_backend", choices=["messages", "batch"], default=interpretation.BACKEND,
+                        help="Synchronous requests, or one half-price Message Batch per chapter (default: %(default)s)")
+    parser.add_argument("--pack_groups", action="store_true",
+                        help="Send runs of small adjacent verse groups as one Claude request (messages backend only)")
+    parser.add_argument("--unique", action="store_true",
+                        help="Translate and interpret every verse, instead of once per cluster of near-duplicate verses")
+    parser.add_argument("--fake_backends", action="store_true",
+                        help="Run offline against fake OCR, translation and Claude backends that replay the recorded outputs")
+    parser.add_argument("--fake_root", default=FAKE_ROOT,
+                        help="Folder a --fake_backends run works in, with the PDFs, page images and scripts linked in "
+                             "(default: %(default)s; '.' runs in the current tree)")
+    parser.add_argument("--fake_latency", type=float, default=0.0, help="Seconds each fake backend call takes (default: 0)")
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    if args.fake_backends:
+        # Outputs, journals, the corpus store and stamps are all relative to the working directory
+        prepare_fake_root(args.fake_root)
+        os.chdir(args.fake_root)
+    try:
+        statuses = run_book(args)
+    finally:
+        os.chdir(cwd)
+
+    for (code, stage_name), status in sorted(statuses.items()):
+        print(f"{code:<8} {stage_name:<10} {status}")
+    return statuses
+
+if __name__ == "__main__":
+    main()
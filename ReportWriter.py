@@ -0,0 +1,214 @@
+import gc
+import os
+import time
+import logging
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from CorpusStore import CorpusStore, CORPUS_FILE, chapter_code, parse_chapter_code
+
+logger = logging.getLogger(__name__)
+
+REPORT_FOLDER = "reports"
+
+# (label, field) in the order every interpretation is laid out
+INTERPRETATION_SECTIONS = [
+    ("Sanskrit", "sanskrit"),
+    ("Translation", "translation"),
+    ("Vocabulary and Key Terms", "vocabulary"),
+    ("Context and Significance", "context"),
+    ("Detailed Interpretation", "interpretation"),
+    ("Ayurvedic Principles and Applications", "ayurvedic_principles"),
+    ("Conclusion", "conclusion"),
+]
+
+PAGE_BREAK_XML = b'<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+def interpretation_text_parts(results: Iterable[Dict[str, str]]) -> Iterator[str]:
+    """The text layout of charaka_samhita_translated_detailed_full.txt, one verse group at a time."""
+    yield "\n\n" + "=" * 50
+    for i, result in enumerate(results, 1):
+        if i > 1:
+            yield "\n\n"
+        yield f"{i}. Verses {result['verses']}:\n\n" + "\n\n".join(
+            f"{label}:\n{result[field]}" for label, field in INTERPRETATION_SECTIONS)
+
+def interpretation_markdown_parts(results: Iterable[Dict[str, str]], heading_level: int = 2) -> Iterator[str]:
+    """The same content as Markdown, with a heading per verse group and per section."""
+    for i, result in enumerate(results, 1):
+        yield f"{'#' * heading_level} {i}. Verses {result['verses']}\n\n"
+        for label, field in INTERPRETATION_SECTIONS:
+            yield f"{'#' * (heading_level + 1)} {label}\n\n{result[field]}\n\n"
+
+def verse_text_parts(verses: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Verses and their translations, for chapters that have not been interpreted yet."""
+    for verse in verses:
+        translation = f"\n{verse['translation']}" if verse['translation'] else ""
+        yield f"Verse {verse['verse_number']}: {verse['sanskrit']}{translation}\n\n"
+
+def write_parts(parts: Iterable[str], path: str) -> str:
+    """Write text parts as they are produced, replacing path only once the file is complete."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for part in parts:
+            f.write(part)
+    os.replace(temp_path, path)
+    return path
+
+def write_interpretation_text(results: Iterable[Dict[str, str]], path: str) -> str:
+    return write_parts(interpretation_text_parts(results), path)
+
+def write_ocr_docx(sanskrit_verses: Iterable[Dict[str, Any]], verse_groups: Iterable[str], ocr_content: Iterable[str],
+                   output_path: str) -> None:
+    """The chapter's OCR Word document: OCR text, verses and verse groups, each added as it is read.
+
+    The OCR text goes in one paragraph per line rather than a single paragraph for the whole
+    chapter; read_docx_ocr_text recovers the same text from either layout.
+    """
+    # python-docx is only needed for Word output
+    from docx import Document
+
+    document = Document()
+    document.add_heading('Charaka Samhita OCR Output', 0)
+
+    document.add_heading('OCR Content', level=1)
+    for content in ocr_content:
+        for line in content.split('\n'):
+            document.add_paragraph(line)
+
+    document.add_heading('Sanskrit Verses', level=1)
+    for verse in sanskrit_verses:
+        if verse.get('error'):
+            document.add_paragraph(f"Error: {verse['error']}")
+        document.add_paragraph(f"Verse {verse.get('verse_number', 'Unknown')}: {verse['sanskrit']}")
+
+    document.add_heading('Verse Groups', level=1)
+    for group in verse_groups:
+        document.add_paragraph(f"Verse Group: {group}")
+
+    document.save(output_path)
+    logger.info(f"OCR output has been written to {output_path}")
+
+def chapter_title(row: Dict[str, Any]) -> str:
+    name = f": {row['chapter_name']}" if row['chapter_name'] else ""
+    return f"Section {row['section']}, Chapter {row['chapter']}{name}"
+
+def write_chapter_docx(corpus_path: str, section: int, chapter: int, output_path: str) -> str:
+    """One chapter's report as a Word document: its interpretations, or its translated verses if it has none.
+
+    Runs in a worker process, so it opens its own connection to the corpus store.
+    """
+    from docx import Document
+
+    with CorpusStore(corpus_path) as store:
+        document = Document()
+        document.add_heading(chapter_title(store.chapter(section, chapter)), level=1)
+        results = store.interpretations(section, chapter)
+        for i, result in enumerate(results, 1):
+            document.add_heading(f"{i}. Verses {result['verses']}", level=2)
+            for label, field in INTERPRETATION_SECTIONS:
+                document.add_heading(label, level=3)
+                for paragraph in (result[field] or "").split('\n\n'):
+                    document.add_paragraph(paragraph)
+        if not results:
+            for verse in store.verses(section, chapter):
+                document.add_paragraph(f"Verse {verse['verse_number']}: {verse['sanskrit']}")
+                if verse['translation']:
+                    document.add_paragraph(verse['translation'])
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    document.save(output_path)
+    # A python-docx document is a web of reference cycles that is otherwise only freed by an
+    # occasional full collection, so a worker building chapter after chapter would keep growing
+    del document
+    gc.collect()
+    return output_path
+
+def write_chapter_docx_parts(corpus_path: str, chapters: List[Tuple[int, int]], folder: str, workers: int = 4) -> List[str]:
+    """Build each chapter's Word document in a pool of worker processes; returns the paths in chapter order."""
+    paths = [os.path.join(folder, f"{chapter_code(section, chapter)}.docx") for section, chapter in chapters]
+    # Building a document is CPU-bound python-docx/lxml work, so chapters go to processes rather than threads
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(write_chapter_docx, [corpus_path] * len(chapters), *zip(*chapters), paths))
+
+def docx_body(xml: bytes) -> Tuple[bytes, bytes, bytes]:
+    """Split word/document.xml into the part up to <w:body>, the body content, and the final section properties onwards."""
+    start = xml.index(b'<w:body>') + len(b'<w:body>')
+    end = xml.rindex(b'<w:sectPr')
+    return xml[:start], xml[start:end], xml[end:]
+
+def assemble_docx(part_paths: List[str], output_path: str) -> str:
+    """Join per-chapter Word documents into one, with a page break between chapters.
+
+    The body of each part is streamed into the output's document.xml in turn, so only one
+    chapter is in memory at a time. Styles and the other package parts come from the first
+    part; every part is made by python-docx from the same template and has no images or
+    other relationships, so their body XML is valid in the combined document.
+    """
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    temp_path = output_path + '.tmp'
+    with zipfile.ZipFile(part_paths[0]) as first, zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as output:
+        for item in first.infolist():
+            if item.filename != 'word/document.xml':
+                output.writestr(item, first.read(item))
+        head, _, tail = docx_body(first.read('word/document.xml'))
+        with output.open('word/document.xml', 'w') as document:
+            document.write(head)
+            for i, path in enumerate(part_paths):
+                with zipfile.ZipFile(path) as part:
+                    body = docx_body(part.read('word/document.xml'))[1]
+                if i:
+                    document.write(PAGE_BREAK_XML)
+                document.write(body)
+            document.write(tail)
+    os.replace(temp_path, output_path)
+    logger.info(f"Assembled {len(part_paths)} chapters into {output_path}")
+    return output_path
+
+def book_text_parts(store: CorpusStore, chapters: List[Tuple[int, int]], markdown: bool = False) -> Iterator[str]:
+    """The interpretations (or, until a chapter is interpreted, its translated verses) of several chapters
+    as one text or Markdown document, read one chapter at a time."""
+    for section, chapter in chapters:
+        title = chapter_title(store.chapter(section, chapter))
+        results = store.interpretations(section, chapter)
+        yield f"# {title}\n\n" if markdown else f"{title}\n"
+        if not results:
+            yield from verse_text_parts(store.verses(section, chapter))
+        elif markdown:
+            yield from interpretation_markdown_parts(results)
+        else:
+            yield from interpretation_text_parts(results)
+            yield "\n\n"
+
+def write_book_report(corpus_path: str = CORPUS_FILE, chapters: Optional[List[Tuple[int, int]]] = None,
+                      folder: str = REPORT_FOLDER, formats: Iterable[str] = ("txt", "md", "docx"), workers: int = 4) -> List[str]:
+    """Write whole-book reports (charaka_samhita.txt/.md/.docx) under folder; returns the paths written."""
+    written = []
+    with CorpusStore(corpus_path) as store:
+        chapters = chapters or store.chapters()
+        if "txt" in formats:
+            written.append(write_parts(book_text_parts(store, chapters), os.path.join(folder, 'charaka_samhita.txt')))
+        if "md" in formats:
+            written.append(write_parts(book_text_parts(store, chapters, markdown=True), os.path.join(folder, 'charaka_samhita.md')))
+    if "docx" in formats and chapters:
+        parts = write_chapter_docx_parts(corpus_path, chapters, os.path.join(folder, 'chapters'), workers)
+        written.append(assemble_docx(parts, os.path.join(folder, 'charaka_samhita.docx')))
+    return written
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Write whole-book TXT, Markdown and Word reports from the corpus store")
+    parser.add_argument("--chapters", nargs='+', help="Chapter codes to include, e.g. S1C1 S1C5 (default: every stored chapter)")
+    parser.add_argument("--formats", nargs='+', choices=["txt", "md", "docx"], default=["txt", "md", "docx"], help="Formats to write")
+    parser.add_argument("--folder", default=REPORT_FOLDER, help=f"Output folder (default: {REPORT_FOLDER})")
+    parser.add_argument("--workers", type=int, default=4, help="Processes building chapter Word documents (default: 4)")
+    parser.add_argument("--corpus", default=CORPUS_FILE, help=f"Corpus database (default: {CORPUS_FILE})")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    chapters = [parse_chapter_code(code) for code in args.chapters] if args.chapters else None
+    for path in write_book_report(args.corpus, chapters, args.folder, args.formats, args.workers):
+        print(path)
+    print(f"Done in {time.perf_counter() - start:.1f} s")
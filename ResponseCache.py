@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Persistent content-addressed cache backed by SQLite.
+
+    Keys are hashes of whatever determines a response (model, prompt, max_tokens, ...),
+    values are raw bytes. Entries older than `max_age_days` are dropped, and once the
+    cache grows past `max_size_mb` the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, max_age_days: Optional[float] = None, max_size_mb: Optional[float] = None):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.max_age_seconds = max_age_days * 86400 if max_age_days else None
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(**fields) -> str:
+        payload = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            row = self.conn.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is not None and self.max_age_seconds and now - row[1] > self.max_age_seconds:
+                self.conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self.conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: bytes) -> None:
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now)
+            )
+            self.conn.commit()
+        if self.max_size_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        with self.lock:
+            if self.max_age_seconds:
+                self.conn.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.max_age_seconds,))
+            if self.max_size_bytes:
+                total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+                if total > self.max_size_bytes:
+                    rows = self.conn.execute("SELECT key, size FROM cache ORDER BY accessed").fetchall()
+                    stale = []
+                    for key, size in rows:
+                        if total <= self.max_size_bytes:
+                            break
+                        stale.append((key,))
+                        total -= size
+                    self.conn.executemany("DELETE FROM cache WHERE key = ?", stale)
+                    logger.info(f"Evicted {len(stale)} entries from {self.path}")
+            self.conn.commit()
+
+    def log_stats(self) -> None:
+        logger.info(f"Response cache {self.path}: {self.hits} hits, {self.misses} misses")
+
+    def close(self) -> None:
+        self.log_stats()
+        with self.lock:
+            self.conn.close()
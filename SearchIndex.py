@@ -0,0 +1,188 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from CorpusStore import CorpusStore, CORPUS_FILE, chapter_code, parse_chapter_code
+from TransliterationService import default_service as transliteration_service
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FILE = os.path.join("corpus", "search.sqlite")
+
+DEVANAGARI_PATTERN = re.compile(r'[ऀ-ॿ]')
+
+INTERPRETATION_TEXT_FIELDS = ["translation", "vocabulary", "context", "interpretation", "ayurvedic_principles", "conclusion"]
+
+def search_key(text: str) -> str:
+    """Fold Devanagari, IAST or plain ASCII Sanskrit to one searchable form.
+
+    Devanagari is transliterated to IAST, then diacritics are stripped and case folded, so
+    "मात्रा", "mātrā", "Mātrā" and "matra" all become "matra".
+    """
+    if DEVANAGARI_PATTERN.search(text):
+        text = transliteration_service.transliterate(text)
+    decomposed = unicodedata.normalize('NFD', text)
+    return " ".join("".join(c for c in decomposed if not unicodedata.combining(c)).lower().split())
+
+def fts_phrases(words: List[str]) -> str:
+    # Each word is quoted, so FTS5 operators and punctuation in a query are taken literally
+    return " AND ".join('"' + word.replace('"', '""') + '"' for word in words)
+
+class SearchIndex:
+    """Full-text search over the corpus store, in Devanagari, IAST or English.
+
+    Verse text is indexed by its folded search_key in a trigram FTS5 table, so a query
+    matches inside sandhi compounds ("matra" finds मात्राशितीयमध्यायं) and Devanagari and
+    romanized queries find the same verses. English translations and interpretation
+    sections go in a porter-stemmed FTS5 table. Chapters are reindexed when their rows in
+    the corpus store have changed since they were last indexed.
+    """
+
+    def __init__(self, path: str = SEARCH_FILE):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                section INTEGER NOT NULL,
+                chapter INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                label TEXT NOT NULL,
+                sanskrit TEXT,
+                english TEXT
+            );
+            CREATE INDEX IF NOT EXISTS documents_by_chapter ON documents (section, chapter);
+            CREATE VIRTUAL TABLE IF NOT EXISTS sanskrit_index USING fts5(key, tokenize='trigram');
+            CREATE VIRTUAL TABLE IF NOT EXISTS english_index USING fts5(text, tokenize='porter unicode61 remove_diacritics 2');
+            CREATE TABLE IF NOT EXISTS indexed_chapters (
+                section INTEGER NOT NULL,
+                chapter INTEGER NOT NULL,
+                corpus_updated TEXT,
+                PRIMARY KEY (section, chapter)
+            );
+        """)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def index_chapter(self, store: CorpusStore, section: int, chapter: int) -> int:
+        """Replace a chapter's documents with its current verses and interpretations; returns the document count."""
+        documents = []
+        for verse in store.verses(section, chapter):
+            iast = verse['transliteration'] or transliteration_service.transliterate(verse['sanskrit'])
+            documents.append(("verse", verse['position'], str(verse['verse_number']), verse['sanskrit'],
+                              verse['translation'] or "", search_key(iast)))
+        for position, result in enumerate(store.interpretations(section, chapter)):
+            if result['translation'] == "Error occurred":
+                continue
+            english = "\n\n".join(result[field] or "" for field in INTERPRETATION_TEXT_FIELDS)
+            documents.append(("interpretation", position, result['verses'], None, english, None))
+        corpus_updated = store.chapter_updated(section, chapter)
+
+        with self.lock, self.conn:
+            stale = [row[0] for row in self.conn.execute(
+                "SELECT id FROM documents WHERE section = ? AND chapter = ?", (section, chapter))]
+            self.conn.executemany("DELETE FROM sanskrit_index WHERE rowid = ?", [(i,) for i in stale])
+            self.conn.executemany("DELETE FROM english_index WHERE rowid = ?", [(i,) for i in stale])
+            self.conn.execute("DELETE FROM documents WHERE section = ? AND chapter = ?", (section, chapter))
+            for kind, position, label, sanskrit, english, key in documents:
+                document_id = self.conn.execute(
+                    "INSERT INTO documents (section, chapter, kind, position, label, sanskrit, english) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (section, chapter, kind, position, label, sanskrit, english)).lastrowid
+                if key:
+                    self.conn.execute("INSERT INTO sanskrit_index (rowid, key) VALUES (?, ?)", (document_id, key))
+                if english:
+                    self.conn.execute("INSERT INTO english_index (rowid, text) VALUES (?, ?)", (document_id, english))
+            self.conn.execute("INSERT OR REPLACE INTO indexed_chapters (section, chapter, corpus_updated) VALUES (?, ?, ?)",
+                              (section, chapter, corpus_updated))
+        logger.info(f"Indexed {chapter_code(section, chapter)}: {len(documents)} documents")
+        return len(documents)
+
+    def refresh(self, store: CorpusStore, chapters: Optional[List[Tuple[int, int]]] = None) -> List[Tuple[int, int]]:
+        """Reindex the chapters whose corpus rows changed since they were indexed; returns those chapters."""
+        with self.lock:
+            indexed = {(row['section'], row['chapter']): row['corpus_updated']
+                       for row in self.conn.execute("SELECT * FROM indexed_chapters")}
+        refreshed = []
+        for section, chapter in chapters or store.chapters():
+            if indexed.get((section, chapter)) != store.chapter_updated(section, chapter):
+                self.index_chapter(store, section, chapter)
+                refreshed.append((section, chapter))
+        return refreshed
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """Best matches for a Devanagari, IAST/ASCII Sanskrit or English query, most relevant first.
+
+        A Devanagari query searches only the Sanskrit; anything else searches the Sanskrit
+        (folded) and the English text, and a verse matching both is returned once.
+        """
+        hits = []
+        with self.lock:
+            # Trigram phrases need at least three characters; shorter words (iti, ca, ha) are skipped
+            key_words = [word for word in search_key(query).split() if len(word) >= 3]
+            if key_words:
+                hits.extend(self.conn.execute("""
+                    SELECT d.*, 'sanskrit' AS field, bm25(sanskrit_index) AS score,
+                           snippet(sanskrit_index, 0, '[', ']', '…', 16) AS snippet
+                    FROM sanskrit_index JOIN documents d ON d.id = sanskrit_index.rowid
+                    WHERE sanskrit_index MATCH ? ORDER BY score LIMIT ?
+                """, (fts_phrases(key_words), limit)).fetchall())
+            words = re.findall(r'\w+', query)
+            if words and not DEVANAGARI_PATTERN.search(query):
+                hits.extend(self.conn.execute("""
+                    SELECT d.*, 'english' AS field, bm25(english_index) AS score,
+                           snippet(english_index, 0, '[', ']', '…', 12) AS snippet
+                    FROM english_index JOIN documents d ON d.id = english_index.rowid
+                    WHERE english_index MATCH ? ORDER BY score LIMIT ?
+                """, (fts_phrases(words), limit)).fetchall())
+
+        results, seen = [], set()
+        for row in sorted(hits, key=lambda row: row['score']):
+            if row['id'] in seen:
+                continue
+            seen.add(row['id'])
+            results.append({"chapter": chapter_code(row['section'], row['chapter']), "kind": row['kind'],
+                            "position": row['position'], "label": row['label'], "field": row['field'],
+                            "sanskrit": row['sanskrit'], "snippet": row['snippet']})
+        return results[:limit]
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Search the corpus in Devanagari, IAST or English")
+    parser.add_argument("query", nargs='?', help="Search terms, e.g. मात्रा, mātrā, matra or 'digestion'")
+    parser.add_argument("--limit", type=int, default=20, help="Maximum results (default: 20)")
+    parser.add_argument("--chapters", nargs='+', help="Only refresh these chapters, e.g. S1C5")
+    parser.add_argument("--corpus", default=CORPUS_FILE, help=f"Corpus database (default: {CORPUS_FILE})")
+    parser.add_argument("--index", default=SEARCH_FILE, help=f"Search index database (default: {SEARCH_FILE})")
+    args = parser.parse_args()
+
+    with CorpusStore(args.corpus) as store, SearchIndex(args.index) as index:
+        chapters = [parse_chapter_code(code) for code in args.chapters] if args.chapters else None
+        refreshed = index.refresh(store, chapters)
+        if refreshed:
+            print(f"Reindexed {', '.join(chapter_code(*c) for c in refreshed)}")
+        if args.query:
+            start = time.perf_counter()
+            results = index.search(args.query, args.limit)
+            print(f"{len(results)} results in {(time.perf_counter() - start) * 1000:.1f} ms")
+            for result in results:
+                print(f"{result['chapter']} {result['kind']} {result['label']} ({result['field']}): {result['snippet']}")
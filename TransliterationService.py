@@ -0,0 +1,51 @@
+import logging
+from functools import lru_cache
+from typing import Dict, Iterable, List, Sequence
+
+from indic_transliteration import sanscript
+from indic_transliteration.sanscript import transliterate
+
+logger = logging.getLogger(__name__)
+
+SCHEMES = {
+    "iast": sanscript.IAST,
+    "itrans": sanscript.ITRANS,
+    "slp1": sanscript.SLP1,
+    "hk": sanscript.HK,
+}
+
+class TransliterationService:
+    """Memoized Devanagari transliteration into one or more romanization schemes.
+
+    Verses are transliterated word by word (space-separated), and each distinct
+    (word, scheme) pair is converted once and kept in an LRU cache. Recurring lines
+    such as chapter headers and "इति ह स्माह भगवानात्रेयः" therefore cost a few dict
+    lookups after the first time, and so do the common words inside other verses.
+    Spaces are word boundaries for every scheme, so the output is identical to
+    transliterating the whole text at once.
+    """
+
+    def __init__(self, cache_size: int = 65536):
+        self._transliterate_word = lru_cache(maxsize=cache_size)(self._convert)
+
+    @staticmethod
+    def _convert(word: str, scheme: str) -> str:
+        return transliterate(word, sanscript.DEVANAGARI, scheme)
+
+    def transliterate(self, text: str, scheme: str = sanscript.IAST) -> str:
+        return " ".join(self._transliterate_word(word, scheme) for word in text.split(" "))
+
+    def transliterate_many(self, texts: Iterable[str], schemes: Sequence[str] = (sanscript.IAST,)) -> List[Dict[str, str]]:
+        """Transliterate a whole chapter in one call, into every scheme in a single pass over each text."""
+        results = []
+        for text in texts:
+            words = text.split(" ")
+            results.append({scheme: " ".join(self._transliterate_word(word, scheme) for word in words)
+                            for scheme in schemes})
+        logger.debug(f"Transliterated {len(results)} texts into {', '.join(schemes)}; cache: {self.cache_info()}")
+        return results
+
+    def cache_info(self):
+        return self._transliterate_word.cache_info()
+
+default_service = TransliterationService()
@@ -0,0 +1,185 @@
+import re
+import struct
+import hashlib
+import logging
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Minimum difflib ratio between two normalized verses for them to count as the same verse.
+# OCR variants of a formula ("इति ह स्माह" / "इतिह माह") score about 0.95, while colophons that
+# differ only in the chapter name score 0.86 or less and must keep their own translations.
+DEDUP_SIMILARITY = 0.9
+# Shorter verses are only matched exactly: a few characters of difference would be a different word
+MIN_NEAR_DUPLICATE_CHARS = 12
+# A near match may differ only by OCR slips: each run of differing letters (runs fewer than
+# SLIP_GAP_LETTERS apart count as one) at most MAX_SLIP_LETTERS long on either side. A dropped
+# "स्" passes; "पित्त" for "वात" is a different word, and the verse keeps its own translation.
+MAX_SLIP_LETTERS = 2
+SLIP_GAP_LETTERS = 3
+# Verse groups are only matched exactly (after normalization): two groups of several verses can be
+# 90% alike and still differ in a verse their interpretations must cover
+GROUP_SIMILARITY = 1.0
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+
+NON_LETTER_PATTERN = re.compile(r'[^ऀ-ॣॱ-ॿ]')
+
+def normalize_verse(text: str) -> str:
+    """The letters of a verse only: NFC Devanagari without spaces, dandas, digits, punctuation or zero-width joiners."""
+    return NON_LETTER_PATTERN.sub('', unicodedata.normalize('NFC', text or ''))
+
+def minhash(normalized: str) -> Tuple[int, ...]:
+    """The MinHash signature of a text's character shingles.
+
+    One SHAKE-128 digest per shingle yields a 32-bit hash for every permutation at once, and the
+    signature is the column-wise minimum, so the work per shingle happens in C rather than in a
+    Python loop over the permutations.
+    """
+    shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(max(len(normalized) - SHINGLE_SIZE + 1, 1))}
+    row_format = f'<{NUM_PERMUTATIONS}I'
+    rows = [struct.unpack(row_format, hashlib.shake_128(shingle.encode('utf-8')).digest(4 * NUM_PERMUTATIONS))
+            for shingle in shingles]
+    return tuple(map(min, zip(*rows)))
+
+@lru_cache(maxsize=8192)
+def lsh_bands(normalized: str) -> Tuple[Tuple[int, Tuple[int, ...]], ...]:
+    signature = minhash(normalized)
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    return tuple((band, signature[band * rows:(band + 1) * rows]) for band in range(LSH_BANDS))
+
+def ocr_slips_only(matcher: SequenceMatcher) -> bool:
+    """Whether the two texts compared by matcher differ only in short runs of letters, as OCR slips do."""
+    runs = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        if runs and i1 - runs[-1][1] < SLIP_GAP_LETTERS and j1 - runs[-1][3] < SLIP_GAP_LETTERS:
+            runs[-1] = (runs[-1][0], i2, runs[-1][2], j2)
+        else:
+            runs.append((i1, i2, j1, j2))
+    return all(max(i2 - i1, j2 - j1) <= MAX_SLIP_LETTERS for i1, i2, j1, j2 in runs)
+
+class NearDuplicateIndex:
+    """Identical and near-identical verses seen so far, each with a value such as its translation.
+
+    A verse is found by the hash of its normalized text, or else through MinHash locality-sensitive
+    hashing: its signature is cut into LSH_BANDS bands and every verse sharing a band is a
+    candidate, confirmed by comparing the normalized texts (similar enough, and differing only by
+    OCR slips). Only candidates are compared, so a
+    lookup stays cheap however many chapters the index holds. With similarity=1.0 only the hash
+    is used. Safe to share between threads.
+    """
+
+    def __init__(self, similarity: float = DEDUP_SIMILARITY):
+        self.similarity = similarity
+        self.exact_only = similarity >= 1.0
+        self.lock = threading.Lock()
+        self.exact: Dict[str, Any] = {}
+        self.entries: List[Tuple[str, Any]] = []
+        self.buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.exact)
+
+    def lookup(self, text: str) -> Optional[Any]:
+        """The value of an identical or near-identical verse, or None."""
+        normalized = normalize_verse(text)
+        if not normalized:
+            return None
+        key = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        with self.lock:
+            if key in self.exact:
+                return self.exact[key]
+        if self.exact_only or len(normalized) < MIN_NEAR_DUPLICATE_CHARS:
+            return None
+
+        bands = lsh_bands(normalized)
+        with self.lock:
+            candidates = {i for band in bands for i in self.buckets.get(band, ())}
+            entries = [self.entries[i] for i in sorted(candidates)]
+        best, best_ratio = None, self.similarity
+        for other, value in entries:
+            matcher = SequenceMatcher(None, normalized, other, autojunk=False)
+            # quick_ratio is an upper bound on ratio, so most candidates are rejected without the full comparison
+            if matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio and ocr_slips_only(matcher):
+                best, best_ratio = value, ratio
+        return best
+
+    def add(self, text: str, value: Any) -> None:
+        normalized = normalize_verse(text)
+        if not normalized:
+            return
+        key = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        with self.lock:
+            if key in self.exact:
+                return
+        bands = lsh_bands(normalized) if not self.exact_only and len(normalized) >= MIN_NEAR_DUPLICATE_CHARS else ()
+        with self.lock:
+            if key in self.exact:
+                return
+            self.exact[key] = value
+            if bands:
+                self.entries.append((normalized, value))
+                for band in bands:
+                    self.buckets.setdefault(band, []).append(len(self.entries) - 1)
+
+def cluster_verses(texts: List[str], known: Optional[NearDuplicateIndex] = None,
+                   similarity: float = DEDUP_SIMILARITY) -> Tuple[Dict[int, Any], Dict[int, List[int]]]:
+    """Split texts into those answered by a near-duplicate in `known` and clusters to process once.
+
+    Returns ({index: known value}, {representative index: member indices, representative first}).
+    Every member is a near-duplicate of its cluster's representative, the first of them in texts.
+    Texts with no Devanagari letters (OCR debris such as a lone "।") are never clustered.
+    """
+    reused, clusters = {}, {}
+    local = NearDuplicateIndex(similarity)
+    for i, text in enumerate(texts):
+        value = known.lookup(text) if known is not None else None
+        if value is not None:
+            reused[i] = value
+            continue
+        representative = local.lookup(text)
+        if representative is not None:
+            clusters[representative].append(i)
+            continue
+        clusters[i] = [i]
+        local.add(text, i)
+    return reused, clusters
+
+def verse_reference(section: int, chapter: int, verse_number: int) -> str:
+    """How a verse is cited as the source of a reused translation, e.g. "S1C3 verse 12"."""
+    return f"S{section}C{chapter} verse {verse_number}"
+
+def translation_index(store) -> NearDuplicateIndex:
+    """Every translated verse in the corpus store, with {"translation", "source"}: the verse it was first made for."""
+    index = NearDuplicateIndex()
+    for verse in store.verses():
+        if verse['translation']:
+            source = verse.get('translation_source') or verse_reference(verse['section'], verse['chapter'], verse['verse_number'])
+            index.add(verse['sanskrit'], {"translation": verse['translation'], "source": source})
+    logger.info(f"Translation duplicate index holds {len(index)} distinct verses")
+    return index
+
+def interpretation_index(store, generation: str) -> NearDuplicateIndex:
+    """Every verse group in the corpus store interpreted under `generation` (model and prompt), with its interpretation.
+
+    Groups are matched exactly; interpretations from another model or prompt, or of unknown
+    origin, are never reused.
+    """
+    index = NearDuplicateIndex(GROUP_SIMILARITY)
+    for section, chapter in store.chapters():
+        for result in store.interpretations(section, chapter, generation):
+            if result['translation'] != "Error occurred":
+                index.add(result['sanskrit'], result)
+    logger.info(f"Interpretation duplicate index holds {len(index)} distinct verse groups")
+    return index
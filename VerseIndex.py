@@ -0,0 +1,86 @@
+import logging
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+def parse_group(group: str) -> Tuple[int, int]:
+    """"12-14" -> (12, 14), "7" -> (7, 7); raises ValueError for anything else."""
+    if '-' in group:
+        start, end = map(int, group.split('-'))
+        return start, end
+    return int(group), int(group)
+
+class VerseIndex:
+    """Range lookups over a chapter's (or the whole book's) verses by verse number.
+
+    Verse numbers are kept in a sorted array next to the verses' original positions, so
+    a group like "12-14" is two bisects plus its k matches instead of a scan of every
+    verse. Matches come back in their original order, exactly as the linear filter
+    returned them, even when OCR produced duplicate or out-of-order numbers.
+    """
+
+    def __init__(self, verses: List[Dict[str, Any]]):
+        self.verses = verses
+        order = sorted(range(len(verses)), key=lambda i: verses[i]['verse_number'])
+        self.numbers = [verses[i]['verse_number'] for i in order]
+        self.positions = order
+
+    def range(self, start: int, end: int) -> List[Dict[str, Any]]:
+        low = bisect_left(self.numbers, start)
+        high = bisect_right(self.numbers, end)
+        return [self.verses[i] for i in sorted(self.positions[low:high])]
+
+    def lookup(self, group: str) -> List[Dict[str, Any]]:
+        return self.range(*parse_group(group))
+
+    def report(self, verse_groups: List[str]) -> Dict[str, List]:
+        """Gaps and duplicates in the verse numbering, verses no group covers, groups that match no verse,
+        and verses numbered lower than the one before them."""
+        if not self.numbers:
+            return {"gaps": [], "duplicates": [], "uncovered": [], "empty_groups": list(verse_groups), "out_of_order": []}
+
+        distinct = sorted(set(self.numbers))
+        present = set(distinct)
+        gaps = [n for n in range(distinct[0], distinct[-1] + 1) if n not in present]
+        duplicates = sorted({n for n, following in zip(self.numbers, self.numbers[1:]) if n == following})
+        out_of_order = [verse['verse_number'] for previous, verse in zip(self.verses, self.verses[1:])
+                        if verse['verse_number'] < previous['verse_number']]
+
+        # Merge the group ranges, then check each verse number against them
+        ranges = []
+        empty_groups = []
+        for group in verse_groups:
+            try:
+                start, end = parse_group(group)
+            except ValueError:
+                empty_groups.append(group)
+                continue
+            if bisect_right(self.numbers, end) == bisect_left(self.numbers, start):
+                empty_groups.append(group)
+            ranges.append((start, end))
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        starts = [start for start, _ in merged]
+        uncovered = []
+        for n in distinct:
+            i = bisect_right(starts, n) - 1
+            if i < 0 or n > merged[i][1]:
+                uncovered.append(n)
+
+        return {"gaps": gaps, "duplicates": duplicates, "uncovered": uncovered,
+                "empty_groups": empty_groups, "out_of_order": out_of_order}
+
+    def log_report(self, verse_groups: List[str], label: str = "") -> Dict[str, List]:
+        report = self.report(verse_groups)
+        problems = {name: values for name, values in report.items() if values}
+        if problems:
+            logger.warning(f"Verse numbering problems{f' in {label}' if label else ''}: "
+                           + "; ".join(f"{name.replace('_', ' ')} {values}" for name, values in problems.items()))
+        else:
+            logger.info(f"{len(self.numbers)} verses{f' in {label}' if label else ''} are numbered consecutively and all covered by groups")
+        return report
@@ -1,68 +1,301 @@
 import json
+import re
 import requests
 import logging
 import time
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from requests.exceptions import RequestException
+from ResponseCache import ResponseCache
+from PipelineJournal import PipelineJournal, content_hash
+from PipelineMetrics import metrics
+from VerseIndex import VerseIndex
+from CorpusStore import CorpusStore
+from ReportWriter import write_interpretation_text
+from VerseDedup import GROUP_SIMILARITY, cluster_verses, interpretation_index
+
+class RateLimiter:
+    """Token-bucket limiter for requests/minute and tokens/minute, shared across worker threads."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_allowance = float(requests_per_minute)
+        self.token_allowance = float(tokens_per_minute)
+        self.last_refill = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        self.request_allowance = min(self.requests_per_minute, self.request_allowance + elapsed * self.requests_per_minute / 60)
+        self.token_allowance = min(self.tokens_per_minute, self.token_allowance + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens):
+        # A single request larger than the bucket would otherwise wait forever
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self.lock:
+                self._refill()
+                wait = self.paused_until - time.monotonic()
+                if wait <= 0:
+                    if self.request_allowance >= 1 and self.token_allowance >= tokens:
+                        self.request_allowance -= 1
+                        self.token_allowance -= tokens
+                        return
+                    request_wait = (1 - self.request_allowance) * 60 / self.requests_per_minute
+                    token_wait = (tokens - self.token_allowance) * 60 / self.tokens_per_minute
+                    wait = max(request_wait, token_wait, 0.05)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop handing out capacity for `seconds`, e.g. after a 429 with retry-after."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.request_allowance = 0
+            self.token_allowance = 0
+
+def estimate_tokens(text):
+    # Rough input-token estimate; Devanagari tokenizes denser than English so err on the high side
+    return len(text) // 3
+
+def get_retry_after(response, default):
+    try:
+        return float(response.headers.get('retry-after', default))
+    except (TypeError, ValueError):
+        return default
 
-def call_claude_api(prompt, retries=3, delay=5):
-    api_url = "https://api.anthropic.com/v1/messages"
+def api_headers():
     api_key = ""  
 
-    headers = {
+    return {
         "Content-Type": "application/json",
         "X-API-Key": api_key,
         "anthropic-version": "2023-06-01"
     }
 
-    data = {
-        "model": "claude-3-5-sonnet-20240620",
+def message_params(prompt):
+    return {
+        "model": MODEL,
+        "system": [{"type": "text", "text": INTERPRETATION_INSTRUCTIONS, "cache_control": {"type": "ephemeral"}}],
         "messages": [{"role": "user", "content": prompt}],
-        "max_tokens": 4000
+        "max_tokens": MAX_TOKENS
     }
 
+def response_cache_key(params):
+    return ResponseCache.make_key(model=params["model"], system=params["system"][0]["text"],
+                                  prompt=params["messages"][0]["content"], max_tokens=params["max_tokens"])
+
+def record_usage(usage, batch=False):
+    # Batch tokens are counted separately because they are billed at a discount.
+    # input_tokens excludes the prompt-cache reads and writes, which are billed at their own rates.
+    prefix = "llm_batch" if batch else "llm"
+    metrics.increment(f"{prefix}_input_tokens", usage.get('input_tokens', 0))
+    metrics.increment(f"{prefix}_output_tokens", usage.get('output_tokens', 0))
+    metrics.increment(f"{prefix}_prompt_cache_write_tokens", usage.get('cache_creation_input_tokens') or 0)
+    metrics.increment(f"{prefix}_prompt_cache_read_tokens", usage.get('cache_read_input_tokens') or 0)
+
+SECTIONS = ["Translation", "Vocabulary and Key Terms", "Context and Significance", "Detailed Interpretation",
+            "Ayurvedic Principles and Applications", "Conclusion"]
+
+# A section header on a line of its own, in any of the markdown variants Claude produces:
+# "1. Translation:", "**1. Translation:**", "## 2. Vocabulary & Key Terms", "1) **Conclusion**" ...
+SECTION_HEADER_PATTERN = re.compile(
+    r'^\s*(?:#{1,6}\s*)?(?:[*_]{1,2}\s*)?(?:\d+\s*[.)]\s*)?(?:[*_]{1,2}\s*)?('
+    + '|'.join(r'\s+'.join(re.escape(word) if word != "and" else r'(?:and|&)' for word in name.lower().split())
+               for name in SECTIONS)
+    + r')\s*(?:[*_]{1,2}\s*)?:?\s*(?:[*_]{1,2})?\s*$', re.IGNORECASE)
+# Markdown that starts something new after the conclusion: a heading or a horizontal rule
+SECTION_END_PATTERN = re.compile(r'^\s*(?:#{1,6}\s|(?:-\s*){3,}$|(?:\*\s*){3,}$|(?:_\s*){3,}$)')
+
+def canonical_section(header):
+    words = re.sub(r'\s*&\s*', ' and ', header.lower()).split()
+    return next(name for name in SECTIONS if name.lower().split() == words)
+
+class SectionParser:
+    """Split a response into its six sections as text arrives.
+
+    feed() takes chunks of any size and parses each completed line; `complete` becomes true
+    once the Conclusion has content and is followed by another header, a heading or a
+    horizontal rule, i.e. everything after it is extra commentary that need not be generated.
+    """
+
+    def __init__(self):
+        self.sections = {}
+        self.current_section = ""
+        self.partial_line = ""
+        self.complete = False
+
+    def feed(self, text):
+        lines = (self.partial_line + text).split('\n')
+        self.partial_line = lines.pop()
+        for line in lines:
+            self._parse_line(line)
+        return self.complete
+
+    def _parse_line(self, line):
+        if self.complete:
+            return
+        header = SECTION_HEADER_PATTERN.match(line)
+        if self.current_section == "Conclusion" and self.sections["Conclusion"].strip() \
+                and (header or SECTION_END_PATTERN.match(line)):
+            self.complete = True
+            logger.debug("Conclusion complete")
+            return
+        if header:
+            if self.current_section:
+                logger.debug(f"Section {self.current_section} complete")
+            self.current_section = canonical_section(header.group(1))
+            self.sections[self.current_section] = ""
+        elif self.current_section:
+            self.sections[self.current_section] += line + "\n"
+
+    def close(self):
+        """Parse the trailing partial line and return {section name: text}."""
+        if self.partial_line:
+            self._parse_line(self.partial_line)
+            self.partial_line = ""
+        return self.sections
+
+def read_stream(response, stop_early=True):
+    """Read a streamed (SSE) Messages response into the same shape as a non-streamed one.
+
+    The text is parsed into sections as it arrives, and the connection is closed as soon as
+    the Conclusion is complete, so trailing commentary is neither waited for nor generated.
+    stop_early=False reads to the end, for responses holding several analyses.
+    """
+    start = time.perf_counter()
+    parser = SectionParser()
+    parts = []
+    usage = {}
+    event = None
+    stopped = False
+    # Event streams are always UTF-8; without a charset in the header requests would decode them as
+    # Latin-1, and the 0x85 byte in Devanagari would then read as a line break inside an event
+    response.encoding = 'utf-8'
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+                continue
+            if not line.startswith("data:"):
+                continue
+            data = json.loads(line[len("data:"):])
+            if event == "message_start":
+                usage.update(data["message"].get("usage", {}))
+            elif event == "content_block_delta" and data["delta"].get("type") == "text_delta":
+                if not parts:
+                    metrics.observe("llm_time_to_first_token", time.perf_counter() - start)
+                parts.append(data["delta"]["text"])
+                if parser.feed(data["delta"]["text"]) and stop_early:
+                    logger.debug("Stopping the stream early, the conclusion is complete")
+                    metrics.increment("llm_stream_early_stops")
+                    stopped = True
+                    break
+            elif event == "message_delta":
+                usage.update(data.get("usage", {}))
+            elif event == "message_stop":
+                stopped = True
+                break
+            elif event == "error":
+                # e.g. overloaded_error mid-stream; raised as a request failure so the call is retried
+                raise RequestException(f"Stream error: {data.get('error')}")
+    finally:
+        response.close()
+    if not stopped:
+        raise RequestException("Stream ended before message_stop")
+
+    text = "".join(parts)
+    if "output_tokens" not in usage or usage["output_tokens"] <= 1:
+        # An early stop skips the final message_delta, which carries the output token count
+        usage["output_tokens"] = estimate_tokens(text)
+    metrics.observe("llm_stream", time.perf_counter() - start)
+    return {"content": [{"type": "text", "text": text}], "usage": usage}
+
+def call_claude_api(prompt, retries=3, delay=5, rate_limiter=None, cache=None, stream=False, stop_early=True):
+    api_url = f"{API_BASE}/messages"
+    headers = api_headers()
+    data = message_params(prompt)
+
+    if cache:
+        cache_key = response_cache_key(data)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Returning cached API response")
+            metrics.increment("llm_cache_hits")
+            return json.loads(cached)
+        metrics.increment("llm_cache_misses")
+
     for attempt in range(retries):
         try:
+            if rate_limiter:
+                rate_limiter.acquire(estimate_tokens(prompt))
             logger.debug(f"Sending API request, attempt {attempt + 1}")
-            response = requests.post(api_url, headers=headers, json=data)
+            with metrics.timer("llm_request"):
+                if stream:
+                    response = requests.post(api_url, headers=headers, json={**data, "stream": True}, stream=True)
+                else:
+                    response = requests.post(api_url, headers=headers, json=data)
+            if response.status_code in (429, 529) and attempt < retries - 1:
+                metrics.increment("llm_rate_limited")
+                # Rate limited or overloaded: honour retry-after, otherwise back off exponentially
+                wait = get_retry_after(response, delay * 2 ** attempt)
+                logger.warning(f"API returned {response.status_code}, backing off for {wait} seconds")
+                if rate_limiter:
+                    rate_limiter.pause(wait)
+                else:
+                    time.sleep(wait)
+                continue
             response.raise_for_status()
             logger.debug("API request successful")
-            content = response.json()['content']
+            response_json = read_stream(response, stop_early) if stream else response.json()
+            content = response_json['content']
             logger.debug(f"API response: {content}")
+            record_usage(response_json.get('usage', {}))
+            if cache:
+                cache.set(cache_key, json.dumps(content, ensure_ascii=False).encode('utf-8'))
             return content
         except RequestException as e:
             logger.error(f"API request failed: {e}")
             if attempt < retries - 1:
+                metrics.increment("llm_retries")
                 logger.info(f"Retrying in {delay} seconds...")
                 time.sleep(delay)
             else:
                 logger.error("Max retries reached. Giving up.")
                 raise
 
-def process_verses(json_data):
-    verses = json_data['sanskrit_verses']
-    verse_groups = json_data['verse_groups']
-
-    results = []
+def build_verse_index(json_data):
+    """Index the chapter's verses once and log numbering gaps, duplicates and verses no group covers."""
+    index = VerseIndex(json_data['sanskrit_verses'])
+    report = index.log_report(json_data['verse_groups'], f"section {json_data.get('section')} chapter {json_data.get('chapter')}")
+    for name, values in report.items():
+        metrics.increment(f"verse_{name}", len(values))
+    return index
 
-    for i, group in enumerate(verse_groups):
-        logger.info(f"Processing verse group {i+1}/{len(verse_groups)}: {group}")
-
-        try:
-            if '-' in group:
-                start, end = map(int, group.split('-'))
-                group_verses = [v for v in verses if start <= v['verse_number'] <= end]
-            else:
-                group_verses = [v for v in verses if v['verse_number'] == int(group)]
+def group_sanskrit(group, index):
+    group_verses = index.lookup(group)
 
-            if not group_verses:
-                raise ValueError(f"No verses found for group {group}")
+    if not group_verses:
+        raise ValueError(f"No verses found for group {group}")
 
-            sanskrit_text = "\n".join([verse['sanskrit'] for verse in group_verses])
+    return "\n".join([verse['sanskrit'] for verse in group_verses])
 
-            prompt = f"""As an expert in Sanskrit, Ayurvedic literature, and academic writing, please provide a comprehensive and consistent analysis of the following Sanskrit verse(s) from the Charaka Samhita:
+def group_hash(group, index):
+    # Journaled results are only reused under the same model and prompt
+    try:
+        return content_hash(generation_key(), group, [v['sanskrit'] for v in index.lookup(group)])
+    except ValueError:
+        return content_hash(generation_key(), group)
 
-{sanskrit_text}
+# Fixed instructions sent as the system prompt. They are identical for every verse group, so they are
+# marked for prompt caching and later requests read them from the cache instead of paying for them again.
+# The API only caches a prefix of at least MIN_CACHEABLE_TOKENS, so besides the six sections they spell
+# out the output format and the renderings of recurring terms, which keeps them well above it.
+INTERPRETATION_INSTRUCTIONS = """As an expert in Sanskrit, Ayurvedic literature, and academic writing, you will be given Sanskrit verse(s) from the Charaka Samhita. Please provide a comprehensive and consistent analysis of them.
 
 Please adhere to the following guidelines to ensure consistency and suitability for compilation into a book:
 
@@ -95,123 +328,634 @@ Throughout your analysis:
 - Ensure each section flows logically into the next, creating a cohesive narrative.
 - Aim for clarity and accessibility while maintaining depth of analysis.
 
+Formatting for compilation:
+- Begin each of the six sections with its number and title on a line of its own, exactly as written above (for example "1. Translation:"). Do not add other headings, horizontal rules or a title for the whole analysis, since each section is extracted automatically by its heading.
+- Write the sections in the order given. Apart from any marker lines the request asks for, write nothing outside the six sections: no introduction before the translation and no closing remarks after the conclusion.
+- Quote the Sanskrit text itself in Devanagari. In the English text, write Sanskrit terms in IAST transliteration with diacritics (for example "vāta", "agni", "doṣa"), adding the Devanagari in parentheses where a citation is useful.
+- Refer to verses by the numbers given in the passage (for example "verse 12"); do not renumber them.
+- Refer to other classical texts briefly by name and section (for example "Suśruta Saṃhitā, Sūtrasthāna") rather than quoting them at length.
+
+Consistent renderings of recurring terms (use the same rendering each time a term occurs):
+- doṣa: the three functional principles, vāta, pitta and kapha. Keep the Sanskrit names rather than translating them as "wind", "bile" and "phlegm".
+- dhātu: the seven tissues, rasa (plasma), rakta (blood), māṃsa (muscle), medas (fat), asthi (bone), majjā (marrow) and śukra (reproductive tissue).
+- mala: the waste products, chiefly purīṣa (faeces), mūtra (urine) and sveda (sweat).
+- agni: the digestive and metabolic fire; āma: undigested or improperly metabolised matter.
+- srotas: the channels of transport in the body; ojas: the essence of the tissues that sustains strength and immunity.
+- rasa (of a substance): taste, one of six, madhura (sweet), amla (sour), lavaṇa (salty), kaṭu (pungent), tikta (bitter) and kaṣāya (astringent); guṇa: quality; vīrya: potency; vipāka: post-digestive effect; prabhāva: specific action.
+- prakṛti: the individual constitution; vikṛti: the disordered state.
+- śodhana: purification therapy, including the five procedures of pañcakarma, vamana (therapeutic emesis), virecana (purgation), basti (medicated enema), nasya (nasal administration) and raktamokṣaṇa (bloodletting); śamana: palliative therapy.
+- snehana: oleation; svedana: sudation; pradeha and lepa: medicated pastes; kaṣāya (as a preparation): decoction; cūrṇa: powder.
+- dinacaryā: the daily regimen; ṛtucaryā: the seasonal regimen; pathya: wholesome diet and conduct.
+- Ātreya (Punarvasu Ātreya, the teacher), Agniveśa (the disciple who composed the treatise), Caraka (its redactor) and Dṛḍhabala (who completed it): use these spellings throughout.
+
+Where the verse(s) name plants or formulations, give the Sanskrit name first, and the botanical name in italics only when the identification is well established; say so when it is disputed.
+
 Your response should be detailed yet clear, suitable for readers with varying levels of familiarity with Ayurveda or Sanskrit literature, while still providing valuable insights for more knowledgeable readers.
 """
 
-            logger.debug(f"Sending prompt for verse group {group}")
-            response = call_claude_api(prompt)
-            logger.debug(f"Received response for verse group {group}")
+def instructions_cacheable():
+    """Whether the instructions reach the shortest prefix the API caches; shorter ones are sent in full every time."""
+    return estimate_tokens(INTERPRETATION_INSTRUCTIONS) >= MIN_CACHEABLE_TOKENS
+
+def build_prompt(sanskrit_text):
+    return f"""Please analyse the following Sanskrit verse(s) from the Charaka Samhita:
+
+{sanskrit_text}
+"""
+
+def generation_key():
+    """Identifies what produces an interpretation: the response-cache key inputs other than the verse text.
+
+    Stored with each interpretation in the corpus store, so a later run only reuses analyses
+    made with the same model, instructions, prompt and max_tokens.
+    """
+    return content_hash(MODEL, INTERPRETATION_INSTRUCTIONS, build_prompt(""), MAX_TOKENS)
+
+def parse_response(group, sanskrit_text, response):
+    # Extract the text from the response
+    if isinstance(response, list) and len(response) > 0 and 'text' in response[0]:
+        response_text = response[0]['text']
+    else:
+        logger.warning(f"Unexpected response format for verse group {group}")
+        response_text = "Response not in expected format"
+
+    # Split the response into sections
+    parser = SectionParser()
+    parser.feed(response_text)
+    return sections_result(group, sanskrit_text, parser.close())
+
+def sections_result(group, sanskrit_text, sections):
+    return {
+        "verses": group,
+        "sanskrit": sanskrit_text,
+        "translation": sections.get("Translation", "Translation not available").strip(),
+        "vocabulary": sections.get("Vocabulary and Key Terms", "Vocabulary not available").strip(),
+        "context": sections.get("Context and Significance", "Context not available").strip(),
+        "interpretation": sections.get("Detailed Interpretation", "Interpretation not available").strip(),
+        "ayurvedic_principles": sections.get("Ayurvedic Principles and Applications", "Ayurvedic principles and applications not available").strip(),
+        "conclusion": sections.get("Conclusion", "Conclusion not available").strip()
+    }
+
+def error_result(group, e):
+    return {
+        "verses": group,
+        "sanskrit": f"Error occurred: {str(e)}",
+        "translation": "Error occurred",
+        "vocabulary": "Error occurred",
+        "context": "Error occurred",
+        "interpretation": "Error occurred",
+        "ayurvedic_principles": "Error occurred",
+        "conclusion": "Error occurred"
+    }
+
+def process_verse_group(group, index, rate_limiter=None, cache=None, stream=False):
+    try:
+        sanskrit_text = group_sanskrit(group, index)
+        prompt = build_prompt(sanskrit_text)
 
-            # Extract the text from the response
-            if isinstance(response, list) and len(response) > 0 and 'text' in response[0]:
-                response_text = response[0]['text']
+        logger.debug(f"Sending prompt for verse group {group}")
+        response = call_claude_api(prompt, rate_limiter=rate_limiter, cache=cache, stream=stream)
+        logger.debug(f"Received response for verse group {group}")
+
+        return parse_response(group, sanskrit_text, response)
+
+    except Exception as e:
+        logger.error(f"Error processing verse group {group}: {e}", exc_info=True)
+        return error_result(group, e)
+
+# Packed requests: several small groups in one prompt, each analysis introduced by its marker line
+PACK_MARKER = "=== GROUP {} ==="
+PACK_MARKER_PATTERN = re.compile(r'^\s*(?:#{1,6}\s*)?(?:[*_]{1,2}\s*)?=+\s*GROUP\s+(\d+)\s*=+\s*(?:[*_]{1,2})?\s*$',
+                                 re.IGNORECASE | re.MULTILINE)
+
+def pack_groups(indices, texts, max_groups=None, max_input_tokens=None):
+    """Split group positions into requests: runs of adjacent small groups share one, larger groups go alone.
+
+    A run ends after max_groups groups, whose analyses have to fit in MAX_TOKENS together, or
+    before its verses would exceed max_input_tokens. Groups without text are never packed.
+    """
+    max_groups = max_groups or PACK_MAX_GROUPS
+    max_input_tokens = max_input_tokens or PACK_MAX_INPUT_TOKENS
+    packs, current, current_tokens = [], [], 0
+    for i in indices:
+        tokens = estimate_tokens(texts[i])
+        if not texts[i] or tokens > PACK_SMALL_GROUP_TOKENS:
+            if current:
+                packs.append(current)
+                current, current_tokens = [], 0
+            packs.append([i])
+            continue
+        if current and (len(current) >= max_groups or current_tokens + tokens > max_input_tokens):
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+def build_packed_prompt(sanskrit_texts):
+    passages = "\n\n".join(f"{PACK_MARKER.format(n)}\n{text}" for n, text in enumerate(sanskrit_texts, 1))
+    return f"""Please analyse each of the following {len(sanskrit_texts)} passages of Sanskrit verse(s) from the Charaka Samhita separately.
+Begin the analysis of each passage with its marker line exactly as given (for example "{PACK_MARKER.format(1)}"), followed by all six sections for that passage alone. Write nothing before the first marker.
+
+{passages}
+"""
+
+def split_packed_response(text, count):
+    """The six sections of each analysis in a packed response, or None for any that is missing or incomplete."""
+    parts = {}
+    markers = list(PACK_MARKER_PATTERN.finditer(text))
+    for marker, following in zip(markers, markers[1:] + [None]):
+        number = int(marker.group(1))
+        # A repeated marker leaves it unclear which analysis belongs to the passage
+        parts[number] = None if number in parts else text[marker.end():following.start() if following else len(text)]
+
+    sections = []
+    for number in range(1, count + 1):
+        if parts.get(number) is None:
+            sections.append(None)
+            continue
+        parser = SectionParser()
+        parser.feed(parts[number])
+        found = parser.close()
+        sections.append(found if all(found.get(name, "").strip() for name in SECTIONS) else None)
+    return sections
+
+def process_verse_pack(groups, sanskrit_texts, rate_limiter=None, cache=None, stream=False):
+    """Interpret several groups in one request; returns a result per group, None where its analysis could not be parsed."""
+    try:
+        prompt = build_packed_prompt(sanskrit_texts)
+        logger.debug(f"Sending packed prompt for verse groups {groups}")
+        # The stream runs to the end: the first conclusion is only one group's
+        response = call_claude_api(prompt, rate_limiter=rate_limiter, cache=cache, stream=stream, stop_early=False)
+        metrics.increment("llm_packed_requests")
+        metrics.increment("llm_packed_groups", len(groups))
+        if isinstance(response, list) and len(response) > 0 and 'text' in response[0]:
+            sections = split_packed_response(response[0]['text'], len(groups))
+        else:
+            logger.warning(f"Unexpected response format for packed verse groups {groups}")
+            sections = [None] * len(groups)
+        return [sections_result(group, text, found) if found is not None else None
+                for group, text, found in zip(groups, sanskrit_texts, sections)]
+
+    except Exception as e:
+        logger.error(f"Error processing packed verse groups {groups}: {e}", exc_info=True)
+        return [error_result(group, e) for group in groups]
+
+def submit_message_batch(batch_requests, retries=3, delay=5):
+    for attempt in range(retries):
+        try:
+            response = requests.post(f"{API_BASE}/messages/batches", headers=api_headers(), json={"requests": batch_requests})
+            response.raise_for_status()
+            return response.json()
+        except RequestException as e:
+            logger.error(f"Batch submission failed: {e}")
+            if attempt < retries - 1:
+                time.sleep(delay * 2 ** attempt)
             else:
-                logger.warning(f"Unexpected response format for verse group {group}")
-                response_text = "Response not in expected format"
-
-            # Split the response into sections
-            sections = {}
-            current_section = ""
-            for line in response_text.split('\n'):
-                if line.strip() in ["1. Translation:", "2. Vocabulary and Key Terms:", "3. Context and Significance:", "4. Detailed Interpretation:", "5. Ayurvedic Principles and Applications:", "6. Conclusion:"]:
-                    current_section = line.strip()[3:-1]  # Remove number and colon
-                    sections[current_section] = ""
-                elif current_section:
-                    sections[current_section] += line + "\n"
-
-            results.append({
-                "verses": group,
-                "sanskrit": sanskrit_text,
-                "translation": sections.get("Translation", "Translation not available").strip(),
-                "vocabulary": sections.get("Vocabulary and Key Terms", "Vocabulary not available").strip(),
-                "context": sections.get("Context and Significance", "Context not available").strip(),
-                "interpretation": sections.get("Detailed Interpretation", "Interpretation not available").strip(),
-                "ayurvedic_principles": sections.get("Ayurvedic Principles and Applications", "Ayurvedic principles and applications not available").strip(),
-                "conclusion": sections.get("Conclusion", "Conclusion not available").strip()
-            })
-
-        except Exception as e:
-            logger.error(f"Error processing verse group {group}: {e}", exc_info=True)
-            results.append({
-                "verses": group,
-                "sanskrit": f"Error occurred: {str(e)}",
-                "translation": "Error occurred",
-                "vocabulary": "Error occurred",
-                "context": "Error occurred",
-                "interpretation": "Error occurred",
-                "ayurvedic_principles": "Error occurred",
-                "conclusion": "Error occurred"
-            })
+                raise
+
+def wait_for_message_batch(batch_id, poll_interval=None, max_poll_interval=None, timeout=None):
+    """Poll a batch until it has ended, backing off from poll_interval up to max_poll_interval."""
+    poll_interval = poll_interval or BATCH_POLL_SECONDS
+    max_poll_interval = max_poll_interval or BATCH_MAX_POLL_SECONDS
+    timeout = timeout or BATCH_TIMEOUT_SECONDS
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            response = requests.get(f"{API_BASE}/messages/batches/{batch_id}", headers=api_headers())
+            response.raise_for_status()
+            batch = response.json()
+            logger.info(f"Batch {batch_id} is {batch['processing_status']}: {batch.get('request_counts')}")
+            if batch['processing_status'] == "ended":
+                return batch
+        except RequestException as e:
+            # The batch keeps running server-side, so a failed poll is just retried
+            logger.warning(f"Polling batch {batch_id} failed: {e}")
+        if time.monotonic() + poll_interval > deadline:
+            raise TimeoutError(f"Batch {batch_id} did not end within {timeout} seconds")
+        time.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, max_poll_interval)
+
+def fetch_batch_results(batch):
+    """Download the JSONL results of an ended batch as {custom_id: result}."""
+    response = requests.get(batch['results_url'], headers=api_headers())
+    response.raise_for_status()
+    results = {}
+    for line in response.text.splitlines():
+        if line.strip():
+            entry = json.loads(line)
+            results[entry['custom_id']] = entry['result']
+    return results
+
+def run_message_batch(prompts, journal=None, **poll_options):
+    """Send {custom_id: prompt} as one Message Batch and return {custom_id: result} once it has ended.
+
+    The batch id is journaled right after submission, so a rerun with the same prompts resumes
+    polling that batch instead of paying for a new one.
+    """
+    batch_requests = [{"custom_id": custom_id, "params": message_params(prompt)} for custom_id, prompt in prompts.items()]
+    batch_hash = content_hash(batch_requests)
+
+    submitted = journal.get("interpretation_batch", "batch", batch_hash) if journal else None
+    if submitted:
+        batch_id = submitted["id"]
+        logger.info(f"Resuming Message Batch {batch_id} with {len(batch_requests)} requests")
+    else:
+        batch_id = submit_message_batch(batch_requests)["id"]
+        logger.info(f"Submitted Message Batch {batch_id} with {len(batch_requests)} requests")
+        metrics.increment("llm_batches_submitted")
+        if journal:
+            journal.record("interpretation_batch", "batch", batch_hash, {"id": batch_id})
+
+    with metrics.timer("llm_batch"):
+        batch = wait_for_message_batch(batch_id, **poll_options)
+    logger.info(f"Batch {batch_id} ended: {batch.get('request_counts')}")
+    return fetch_batch_results(batch)
+
+def process_verses_batch(json_data, cache=None, journal=None, on_result=None, index=None, selected=None, **poll_options):
+    """Interpret every verse group (or the positions in `selected`) through one Message Batch instead of synchronous requests.
+
+    Cached and journaled groups are resolved locally; only the rest go into the batch. Batch
+    results feed the same response parser, cache and journal as the synchronous path.
+    """
+    if index is None:
+        index = build_verse_index(json_data)
+    verse_groups = json_data['verse_groups']
+    results = [None] * len(verse_groups)
+    pending = {}
+
+    def resolve(i, result):
+        results[i] = result
+        if on_result:
+            on_result(i, result)
+
+    for i, group in enumerate(verse_groups):
+        if selected is not None and i not in selected:
+            continue
+        item = f"{i}:{group}"
+        item_hash = group_hash(group, index)
+        if journal:
+            done = journal.get("interpretation", item, item_hash)
+            if done is not None:
+                metrics.increment("interpretation_journal_hits")
+                resolve(i, done)
+                continue
+
+        try:
+            sanskrit_text = group_sanskrit(group, index)
+        except ValueError as e:
+            logger.error(f"Error processing verse group {group}: {e}")
+            resolve(i, error_result(group, e))
+            continue
+
+        prompt = build_prompt(sanskrit_text)
+        if cache:
+            cached = cache.get(response_cache_key(message_params(prompt)))
+            if cached is not None:
+                metrics.increment("llm_cache_hits")
+                result = parse_response(group, sanskrit_text, json.loads(cached))
+                if journal:
+                    journal.record("interpretation", item, item_hash, result)
+                resolve(i, result)
+                continue
+            metrics.increment("llm_cache_misses")
+
+        # custom_id must match ^[a-zA-Z0-9_-]{1,64}$, so groups are identified by position
+        pending[f"group-{i}"] = (i, group, item, item_hash, sanskrit_text, prompt)
+
+    logger.info(f"{len(verse_groups if selected is None else selected) - len(pending)} verse groups resolved locally, "
+                f"{len(pending)} sent as a batch")
+    if not pending:
+        return results
+
+    batch_results = run_message_batch({custom_id: entry[5] for custom_id, entry in pending.items()}, journal, **poll_options)
+    for custom_id, (i, group, item, item_hash, sanskrit_text, prompt) in pending.items():
+        result = batch_results.get(custom_id, {"type": "missing"})
+        if result["type"] != "succeeded":
+            # errored, canceled or expired requests are left out of the journal and retried next run
+            logger.error(f"Batch request for verse group {group} {result['type']}: {result.get('error')}")
+            metrics.increment("llm_batch_failures")
+            resolve(i, error_result(group, RuntimeError(f"batch request {result['type']}")))
+            continue
+
+        message = result["message"]
+        record_usage(message.get("usage", {}), batch=True)
+        if cache:
+            cache.set(response_cache_key(message_params(prompt)), json.dumps(message["content"], ensure_ascii=False).encode('utf-8'))
+        result = parse_response(group, sanskrit_text, message["content"])
+        if journal:
+            journal.record("interpretation", item, item_hash, result)
+        resolve(i, result)
+
+    return results
 
+def shared_result(result, group, sanskrit_text):
+    """A near-duplicate group's interpretation, labelled with this group's verses and text."""
+    return {**result, "verses": group, "sanskrit": sanskrit_text}
+
+def process_verses(json_data, max_workers=1, rate_limiter=None, cache=None, journal=None, backend="messages",
+                   stream=False, on_result=None, dedup_index=None, unique=False, pack=False):
+    """Interpret every verse group, synchronously ("messages") or as one Message Batch ("batch").
+
+    on_result(index, result) is called from the worker threads as each group completes, in
+    completion order; the returned list is in group order.
+
+    Groups with identical verse text (after normalization) are interpreted once and the result is
+    copied to the others, and a group matching one already interpreted in dedup_index reuses that
+    result (new results are added to it). unique=True interprets every group.
+
+    pack=True sends runs of adjacent small groups as one "messages" request (see pack_groups);
+    a group whose analysis is missing from the packed response is sent again on its own.
+    """
+    index = build_verse_index(json_data)
+    verse_groups = json_data['verse_groups']
+    results = [None] * len(verse_groups)
+
+    def resolve(i, result):
+        results[i] = result
+        if on_result:
+            on_result(i, result)
+
+    texts = []
+    for group in verse_groups:
+        try:
+            texts.append(group_sanskrit(group, index))
+        except ValueError:
+            # Reported when the group itself is processed
+            texts.append("")
+    if unique:
+        reused, clusters = {}, {i: [i] for i in range(len(verse_groups))}
+    else:
+        reused, clusters = cluster_verses(texts, dedup_index, GROUP_SIMILARITY)
+    saved = len(verse_groups) - len(clusters)
+    if saved:
+        logger.info(f"Section {json_data.get('section')} chapter {json_data.get('chapter')}: interpreting {len(clusters)} "
+                    f"of {len(verse_groups)} verse groups; {len(reused)} reuse a corpus interpretation, "
+                    f"{saved - len(reused)} share one with a near-duplicate")
+        metrics.increment("interpretation_dedup_reused", len(reused))
+        metrics.increment("interpretation_dedup_shared", saved - len(reused))
+
+    def share(i, result):
+        result = shared_result(result, verse_groups[i], texts[i])
+        if journal:
+            journal.record("interpretation", f"{i}:{verse_groups[i]}", group_hash(verse_groups[i], index), result)
+        resolve(i, result)
+
+    for i, result in reused.items():
+        share(i, result)
+
+    if backend == "batch":
+        process_verses_batch(json_data, cache=cache, journal=journal, on_result=resolve, index=index, selected=set(clusters))
+    else:
+        def journaled(i):
+            if not journal:
+                return False
+            # Groups can repeat in OCR output, so journal items are keyed by position as well
+            done = journal.get("interpretation", f"{i}:{verse_groups[i]}", group_hash(verse_groups[i], index))
+            if done is None:
+                return False
+            logger.info(f"Skipping verse group {i+1}/{len(verse_groups)}: {verse_groups[i]}, already in journal")
+            metrics.increment("interpretation_journal_hits")
+            resolve(i, done)
+            return True
+
+        def record(i, result):
+            # Failed groups are left out of the journal so the next run retries them
+            if journal and result["translation"] != "Error occurred":
+                journal.record("interpretation", f"{i}:{verse_groups[i]}", group_hash(verse_groups[i], index), result)
+            resolve(i, result)
+
+        def process_group(i):
+            logger.info(f"Processing verse group {i+1}/{len(verse_groups)}: {verse_groups[i]}")
+            with metrics.timer("interpretation_group"):
+                record(i, process_verse_group(verse_groups[i], index, rate_limiter, cache, stream))
+
+        def process_request(pack):
+            if len(pack) == 1:
+                process_group(pack[0])
+                return
+            logger.info(f"Processing verse groups {', '.join(str(i + 1) for i in pack)}/{len(verse_groups)} "
+                        f"in one request: {[verse_groups[i] for i in pack]}")
+            with metrics.timer("interpretation_pack"):
+                packed = process_verse_pack([verse_groups[i] for i in pack], [texts[i] for i in pack],
+                                            rate_limiter, cache, stream)
+            for i, result in zip(pack, packed):
+                if result is None:
+                    # The analysis of this group was missing or malformed, so it is asked for on its own
+                    logger.warning(f"No complete analysis of verse group {verse_groups[i]} in the packed response, "
+                                   f"falling back to a single request")
+                    metrics.increment("llm_pack_fallbacks")
+                    process_group(i)
+                else:
+                    record(i, result)
+
+        pending = [i for i in clusters if not journaled(i)]
+        requests_to_send = pack_groups(pending, texts) if pack else [[i] for i in pending]
+        if pack and len(requests_to_send) < len(pending):
+            logger.info(f"Packing {len(pending)} verse groups into {len(requests_to_send)} requests")
+        if requests_to_send:
+            # The first request runs alone so it writes the instructions to the prompt cache
+            # before the concurrent requests, which would otherwise all miss and each write it.
+            # Instructions too short to be cached gain nothing from waiting for it.
+            warm_up = requests_to_send[:1] if instructions_cacheable() else []
+            for pack in warm_up:
+                process_request(pack)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(process_request, requests_to_send[len(warm_up):]))
+
+    for representative, members in clusters.items():
+        result = results[representative]
+        if result["translation"] == "Error occurred":
+            for i in members[1:]:
+                resolve(i, error_result(verse_groups[i], RuntimeError(f"near-duplicate verse group {verse_groups[representative]} failed")))
+            continue
+        if dedup_index is not None:
+            dedup_index.add(texts[representative], result)
+        for i in members[1:]:
+            share(i, result)
     return results
 
+def interpret_chapter(chapter_folder, max_workers=1, rate_limiter=None, cache=None, backend="messages", stream=False,
+                      dedup_index=None, unique=False, pack=False):
+    """Interpret every verse group of one chapter and write its JSONL, JSON and text output.
+
+    Each group is appended to the JSONL file as soon as it completes; the JSON and text files
+    are written in group order at the end. Returns the number of verse groups that failed
+    and were written as "Error occurred", not counting groups that match no verse in the OCR text.
+    """
+    input_file = os.path.join(BASE_FOLDER_INPUT, chapter_folder, 'charaka_samhita_output.json')
+    output_folder = os.path.join(BASE_FOLDER_OUTPUT, chapter_folder, 'output')
+    output_json_file = os.path.join(output_folder, 'charaka_samhita_translated_detailed_full.json')
+    output_text_file = os.path.join(output_folder, 'charaka_samhita_translated_detailed_full.txt')
+    output_jsonl_file = os.path.join(output_folder, 'charaka_samhita_translated_detailed_full.jsonl')
+    journal_file = os.path.join('journal', f'interpretation_{chapter_folder}.jsonl')
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Load the JSON data
+    logger.info(f"Loading JSON data from {input_file}")
+    with open(input_file, 'r', encoding='utf-8') as f:
+        json_data = json.load(f)
+    logger.info("JSON data loaded successfully")
+
+    # Extract the 'book' part of the JSON
+    book_data = json_data['book']
+
+    # Process the verses
+    logger.info("Beginning verse processing")
+    journal = PipelineJournal(journal_file)
+    store = CorpusStore()
+    generation = generation_key()
+    jsonl_lock = threading.Lock()
+    start = time.perf_counter()
+    with open(output_jsonl_file, 'w', encoding='utf-8') as jsonl:
+        def write_result(i, result):
+            with jsonl_lock:
+                if jsonl.tell() == 0:
+                    metrics.observe("interpretation_first_result", time.perf_counter() - start)
+                jsonl.write(json.dumps({"index": i, **result}, ensure_ascii=False) + "\n")
+                jsonl.flush()
+            store.upsert_interpretation(book_data["section"], book_data["chapter"], i, result, generation)
+
+        try:
+            # Without a dedup_index, groups are matched against every interpretation already in the corpus store
+            if dedup_index is None and not unique:
+                dedup_index = interpretation_index(store, generation)
+            results = process_verses(book_data, max_workers=max_workers, rate_limiter=rate_limiter, cache=cache,
+                                     journal=journal, backend=backend, stream=stream, on_result=write_result,
+                                     dedup_index=dedup_index, unique=unique, pack=pack)
+        finally:
+            store.close()
+            journal.close()
+    logger.info("Verse processing complete")
+
+    # Prepare the output JSON
+    output_json = {
+        "timestamp": json_data["timestamp"],
+        "book": {
+            "title": book_data["title"],
+            "volume": book_data["volume"],
+            "section": book_data["section"],
+            "chapter": book_data["chapter"],
+            "chapter_name": book_data["chapter_name"],
+        },
+        "translations": results
+    }
+
+    # Save the results
+    logger.info(f"Saving results to JSON file: {output_json_file}")
+    with open(output_json_file, 'w', encoding='utf-8') as f:
+        json.dump(output_json, f, ensure_ascii=False, indent=2)
+
+    # Create formatted text output
+    logger.info(f"Saving results to text file: {output_text_file}")
+    write_interpretation_text(results, output_text_file)
+
+    logger.info("Results saved successfully")
+    # A group citing verses the OCR text does not have is a numbering anomaly, already reported when
+    # the verses were indexed; asking again cannot fix it, so it is not a failure to retry
+    empty_groups = set(VerseIndex(book_data['sanskrit_verses']).report(book_data['verse_groups'])["empty_groups"])
+    if empty_groups:
+        logger.warning(f"Verse groups {sorted(empty_groups)} in {chapter_folder} match no verses and were written as errors")
+    failed = sum(1 for result in results if result["translation"] == "Error occurred" and result["verses"] not in empty_groups)
+    if failed:
+        logger.warning(f"{failed} of {len(results)} verse groups failed in {chapter_folder}")
+    return failed
+
+def usage_cost(counters, prefix="llm"):
+    """Estimated USD cost of the tokens counted under prefix ("llm" or "llm_batch"), before any batch discount."""
+    return (counters.get(f"{prefix}_input_tokens", 0) * INPUT_COST_PER_MTOK
+            + counters.get(f"{prefix}_prompt_cache_write_tokens", 0) * INPUT_COST_PER_MTOK * CACHE_WRITE_MULTIPLIER
+            + counters.get(f"{prefix}_prompt_cache_read_tokens", 0) * INPUT_COST_PER_MTOK * CACHE_READ_MULTIPLIER
+            + counters.get(f"{prefix}_output_tokens", 0) * OUTPUT_COST_PER_MTOK) / 1_000_000
+
+def record_llm_cost():
+    counters = metrics.summary()["counters"]
+    cost = usage_cost(counters, "llm") + usage_cost(counters, "llm_batch") * BATCH_DISCOUNT
+    metrics.increment("llm_cost_usd", cost)
+
+    def total(name):
+        return counters.get(f"llm_{name}", 0) + counters.get(f"llm_batch_{name}", 0)
+    logger.info(f"Input tokens: {total('prompt_cache_read_tokens'):,} read from the prompt cache, "
+                f"{total('prompt_cache_write_tokens'):,} written to it, {total('input_tokens'):,} uncached; "
+                f"estimated cost ${cost:.4f}")
+
 def main():
     try:
         logger.info("Starting script execution")
+        if not instructions_cacheable():
+            logger.warning(f"The interpretation instructions are about {estimate_tokens(INTERPRETATION_INSTRUCTIONS)} tokens, "
+                           f"below the {MIN_CACHEABLE_TOKENS}-token minimum for prompt caching; they will not be cached")
+
+        rate_limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+        cache = ResponseCache(CACHE_FILE, max_age_days=CACHE_MAX_AGE_DAYS, max_size_mb=CACHE_MAX_SIZE_MB)
+        try:
+            interpret_chapter(CHAPTER_FOLDER, max_workers=MAX_WORKERS, rate_limiter=rate_limiter, cache=cache, backend=BACKEND,
+                              stream=STREAM_RESPONSES, pack=PACK_GROUPS)
+        finally:
+            cache.close()
 
-        # Load the JSON data
-        logger.info(f"Loading JSON data from {INPUT_FILE}")
-        with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
-        logger.info("JSON data loaded successfully")
-
-        # Extract the 'book' part of the JSON
-        book_data = json_data['book']
-
-        # Process the verses
-        logger.info("Beginning verse processing")
-        results = process_verses(book_data)
-        logger.info("Verse processing complete")
-
-        # Prepare the output JSON
-        output_json = {
-            "timestamp": json_data["timestamp"],
-            "book": {
-                "title": book_data["title"],
-                "volume": book_data["volume"],
-                "section": book_data["section"],
-                "chapter": book_data["chapter"],
-                "chapter_name": book_data["chapter_name"],
-            },
-            "translations": results
-        }
-
-        # Save the results
-        logger.info(f"Saving results to JSON file: {OUTPUT_JSON_FILE}")
-        with open(OUTPUT_JSON_FILE, 'w', encoding='utf-8') as f:
-            json.dump(output_json, f, ensure_ascii=False, indent=2)
-
-        # Create formatted text output
-        formatted_results = []
-        for i, result in enumerate(results, 1):
-            formatted_result = f"{i}. Verses {result['verses']}:\n\nSanskrit:\n{result['sanskrit']}\n\nTranslation:\n{result['translation']}\n\nVocabulary and Key Terms:\n{result['vocabulary']}\n\nContext and Significance:\n{result['context']}\n\nDetailed Interpretation:\n{result['interpretation']}\n\nAyurvedic Principles and Applications:\n{result['ayurvedic_principles']}\n\nConclusion:\n{result['conclusion']}"
-            formatted_results.append(formatted_result)
-
-        logger.info(f"Saving results to text file: {OUTPUT_TEXT_FILE}")
-        with open(OUTPUT_TEXT_FILE, 'w', encoding='utf-8') as f:
-            f.write("\n\n" + "="*50 + "\n\n".join(formatted_results))
-
-        logger.info("Results saved successfully")
         logger.info("Script execution completed successfully")
 
     except Exception as e:
         logger.critical(f"An unexpected error occurred: {e}", exc_info=True)
+    finally:
+        record_llm_cost()
+        metrics.write_summary(f"interpretation_{CHAPTER_FOLDER}")
 
 # File path variables
 BASE_FOLDER_INPUT = 'ExtractedFromOCR'
 BASE_FOLDER_OUTPUT = 'InterpretationByClaude'
-CHAPTER_FOLDER = 'S1C3'  # This might change for different chapters
-INPUT_FILE = os.path.join(BASE_FOLDER_INPUT, CHAPTER_FOLDER, 'charaka_samhita_output.json')
+CHAPTER_FOLDER = 'S1C3'  # This might change for different chapters; ProcessWholeBook.py runs them all
 
-OUTPUT_FOLDER = os.path.join(BASE_FOLDER_OUTPUT, CHAPTER_FOLDER, 'output')
 LOG_FOLDER = os.path.join(BASE_FOLDER_OUTPUT, CHAPTER_FOLDER, 'logs')
-
-OUTPUT_JSON_FILE = os.path.join(OUTPUT_FOLDER, 'charaka_samhita_translated_detailed_full.json')
-OUTPUT_TEXT_FILE = os.path.join(OUTPUT_FOLDER, 'charaka_samhita_translated_detailed_full.txt')
 LOG_FILE = os.path.join(LOG_FOLDER, 'charaka_samhita_translation_detailed_full.log')
 
+# Claude API
+API_BASE = "https://api.anthropic.com/v1"
+MODEL = "claude-3-5-sonnet-20240620"
+MAX_TOKENS = 4000
+
+# "messages" sends one request per verse group; "batch" sends the whole chapter as one Message Batch,
+# billed at half price and outside the per-minute limits, with results within 24 hours
+BACKEND = "messages"
+BATCH_POLL_SECONDS = 30
+BATCH_MAX_POLL_SECONDS = 600
+BATCH_TIMEOUT_SECONDS = 25 * 60 * 60
+BATCH_DISCOUNT = 0.5
+
+# Stream responses (SSE) so sections are parsed as they arrive and generation stops once the conclusion is complete
+STREAM_RESPONSES = True
+
+# Pack runs of small adjacent verse groups into one request each, to spread the per-request overhead.
+# Recorded analyses run to 1000-1200 output tokens, so MAX_TOKENS holds three of them.
+PACK_GROUPS = False
+PACK_OUTPUT_TOKENS_PER_GROUP = 1300
+PACK_MAX_GROUPS = MAX_TOKENS // PACK_OUTPUT_TOKENS_PER_GROUP
+PACK_SMALL_GROUP_TOKENS = 150  # larger groups (by estimate_tokens) get longer analyses and go alone
+PACK_MAX_INPUT_TOKENS = 300
+
+# Concurrency and rate limits for the Claude API (match these to the account's tier)
+MAX_WORKERS = 4
+REQUESTS_PER_MINUTE = 50
+TOKENS_PER_MINUTE = 40000  # input tokens
+
+# Responses are cached across runs and chapters, keyed by model, prompt and max_tokens
+CACHE_FILE = os.path.join(BASE_FOLDER_OUTPUT, 'cache', 'claude_responses.sqlite')
+CACHE_MAX_AGE_DAYS = 90
+CACHE_MAX_SIZE_MB = 500
+
+# Claude 3.5 Sonnet list prices in USD per million tokens, for the per-run cost estimate
+INPUT_COST_PER_MTOK = 3.0
+OUTPUT_COST_PER_MTOK = 15.0
+# Prompt-cache writes and reads are billed relative to the input price
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+# Shorter prompt prefixes are processed normally without being cached (1024 tokens for Sonnet models)
+MIN_CACHEABLE_TOKENS = 1024
+
 # Create folders if they don't exist
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 os.makedirs(LOG_FOLDER, exist_ok=True)
 
 # Set up logging to write to a file
@@ -0,0 +1,11 @@
+import os
+import sys
+import logging
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# The pipeline scripts call logging.basicConfig when imported, each with its own log file under
+# the repository. A handler on the root logger turns those calls into no-ops, so a test run
+# leaves the tracked logs alone.
+logging.getLogger().addHandler(logging.NullHandler())
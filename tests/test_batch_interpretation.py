@@ -0,0 +1,55 @@
+import json
+import os
+from contextlib import ExitStack
+
+import pytest
+
+import generateInterpretationWithClaudeSonnet as interpretation
+from FakeBackends import RECORDED_ROOT, MockBatchServer
+
+CHAPTER = "S1C3"
+
+@pytest.fixture(scope="module")
+def book():
+    with open(os.path.join(RECORDED_ROOT, 'ExtractedFromOCR', CHAPTER, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+        book = json.load(f)['book']
+    # A few groups keep the synchronous run short; the chapter's first group has no verses
+    return {**book, 'verse_groups': book['verse_groups'][1:7]}
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    """Start a MockBatchServer and point the client at it; the latest one started is used."""
+    with ExitStack() as stack:
+        def start(**options):
+            server = stack.enter_context(MockBatchServer(**options))
+            monkeypatch.setattr(interpretation, "API_BASE", server.url)
+            return server
+        yield start
+
+def test_batch_matches_synchronous_results(book, mock_api):
+    mock_api()
+    expected = interpretation.process_verses(book, max_workers=2)
+    server = mock_api(processing_seconds=0.2)
+    result = interpretation.process_verses_batch(book, poll_interval=0.05)
+    assert len(server.batches) == 1
+    assert server.batch_polls >= 1
+    assert result == expected
+    assert [r["verses"] for r in result] == book['verse_groups']
+    assert all(r["translation"] != "Error occurred" for r in result)
+
+def test_errored_requests_map_to_their_groups(book, mock_api):
+    index = interpretation.build_verse_index(book)
+    # One verse of the group; the mock matches it against the JSON-encoded request
+    failing = interpretation.group_sanskrit(book['verse_groups'][2], index).splitlines()[0]
+    mock_api(failing_texts=[failing])
+    result = interpretation.process_verses_batch(book, poll_interval=0.05)
+    errored = [i for i, r in enumerate(result) if r["translation"] == "Error occurred"]
+    assert errored == [2]
+    assert [r["verses"] for r in result] == book['verse_groups']
+
+def test_selected_groups_only(book, mock_api):
+    server = mock_api()
+    result = interpretation.process_verses_batch(book, selected={1, 4}, poll_interval=0.05)
+    assert [i for i, r in enumerate(result) if r is not None] == [1, 4]
+    [batch] = server.batches.values()
+    assert len(batch["results"]) == 2
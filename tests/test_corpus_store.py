@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from CorpusStore import CorpusStore
+from FakeBackends import RECORDED_ROOT
+
+SECTION, CHAPTER = 1, 3
+
+BOOK = {"title": "Charaka Samhita", "volume": 1, "section": 9, "chapter": 1, "chapter_name": "Test",
+        "verse_groups": ["1-2", "3"],
+        "sanskrit_verses": [{"verse_number": 1, "sanskrit": "अथातो दीर्घञ्जीवितीयमध्यायं व्याख्यास्यामः ।।१।।"},
+                            {"verse_number": 2, "sanskrit": "इति ह स्माह भगवानात्रेयः ।।२।।"},
+                            {"verse_number": 3, "sanskrit": "दीर्घं जीवितमन्विच्छन् ।।३।।"}]}
+
+@pytest.fixture
+def store(tmp_path):
+    with CorpusStore(str(tmp_path / "corpus.sqlite")) as store:
+        yield store
+
+def test_export_reproduces_recorded_files(store, tmp_path):
+    store.import_chapter(SECTION, CHAPTER, RECORDED_ROOT)
+    export_root = str(tmp_path / "export")
+    written = store.export_chapter(SECTION, CHAPTER, export_root, formats=("json", "txt"))
+    assert len(written) == 4
+    for path in written:
+        with open(path, 'rb') as exported, open(os.path.join(RECORDED_ROOT, os.path.relpath(path, export_root)), 'rb') as original:
+            assert exported.read() == original.read(), path
+
+def test_upsert_verses_updates_only_their_rows(store):
+    store.upsert_chapter(BOOK, "2024-01-01T00:00:00")
+    store.upsert_verses(9, 1, [(1, {**BOOK['sanskrit_verses'][1], "translation": "Thus spoke Atreya.",
+                                    "translation_source": "S1C1 verse 9", "transliteration_hk": "iti ha smAha"})])
+    verses = list(store.verses(9, 1))
+    assert [verse['translation'] for verse in verses] == [None, "Thus spoke Atreya.", None]
+    assert verses[1]['translation_source'] == "S1C1 verse 9"
+    assert verses[1]['transliteration_hk'] == "iti ha smAha"
+    assert 'translation_source' not in verses[0]
+
+def test_changed_sanskrit_drops_its_translation(store):
+    store.upsert_chapter(BOOK, "2024-01-01T00:00:00")
+    store.upsert_verses(9, 1, [(i, {**verse, "translation": f"verse {i}"}) for i, verse in enumerate(BOOK['sanskrit_verses'])])
+    verses = [dict(verse) for verse in BOOK['sanskrit_verses'][:2]]
+    verses[1]['sanskrit'] = "इति ह स्माह भगवानात्रेय ।।२।।"
+    store.upsert_chapter({**BOOK, "sanskrit_verses": verses, "verse_groups": ["1-2"]}, "2024-01-02T00:00:00")
+    assert [verse['translation'] for verse in store.verses(9, 1)] == ["verse 0", None]
+
+def test_chapter_book_round_trip(store):
+    store.upsert_chapter(BOOK, "2024-01-01T00:00:00")
+    assert store.chapter_book(9, 1) == {"timestamp": "2024-01-01T00:00:00", "book": BOOK}
+    with pytest.raises(KeyError):
+        store.chapter_book(9, 2)
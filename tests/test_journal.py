@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+
+import generateInterpretationWithClaudeSonnet as interpretation
+from FakeBackends import RECORDED_ROOT, MockBatchServer
+from PipelineJournal import PipelineJournal, content_hash
+
+CHAPTER = "S1C3"
+
+@pytest.fixture(scope="module")
+def book():
+    with open(os.path.join(RECORDED_ROOT, 'ExtractedFromOCR', CHAPTER, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+        book = json.load(f)['book']
+    # The chapter's first group has no verses
+    return {**book, 'verse_groups': book['verse_groups'][1:5]}
+
+def test_content_hash_separates_parts():
+    assert content_hash("ab", "c") != content_hash("a", "bc")
+    assert content_hash({"b": 1, "a": 2}) == content_hash({"a": 2, "b": 1})
+    assert content_hash(b"x") != content_hash("x")
+
+def test_entries_are_replayed_on_reopening(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = PipelineJournal(path)
+    journal.record("translate", "3", "h1", {"translation": "first"})
+    journal.record("translate", "3", "h2", {"translation": "second"})
+    journal.record("ocr", "page_1", "h3", "text")
+    journal.close()
+
+    journal = PipelineJournal(path)
+    # The latest entry for an item wins, and only from the same inputs
+    assert journal.get("translate", 3, "h2") == {"translation": "second"}
+    assert journal.get("translate", 3, "h1") is None
+    assert journal.is_done("ocr", "page_1", "h3")
+    assert not journal.is_done("ocr", "page_2", "h3")
+    journal.close()
+
+def test_truncated_last_line_is_skipped(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = PipelineJournal(path)
+    journal.record("ocr", "page_1", "h1", "text")
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"stage": "ocr", "item": "page_2", "ha')
+
+    journal = PipelineJournal(path)
+    assert journal.get("ocr", "page_1", "h1") == "text"
+    assert not journal.is_done("ocr", "page_2", "h1")
+    journal.close()
+
+def test_interpretation_resumes_from_journal(book, tmp_path, monkeypatch):
+    path = str(tmp_path / "journal.jsonl")
+    with MockBatchServer() as server:
+        monkeypatch.setattr(interpretation, "API_BASE", server.url)
+        journal = PipelineJournal(path)
+        expected = interpretation.process_verses(book, journal=journal, unique=True)
+        journal.close()
+        calls = server.message_calls
+        assert calls == len(book['verse_groups'])
+
+        journal = PipelineJournal(path)
+        assert interpretation.process_verses(book, journal=journal, unique=True) == expected
+        journal.close()
+        assert server.message_calls == calls
@@ -0,0 +1,40 @@
+import pytest
+
+from FakeBackends import FakeDocumentAIClient, fake_document, image_folder_for, recorded_page_texts
+from ImageToBaseJson import extract_verses_and_groups, process_all_images
+from PageArchive import PageFolder
+
+CHAPTER = "S1C5"
+
+@pytest.fixture(scope="module")
+def page_texts():
+    texts = recorded_page_texts(CHAPTER)
+    if not texts:
+        pytest.skip(f"No page images for {CHAPTER}")
+    return texts
+
+def test_pages_are_joined_in_file_order(page_texts):
+    folder = image_folder_for(CHAPTER)
+    with PageFolder(folder) as pages:
+        expected = "".join(f"{fake_document(page_texts[pages.page_hash(name)]).text}\n\n" for name in pages.names())
+    verses, groups, ocr_content = process_all_images("p", "l", "fake", folder, max_workers=4,
+                                                     client=FakeDocumentAIClient(page_texts, jitter=0.01), retry_delay=0)
+    assert ocr_content == [expected]
+    assert (verses, groups) == extract_verses_and_groups(expected)
+
+def test_worker_count_does_not_change_the_output(page_texts):
+    folder = image_folder_for(CHAPTER)
+    outputs = [process_all_images("p", "l", "fake", folder, max_workers=workers,
+                                  client=FakeDocumentAIClient(page_texts, jitter=0.01), retry_delay=0)
+               for workers in (1, 4, 8)]
+    assert outputs[0] == outputs[1] == outputs[2]
+
+def test_failed_pages_are_retried(page_texts):
+    folder = image_folder_for(CHAPTER)
+    expected = process_all_images("p", "l", "fake", folder, client=FakeDocumentAIClient(page_texts), retry_delay=0)
+    # Three attempts per page; with this seed every page gets through. One worker keeps the
+    # order of the client's random draws, and so which calls fail, fixed
+    client = FakeDocumentAIClient(page_texts, error_rate=0.3, seed=1)
+    assert process_all_images("p", "l", "fake", folder, max_workers=1, client=client, retry_delay=0) == expected
+    assert client.failures > 0
+    assert client.calls == len(PageFolder(folder)) + client.failures
@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+import generateInterpretationWithClaudeSonnet as interpretation
+from FakeBackends import RECORDED_ROOT, MockBatchServer, fake_interpretation
+from generateInterpretationWithClaudeSonnet import PACK_MARKER, build_prompt, pack_groups, split_packed_response
+
+CHAPTER = "S1C3"
+
+SMALL = "इति ह स्माह भगवानात्रेयः ।।२।।"
+LARGE = "क" * 3 * (interpretation.PACK_SMALL_GROUP_TOKENS + 1)
+
+@pytest.fixture(scope="module")
+def book():
+    with open(os.path.join(RECORDED_ROOT, 'ExtractedFromOCR', CHAPTER, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+        book = json.load(f)['book']
+    # The chapter's first group has no verses; group "14" has none either and is never packed
+    return {**book, 'verse_groups': book['verse_groups'][1:13]}
+
+def test_small_adjacent_groups_share_a_request():
+    texts = [SMALL, SMALL, LARGE, SMALL, "", SMALL, SMALL, SMALL]
+    assert pack_groups(range(len(texts)), texts, max_groups=2) == [[0, 1], [2], [3], [4], [5, 6], [7]]
+
+def test_packs_respect_the_input_budget():
+    tokens = interpretation.estimate_tokens(SMALL)
+    assert pack_groups(range(5), [SMALL] * 5, max_groups=10, max_input_tokens=2 * tokens) == [[0, 1], [2, 3], [4]]
+
+def test_split_packed_response():
+    answers = [fake_interpretation(build_prompt(text)) for text in ("क", "ख", "ग")]
+    packed = f"{PACK_MARKER.format(1)}\n{answers[0]}\n**{PACK_MARKER.format(3)}**\n{answers[2]}"
+    first, second, third = split_packed_response(packed, 3)
+    assert first is not None and third is not None
+    assert second is None
+
+def test_repeated_marker_is_rejected():
+    answer = fake_interpretation(build_prompt("क"))
+    packed = f"{PACK_MARKER.format(1)}\n{answer}\n{PACK_MARKER.format(1)}\n{answer}"
+    assert split_packed_response(packed, 1) == [None]
+
+def test_packed_and_fallback_results_match_single_requests(book, monkeypatch):
+    with MockBatchServer() as server:
+        monkeypatch.setattr(interpretation, "API_BASE", server.url)
+        expected = interpretation.process_verses(book, unique=True)
+        single_calls = server.message_calls
+        assert interpretation.process_verses(book, unique=True, pack=True) == expected
+        packed_calls = server.message_calls - single_calls
+    assert packed_calls < single_calls
+
+    # With every marker dropped, each packed group is asked for again on its own
+    with MockBatchServer(dropped_marker_rate=1.0) as server:
+        monkeypatch.setattr(interpretation, "API_BASE", server.url)
+        assert interpretation.process_verses(book, unique=True, pack=True) == expected
+    assert server.dropped_markers > 0
+    assert server.message_calls == packed_calls + server.dropped_markers
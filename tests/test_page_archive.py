@@ -0,0 +1,62 @@
+import os
+
+import pytest
+from PIL import Image
+
+from PageArchive import ALIGNMENT, PageArchive, PageFolder, archive_path_for, build_archive, ensure_archive, open_pages
+
+SIZES = {"page_1.png": (40, 60), "page_2.png": (300, 20), "page_10.png": (7, 7)}
+
+@pytest.fixture
+def folder(tmp_path):
+    path = tmp_path / "S9-Chapter1"
+    path.mkdir()
+    for i, (name, size) in enumerate(SIZES.items()):
+        Image.new("L", size, color=40 * i).save(path / name)
+    (path / "notes.txt").write_text("not a page")
+    return str(path)
+
+def test_archive_round_trip(folder):
+    path = build_archive(folder)
+    assert path == archive_path_for(folder)
+    with PageArchive(path) as archive, PageFolder(folder) as pages:
+        assert archive.names() == pages.names() == sorted(SIZES)
+        for name in SIZES:
+            assert bytes(archive.page_bytes(name)) == pages.page_bytes(name)
+            assert archive.page_hash(name) == pages.page_hash(name)
+            assert archive.page_size(name) == pages.page_size(name) == SIZES[name]
+            assert archive.entries[name].offset % ALIGNMENT == 0
+        assert archive.image("page_2.png").size == SIZES["page_2.png"]
+        assert "notes.txt" not in archive
+
+def test_open_pages_picks_the_reader(folder):
+    with open_pages(folder) as pages:
+        assert isinstance(pages, PageFolder)
+    with open_pages(build_archive(folder)) as pages:
+        assert isinstance(pages, PageArchive)
+
+def test_ensure_archive_rebuilds_when_pages_change(folder):
+    path = ensure_archive(folder)
+    built = os.path.getmtime(path)
+    assert ensure_archive(folder) == path and os.path.getmtime(path) == built
+
+    os.remove(os.path.join(folder, "page_10.png"))
+    ensure_archive(folder)
+    with PageArchive(path) as archive:
+        assert archive.names() == ["page_1.png", "page_2.png"]
+
+def test_failed_build_leaves_no_files(folder):
+    with open(os.path.join(folder, "page_3.png"), 'wb') as f:
+        f.write(b"not a png")
+    with pytest.raises(ValueError):
+        build_archive(folder)
+    assert sorted(os.listdir(os.path.dirname(folder))) == ["S9-Chapter1"]
+
+def test_rejects_files_that_are_not_archives(tmp_path):
+    empty = tmp_path / "empty.pages"
+    empty.write_bytes(b"")
+    other = tmp_path / "other.pages"
+    other.write_bytes(b"\0" * 64)
+    for path in (empty, other):
+        with pytest.raises(ValueError):
+            PageArchive(str(path))
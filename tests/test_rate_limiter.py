@@ -0,0 +1,33 @@
+import time
+
+from generateInterpretationWithClaudeSonnet import RateLimiter
+
+def timed_acquires(limiter, count, tokens=1):
+    start = time.monotonic()
+    for _ in range(count):
+        limiter.acquire(tokens)
+    return time.monotonic() - start
+
+def test_requests_within_allowance_do_not_wait():
+    assert timed_acquires(RateLimiter(requests_per_minute=60, tokens_per_minute=10_000), 60) < 0.05
+
+def test_request_limit_waits_for_refill():
+    # 600 a minute refills one request every 0.1 s once the first 600 are spent
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=1_000_000)
+    timed_acquires(limiter, 600)
+    assert 0.15 <= timed_acquires(limiter, 2) < 1
+
+def test_token_limit_waits_for_refill():
+    # 6000 tokens a minute is 100 a second; the second request needs 50 more than are left
+    limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=6000)
+    limiter.acquire(5950)
+    assert 0.4 <= timed_acquires(limiter, 1, tokens=100) < 1.5
+
+def test_oversized_request_is_clamped_to_the_bucket():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=100)
+    assert timed_acquires(limiter, 1, tokens=10_000) < 0.05
+
+def test_pause_holds_every_caller():
+    limiter = RateLimiter(requests_per_minute=60_000, tokens_per_minute=1_000_000)
+    limiter.pause(0.3)
+    assert 0.3 <= timed_acquires(limiter, 1) < 1
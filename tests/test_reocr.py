@@ -0,0 +1,73 @@
+import pytest
+
+from FakeBackends import FakeDocumentAIClient, image_folder_for, recorded_page_texts
+from ImageToBaseJson import (VERSE_END_PATTERN, load_page_records, page_anomalies, page_quality, process_chapter,
+                             reocr_chapter)
+from PageArchive import PageFolder
+
+CHAPTER = "S1C5"
+SECTION, CHAPTER_NUMBER = 1, 5
+
+def drop_middle_verse_end(text):
+    ends = list(VERSE_END_PATTERN.finditer(text))
+    end = ends[len(ends) // 2]
+    return text[:end.start()] + text[end.end():]
+
+@pytest.fixture
+def chapter(tmp_path, monkeypatch):
+    """The chapter's folder, recorded texts by image hash and a clean page to damage; outputs go under tmp_path."""
+    texts = recorded_page_texts(CHAPTER)
+    if not texts:
+        pytest.skip(f"No page images for {CHAPTER}")
+    folder = image_folder_for(CHAPTER)
+    with PageFolder(folder) as pages:
+        names = pages.names()
+        hashes = {name: pages.page_hash(name) for name in names}
+    anomalies = page_anomalies([texts[hashes[name]] for name in names])
+    page = next(name for i, name in enumerate(names)
+                if not anomalies[i] and len(VERSE_END_PATTERN.findall(texts[hashes[name]])) >= 3)
+    monkeypatch.chdir(tmp_path)
+    return folder, texts, hashes, page
+
+def ocr_damaged(chapter):
+    folder, texts, hashes, page = chapter
+    client = FakeDocumentAIClient({**texts, hashes[page]: drop_middle_verse_end(texts[hashes[page]])})
+    process_chapter('p', 'us', 'fake', folder, SECTION, CHAPTER_NUMBER, client=client)
+    return {record["page"]: record for record in load_page_records(SECTION, CHAPTER_NUMBER)}
+
+def test_page_anomalies_across_pages():
+    pages = ["अथ ।।1।। इति ।।2।।", "वातः ।।4।।\nअथ ।।4।।", "ab need aniliyono ।।1।।"]
+    assert page_anomalies(pages) == [["verse 3 missing between 2 and 4"],
+                                     ["verse 3 missing between 2 and 4", "verse 4 repeated"],
+                                     ["verse line only 21% Devanagari: ab need aniliyono ।।1।।"]]
+
+def test_page_quality_prefers_fewer_anomalies_then_confidence():
+    confident, doubtful = {"confidence": 0.95}, {"confidence": 0.6}
+    assert page_quality(doubtful, []) > page_quality(confident, ["verse 3 repeated"])
+    assert page_quality(confident, []) > page_quality(doubtful, [])
+    assert page_quality({"confidence": 0.97}, []) > page_quality(confident, [])
+
+def test_better_text_replaces_the_flagged_page(chapter):
+    folder, texts, hashes, page = chapter
+    before = ocr_damaged(chapter)
+    assert before[page]["flagged"]
+
+    client = FakeDocumentAIClient(texts)
+    assert reocr_chapter('p', 'us', 'fake', folder, SECTION, CHAPTER_NUMBER, pages=[page], client=client) == [page]
+    assert client.calls == 1
+    after = {record["page"]: record for record in load_page_records(SECTION, CHAPTER_NUMBER)}
+    assert not after[page]["flagged"]
+    assert (after[page]["source"], after[page]["attempts"]) == ("reocr-fresh", ["fresh"])
+    assert all(after[name]["text"] == record["text"] for name, record in before.items() if name != page)
+
+def test_text_that_loses_devanagari_is_rejected(chapter):
+    folder, texts, hashes, page = chapter
+    before = ocr_damaged(chapter)
+    # Every verse number is back, so the page has no anomalies, but the verses themselves are gone
+    numbers_only = "\n".join(f"अथ {end.group(0)}" for end in VERSE_END_PATTERN.finditer(texts[hashes[page]]))
+    assert page_anomalies([numbers_only]) == [[]]
+    client = FakeDocumentAIClient({hashes[page]: numbers_only})
+    assert reocr_chapter('p', 'us', 'fake', folder, SECTION, CHAPTER_NUMBER, pages=[page], client=client) == []
+    after = {record["page"]: record for record in load_page_records(SECTION, CHAPTER_NUMBER)}
+    assert after[page]["text"] == before[page]["text"]
+    assert (after[page]["source"], after[page]["attempts"]) == ("ocr", ["fresh"])
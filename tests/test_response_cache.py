@@ -0,0 +1,64 @@
+import pytest
+
+import ResponseCache as response_cache
+from ResponseCache import ResponseCache
+
+DAY = 86400
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable time.time(), which the cache uses for creation and access times."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    return now
+
+def test_keys_depend_on_every_field():
+    key = ResponseCache.make_key(model="m", prompt="p", max_tokens=10)
+    assert key == ResponseCache.make_key(max_tokens=10, prompt="p", model="m")
+    assert key != ResponseCache.make_key(model="m", prompt="p", max_tokens=11)
+
+def test_values_survive_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path)
+    cache.set("a", "अथातो".encode('utf-8'))
+    cache.close()
+    cache = ResponseCache(path)
+    assert cache.get("a").decode('utf-8') == "अथातो"
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
+
+def test_entries_expire(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_age_days=1)
+    cache.set("old", b"x")
+    clock[0] += DAY / 2
+    cache.set("new", b"y")
+    clock[0] += DAY * 0.75
+    assert cache.get("old") is None
+    assert cache.get("new") == b"y"
+    cache.close()
+
+def test_expired_entries_are_dropped_on_open(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path)
+    cache.set("old", b"x")
+    cache.close()
+    clock[0] += 2 * DAY
+    cache = ResponseCache(path, max_age_days=1)
+    assert cache.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] == 0
+    cache.close()
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    # Room for two 400-byte values
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_size_mb=1000 / (1024 * 1024))
+    for key in ("a", "b"):
+        cache.set(key, key.encode() * 400)
+        clock[0] += 1
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a") is not None
+    clock[0] += 1
+    cache.set("c", b"c" * 400)
+    assert cache.get("b") is None
+    assert cache.get("a") == b"a" * 400
+    assert cache.get("c") == b"c" * 400
+    cache.close()
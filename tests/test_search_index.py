@@ -0,0 +1,42 @@
+import pytest
+
+from CorpusStore import CorpusStore
+from SearchIndex import SearchIndex, fts_phrases, search_key
+
+BOOK = {"title": "Charaka Samhita", "volume": 1, "section": 1, "chapter": 5, "chapter_name": "Matrashitiya",
+        "verse_groups": ["1-2"],
+        "sanskrit_verses": [{"verse_number": 1, "sanskrit": "अथातो मात्राशितीयमध्यायं व्याख्यास्यामः ।।१।।"},
+                            {"verse_number": 2, "sanskrit": "इति ह स्माह भगवानात्रेयः ।।२।।"}]}
+
+@pytest.mark.parametrize("text", ["मात्रा", "mātrā", "Mātrā", "MATRA", "  matra "])
+def test_search_key_folds_scripts_and_diacritics(text):
+    assert search_key(text) == "matra"
+
+def test_fts_phrases_quote_operators():
+    assert fts_phrases(['vata', 'NOT', 'a"b']) == '"vata" AND "NOT" AND "a""b"'
+
+@pytest.fixture
+def index(tmp_path):
+    with CorpusStore(str(tmp_path / "corpus.sqlite")) as store, SearchIndex(str(tmp_path / "search.sqlite")) as index:
+        store.upsert_chapter(BOOK, "2024-01-01T00:00:00")
+        store.upsert_verses(1, 5, [(0, {**BOOK['sanskrit_verses'][0], "translation": "Now we shall expound the chapter on the measure of food."})])
+        assert index.refresh(store) == [(1, 5)]
+        assert index.refresh(store) == []
+        yield index
+
+@pytest.mark.parametrize("query", ["मात्रा", "matra", "Mātrāśitīya"])
+def test_sanskrit_queries_match_inside_compounds(index, query):
+    [hit] = index.search(query)
+    assert (hit['chapter'], hit['label'], hit['field']) == ("S1C5", "1", "sanskrit")
+
+def test_english_query_is_stemmed(index):
+    [hit] = index.search("expounding")
+    assert (hit['label'], hit['field']) == ("1", "english")
+
+def test_short_words_are_skipped(index):
+    # "ha" is too short for a trigram; "atreya" is inside bhagavānātreyaḥ
+    assert [hit['label'] for hit in index.search("iti ha atreya")] == ["2"]
+
+def test_query_syntax_is_taken_literally(index):
+    assert index.search("measure OR xyzzy") == []
+    assert [hit['label'] for hit in index.search('"measure')] == ["1"]
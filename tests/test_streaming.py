@@ -0,0 +1,46 @@
+import io
+import json
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from generateInterpretationWithClaudeSonnet import read_stream
+
+ANSWER = ("1. Translation:\nअथात आरग्वधीयमध्यायं व्याख्यास्यामः — now the chapter on Aragvadha.\n"
+          "6. Conclusion:\nअग्निवेश learns the twenty-two pastes.\n")
+
+def sse(events):
+    return "".join(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n" for event, data in events).encode('utf-8')
+
+def event_stream(text, chunk_chars=7):
+    events = [("message_start", {"type": "message_start", "message": {"usage": {"input_tokens": 120, "output_tokens": 1}}})]
+    events += [("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                        "delta": {"type": "text_delta", "text": text[i:i + chunk_chars]}})
+               for i in range(0, len(text), chunk_chars)]
+    events += [("message_delta", {"type": "message_delta", "usage": {"output_tokens": 42}}),
+               ("message_stop", {"type": "message_stop"})]
+    return sse(events)
+
+def streamed_response(body):
+    """A response as requests builds it for an event stream whose Content-Type has no charset."""
+    response = requests.Response()
+    response.status_code = 200
+    response.headers = CaseInsensitiveDict({"Content-Type": "text/event-stream"})
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.raw = io.BytesIO(body)
+    return response
+
+def test_devanagari_stream_without_charset():
+    # "अ" is E0 A4 85; read as Latin-1, the 0x85 byte is a line break that splits the event
+    assert "अ".encode('utf-8') == b"\xe0\xa4\x85"
+    result = read_stream(streamed_response(event_stream(ANSWER)), stop_early=False)
+    assert result["content"] == [{"type": "text", "text": ANSWER}]
+    assert result["usage"] == {"input_tokens": 120, "output_tokens": 42}
+
+def test_stream_stops_after_conclusion():
+    extra = "## Further Reading\nअष्टाङ्गहृदय, सुश्रुतसंहिता\n"
+    result = read_stream(streamed_response(event_stream(ANSWER + extra)))
+    text = result["content"][0]["text"]
+    # Reading stops at the chunk that completes the heading line, before the end of the message
+    assert ANSWER in text and text != ANSWER + extra
+    assert result["usage"]["output_tokens"] != 42
@@ -0,0 +1,36 @@
+from FakeBackends import FakeTranslateClient
+from GenerateCompleteJson import make_batches, translate_batch, translate_batches
+
+TEXTS = [f"श्लोकः {i} " + "क" * (i % 7) for i in range(40)]
+
+def test_batches_respect_limits_and_keep_order():
+    batches = make_batches(TEXTS, max_chars=60, max_segments=5)
+    assert [i for batch in batches for i in batch] == list(range(len(TEXTS)))
+    assert all(len(batch) <= 5 for batch in batches)
+    assert all(sum(len(TEXTS[i]) for i in batch) <= 60 for batch in batches)
+
+def test_oversized_text_gets_its_own_batch():
+    assert make_batches(["a" * 10, "b" * 100, "c"], max_chars=50) == [[0], [1], [2]]
+
+def test_translate_batch_uses_one_call():
+    client = FakeTranslateClient()
+    assert translate_batch(client, TEXTS[:3]) == [f"[en] {text}" for text in TEXTS[:3]]
+    assert client.calls == 1
+
+def test_failed_batch_falls_back_to_single_texts():
+    client = FakeTranslateClient(failing_texts=[TEXTS[1]])
+    assert translate_batch(client, TEXTS[:3]) == [f"[en] {TEXTS[0]}", None, f"[en] {TEXTS[2]}"]
+    # The batch call, then one call per text
+    assert client.calls == 4
+    assert client.failures == 2
+
+def test_translate_batches_maps_results_to_indices():
+    client = FakeTranslateClient(failing_texts=[TEXTS[7]], latency=0.001)
+    translations = [None] * len(TEXTS)
+    for indices, results in translate_batches(client, TEXTS, max_workers=4, max_chars=60, max_segments=5):
+        for i, translation in zip(indices, results):
+            translations[i] = translation
+    assert translations == [None if i == 7 else f"[en] {text}" for i, text in enumerate(TEXTS)]
+    # Only the batch holding the failing text is retried one text at a time
+    failed_batch = next(batch for batch in make_batches(TEXTS, 60, 5) if 7 in batch)
+    assert client.segments == len(TEXTS) + len(failed_batch)
@@ -0,0 +1,55 @@
+from CorpusStore import CorpusStore
+from VerseDedup import NearDuplicateIndex, cluster_verses, normalize_verse, translation_index
+
+VERSE = "वायुः प्रकुपितो देहे रुजं जनयति दारुणाम् ।।१२।।"
+# OCR variants: spacing and numbering, a dropped letter, a wrong vowel sign
+SAME_VERSE = ["वायुः  प्रकुपितो देहे रुजं जनयति दारुणाम् ।। १३ ।।",
+              "वायुः प्रकुपितो देहे रुजं जनयति दारुणा ।।१२।।",
+              "वायुः प्रकुपितो देहे रुजं जनयती दारुणाम् ।।१२।।"]
+# Another word: the translation differs
+OTHER_VERSE = "पित्तं प्रकुपितो देहे रुजं जनयति दारुणाम् ।।१४।।"
+
+def test_normalize_keeps_letters_only():
+    assert normalize_verse("इति ह‍ स्माह ।।१।।") == normalize_verse("इतिहस्माह।")
+
+def test_ocr_variants_find_the_verse():
+    index = NearDuplicateIndex()
+    index.add(VERSE, "translation")
+    assert all(index.lookup(text) == "translation" for text in SAME_VERSE)
+
+def test_different_word_is_not_a_duplicate():
+    index = NearDuplicateIndex()
+    index.add(VERSE, "translation")
+    assert index.lookup(OTHER_VERSE) is None
+
+def test_short_verses_match_exactly_only():
+    index = NearDuplicateIndex()
+    index.add("इति ह स्माह", "short")
+    assert index.lookup("इति ह स्माह ।।३।।") == "short"
+    assert index.lookup("इति स्माह") is None
+
+def test_exact_only_index():
+    index = NearDuplicateIndex(similarity=1.0)
+    index.add(VERSE, "translation")
+    assert index.lookup(VERSE.replace("१२", "२०")) == "translation"
+    assert index.lookup(SAME_VERSE[1]) is None
+
+def test_cluster_verses():
+    known = NearDuplicateIndex()
+    known.add("अथातो दीर्घञ्जीवितीयमध्यायं व्याख्यास्यामः", "known")
+    texts = [VERSE, OTHER_VERSE, SAME_VERSE[1], "।", "अथातो दीर्घञ्जीवितीयमध्यायं व्याख्यास्यामः ।।१।।", SAME_VERSE[2]]
+    reused, clusters = cluster_verses(texts, known)
+    assert reused == {4: "known"}
+    assert clusters == {0: [0, 2, 5], 1: [1], 3: [3]}
+
+def test_translation_index_records_sources(tmp_path):
+    book = {"section": 1, "chapter": 2, "verse_groups": ["12-13"],
+            "sanskrit_verses": [{"verse_number": 12, "sanskrit": VERSE}, {"verse_number": 13, "sanskrit": OTHER_VERSE}]}
+    with CorpusStore(str(tmp_path / "corpus.sqlite")) as store:
+        store.upsert_chapter(book, "2024-01-01T00:00:00")
+        store.upsert_verses(1, 2, [(0, {**book['sanskrit_verses'][0], "translation": "Vata, when aggravated..."}),
+                                   (1, {**book['sanskrit_verses'][1], "translation": "Pitta, when aggravated...",
+                                        "translation_source": "S1C1 verse 4"})])
+        index = translation_index(store)
+    assert index.lookup(SAME_VERSE[1]) == {"translation": "Vata, when aggravated...", "source": "S1C2 verse 12"}
+    assert index.lookup(OTHER_VERSE)["source"] == "S1C1 verse 4"
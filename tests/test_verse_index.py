@@ -0,0 +1,29 @@
+import pytest
+
+from VerseIndex import VerseIndex, parse_group
+
+# OCR output: 4 is repeated, 6 is missing and 3 reappears after 5
+NUMBERS = [1, 2, 3, 4, 4, 5, 3, 7, 8]
+VERSES = [{"verse_number": n, "sanskrit": f"श्लोकः {position}"} for position, n in enumerate(NUMBERS)]
+
+def linear_lookup(group):
+    start, end = parse_group(group)
+    return [verse for verse in VERSES if start <= verse['verse_number'] <= end]
+
+def test_parse_group():
+    assert parse_group("12-14") == (12, 14)
+    assert parse_group("7") == (7, 7)
+    with pytest.raises(ValueError):
+        parse_group("[1-2]")
+
+@pytest.mark.parametrize("group", ["1", "3", "4", "3-4", "1-8", "6", "9-12", "5-7"])
+def test_lookup_matches_linear_filter(group):
+    assert VerseIndex(VERSES).lookup(group) == linear_lookup(group)
+
+def test_report_finds_numbering_problems():
+    report = VerseIndex(VERSES).report(["1-2", "3-4", "6", "x"])
+    assert report == {"gaps": [6], "duplicates": [3, 4], "uncovered": [5, 7, 8],
+                      "empty_groups": ["6", "x"], "out_of_order": [3]}
+
+def test_report_on_chapter_without_verses():
+    assert VerseIndex([]).report(["1-2"])["empty_groups"] == ["1-2"]
@@ -0,0 +1,31 @@
+import json
+import os
+
+import pytest
+
+from FakeBackends import RECORDED_ROOT, load_recorded_ocr_text, recorded_chapters
+from ImageToBaseJson import extract_verses_and_groups
+
+@pytest.mark.parametrize("chapter_code", recorded_chapters())
+def test_parser_reproduces_recorded_output(chapter_code):
+    with open(os.path.join(RECORDED_ROOT, 'ExtractedFromOCR', chapter_code, 'charaka_samhita_output.json'), 'r', encoding='utf-8') as f:
+        expected = json.load(f)['book']
+    sanskrit_verses, verse_groups = extract_verses_and_groups(load_recorded_ocr_text(chapter_code))
+    assert sanskrit_verses == expected['sanskrit_verses']
+    assert verse_groups == expected['verse_groups']
+
+def test_verse_numbers_and_groups():
+    ocr_text = "\n".join([
+        "अथातो दीर्घञ्जीवितीयमध्यायं व्याख्यास्यामः ।।१।।",
+        "2. इति ह स्माह",
+        "भगवानात्रेयः ।।२।।",
+        "We shall now expound the chapter on longevity. [1-2]",
+        "इति प्रथमोऽध्यायः",
+    ])
+    sanskrit_verses, verse_groups = extract_verses_and_groups(ocr_text)
+    assert sanskrit_verses == [
+        {"verse_number": 1, "sanskrit": "अथातो दीर्घञ्जीवितीयमध्यायं व्याख्यास्यामः"},
+        {"verse_number": 2, "sanskrit": "इति ह स्माह भगवानात्रेयः"},
+        {"verse_number": 3, "sanskrit": "इति प्रथमोऽध्यायः"},
+    ]
+    assert verse_groups == ["1-2"]